@@ -11,6 +11,8 @@ import numpy as np
 
 import backend.binary_formats as binary_formats
 import backend.dataset_mangler as dm
+from backend.util.timestep_metadata import TimestepMetadataCache
+from backend.util.lru_cache import LRUCache
 
 import cherrypy
 
@@ -21,13 +23,18 @@ class ParseDataset:
     Unpack and store data for a dataset.
 
     """
-    def __init__(self, source_dict=None, dataset_name=None):
+    def __init__(self, source_dict=None, dataset_name=None,
+                 metadata_cache=None, max_meshes=4):
         """
         Initialize the parser.
 
         Args:
          dataset_dir (os.PathLike): The dataset directory that contains all
           the information about the dataset.
+         metadata_cache (TimestepMetadataCache or None, defaults to None): The
+          metadata cache of the dataset, None for an own one.
+         max_meshes (int, defaults to 4): The number of meshes whose surface
+          we keep, besides the pinned one.
 
         Raises:
          TypeError: If ``type(dataset_dir)`` is not `os.PathLike`.
@@ -38,6 +45,10 @@ class ParseDataset:
 
         self._dataset_name = dataset_name
 
+        if metadata_cache is None:
+            metadata_cache = TimestepMetadataCache()
+        self._metadata_cache = metadata_cache
+
         if self.source_type == 'local':
             data_dir = self.source['local']
 
@@ -61,21 +72,23 @@ class ParseDataset:
             self.ext_addr = source_dict['external']['addr']
             self.ext_port = source_dict['external']['port']
 
-        # self._nodal_field_map = None
-        self._nodal_field_map_dict = {}
-        # self._blank_field_node_count = None
-        self._blank_field_node_count_dict = {}
+        self._field_dict = None
 
-        self._surface_triangulation_dict = {}
+        # everything we need to know about a mesh is stored by the mesh hash,
+        # so timestep_data can be called from several threads at once (e.g.
+        # by the prefetcher), only the recently used meshes are kept
+        self._mesh_cache = LRUCache(max_meshes)
 
-        self._field_dict = None
+    def pin_mesh(self, mesh_hash):
+        """
+        Keep the surface of a mesh, e.g. the one that is currently served.
 
-        self._mesh_elements = None
-        # self._mesh_elements_dict = {}
+        Args:
+         mesh_hash (str): The hash of the mesh, replaces the mesh that was
+          pinned before.
 
-        # store the surface mesh for both elemental and nodal
-        self._compressed_model_surface = None
-        # self._compressed_model_surface_dict = {}
+        """
+        self._mesh_cache.pin(mesh_hash)
 
     def _file_hash(self, file_path, update=None):
         """
@@ -251,11 +264,21 @@ class ParseDataset:
 
             bin_data_points = int(len(bin_data_entry_contents) / data_point_size)
 
-            # little endian
-            struct_format = '<{}{}'.format(bin_data_points, data_point_type)
+            # little endian, read the contents in place instead of unpacking
+            # them into python objects first; large objects arrive as memory
+            # mapped temporary files and are not copied into memory
+            data = np.frombuffer(
+                bin_data_entry_contents,
+                dtype='<{}'.format(data_point_type),
+                count=bin_data_points
+            )
 
-            data = struct.unpack(struct_format, bin_data_entry_contents)
-            data = np.asarray(data)
+            if data.dtype.kind == 'f':
+                # the contents are shared with the gateway data cache
+                data.flags.writeable = False
+            else:
+                # integers are native ints, like struct.unpack gave us
+                data = data.astype(int)
 
             # reshape the data if we have more than one unit per pack
             if points_per_unit > 1:
@@ -353,6 +376,65 @@ class ParseDataset:
 
         return return_dict
 
+    def _external_timestep_index(self, timestep, field):
+        """
+        Look up a timestep in the index of the gateway.
+
+        Returns:
+         tuple: ``(timestep_index, simtype)``, the ``TimestepIndex`` of the
+         timestep and the simulation type ("ta" or "ma") to read the objects
+         from.
+
+        Raises:
+         KeyError: If the timestep is not in the index.
+
+        """
+        import backend.proxy_services as ps
+
+        timestep_index = ps.timestep_index(self._dataset_name, timestep)
+
+        if timestep_index is None:
+            raise KeyError(timestep)
+
+        try:
+            dest_field_name = field["name"]
+        except TypeError:
+            dest_field_name = "__no__field__"
+
+        ta_ma, ma_children = self._metadata_cache.get_or_create(
+            timestep, "simtypes", timestep_index,
+            lambda: self._simtypes(timestep_index))
+
+        if len(ta_ma) == 1:
+            simtype = "ta"
+        elif "ma" in ta_ma:
+            if dest_field_name in ma_children:
+                simtype = "ma"
+            else:
+                simtype = "ta"
+        else:
+            simtype = "ta"
+
+        return timestep_index, simtype
+
+    @staticmethod
+    def _simtypes(timestep_index):
+        """
+        Find the simulation types of a timestep for
+        ``_external_timestep_index``.
+
+        Returns:
+         tuple: ``(simtypes, ma_children)``, the simulation types of the
+         timestep and the names below "ma" as a frozenset.
+
+        """
+        ta_ma = tuple(timestep_index.children())
+
+        if "ma" in ta_ma:
+            return ta_ma, frozenset(timestep_index.children(("ma",)))
+
+        return ta_ma, frozenset()
+
     def _geometry_data_external(self, timestep, field, elementset, current_hash=list()):
         """
         Get data from the gateway.
@@ -380,59 +462,44 @@ class ParseDataset:
         """
         return_dict = dict()
 
-        # This is so dumb.
-        import backend.global_settings as gloset
-        ext_index = gloset.scene_manager.ext_src_dataset_index(
-            update=False, dataset=self._dataset_name)
-
-        try:
-            dest_field_name = field["name"]
-        except TypeError:
-            dest_field_name = "__no__field__"
-
-        ta_ma = list(ext_index[self._dataset_name][timestep].keys())
-
-        if len(ta_ma) == 1:
-            timestep_dict = ext_index[self._dataset_name][timestep]["ta"]
-        elif "ma" in ta_ma:
-            if dest_field_name in ext_index[self._dataset_name][timestep]["ma"]:
-                timestep_dict = ext_index[self._dataset_name][timestep]["ma"]
-            else:
-                timestep_dict = ext_index[self._dataset_name][timestep]["ta"]
-        else:
-            timestep_dict = ext_index[self._dataset_name][timestep]["ta"]
+        timestep_index, simtype = self._external_timestep_index(
+            timestep, field)
 
         # parse nodes
-        nodes_key = timestep_dict['nodes']['object_key']
-        nodes_hash = timestep_dict['nodes']['sha1sum']
+        nodes = timestep_index.entry((simtype, "nodes"))
+        nodes_key = nodes['object_key']
+        nodes_hash = nodes['sha1sum']
         nodes_format = binary_formats.nodes()
 
         # parse elements
         elements = {}
-        elements_types = list(timestep_dict['elements'].keys())
+        elements_types = timestep_index.children((simtype, "elements"))
         for elements_type in elements_types:
             if elements_type in binary_formats.valid_element_types():
 
-                current_elem = timestep_dict['elements']
+                current_elem = timestep_index.entry(
+                    (simtype, "elements", elements_type))
 
                 elements_format = getattr(binary_formats, elements_type)()
 
                 elements[elements_type] = {}
-                elements[elements_type]['key'] = current_elem[elements_type]['object_key']
-                elements[elements_type]['hash'] = current_elem[elements_type]['sha1sum']
+                elements[elements_type]['key'] = current_elem['object_key']
+                elements[elements_type]['hash'] = current_elem['sha1sum']
                 elements[elements_type]['fmt'] = elements_format
 
         skins = {}
         try:
-            skin_element_types = list(timestep_dict["skin"].keys())
-            current_skin = timestep_dict['skin']
+            skin_element_types = timestep_index.children((simtype, "skin"))
             skin_format = binary_formats.skin()
 
             for element_type in skin_element_types:
                 if element_type in binary_formats.valid_element_types():
+                    current_skin = timestep_index.entry(
+                        (simtype, "skin", element_type))
+
                     skins[element_type] = {}
-                    skins[element_type]['key'] = current_skin[element_type]['object_key']
-                    skins[element_type]['hash'] = current_skin[element_type]['sha1sum']
+                    skins[element_type]['key'] = current_skin['object_key']
+                    skins[element_type]['hash'] = current_skin['sha1sum']
                     skins[element_type]['fmt'] = skin_format
 
         except KeyError as e:
@@ -591,7 +658,7 @@ class ParseDataset:
         return return_dict
 
 
-    def _field_data(self, timestep, field, elementset, current_hash=None):
+    def _field_data(self, timestep, field, elementset, current_hash=None, mesh_hash=None):
         """
         Return the field data for the dataset.
 
@@ -600,10 +667,14 @@ class ParseDataset:
         already in current_hash, the parsing is skipped and lots of work (and
         time) is saved.
 
+        The surface field depends on the mesh it is projected onto, so the
+        hash of the mesh is part of the field hash.
+
         Args:
          timestep (str): Requested timestep.
          field (dict): Dictionary containing the requested field type and name.
          current_hash (str, optional): Hash of the currently selected field.
+         mesh_hash (str, optional): Hash of the mesh for the timestep.
 
         Returns:
          dict: The field data for the dataset, if no parsing was required it
@@ -611,13 +682,31 @@ class ParseDataset:
 
         """
         if self.source_type == 'local':
-            return self._field_data_local(timestep, field, elementset, current_hash=None)
+            return self._field_data_local(timestep, field, elementset, current_hash=current_hash, mesh_hash=mesh_hash)
         if self.source_type == 'external':
-            return self._field_data_external(timestep, field, elementset, current_hash=None)
+            return self._field_data_external(timestep, field, elementset, current_hash=current_hash, mesh_hash=mesh_hash)
         else:
             return None
 
-    def _field_data_local(self, timestep, field, elementset, current_hash=None):
+    def _mesh_field_hash(self, field_hash, mesh_hash):
+        """
+        Combine the hash of a field with the hash of the mesh it is projected
+        onto.
+
+        Args:
+         field_hash (str or None): The hash of the field.
+         mesh_hash (str or None): The hash of the mesh.
+
+        Returns:
+         str or None: The combined hash or None if the field hash is None.
+
+        """
+        if field_hash is None or mesh_hash is None:
+            return field_hash
+
+        return self._string_hash(mesh_hash, update=field_hash)
+
+    def _field_data_local(self, timestep, field, elementset, current_hash=None, mesh_hash=None):
         directory = self.fo_dir / timestep
 
         req_field_type = field['type']
@@ -651,6 +740,8 @@ class ParseDataset:
                     update=field_hash
                 )
 
+            field_hash = self._mesh_field_hash(field_hash, mesh_hash)
+
             if current_hash is None or field_hash not in current_hash:
                 data = {
                     'nodal': self._read_binary_data(bin_path, field_format)
@@ -684,6 +775,8 @@ class ParseDataset:
                     update=field_hash
                 )
 
+            field_hash = self._mesh_field_hash(field_hash, mesh_hash)
+
             if current_hash is None or field_hash not in current_hash:
                 data = {
                     'elemental': {}
@@ -701,31 +794,12 @@ class ParseDataset:
             'data': data
         }
 
-    def _field_data_external(self, timestep, field, elementset, current_hash=None):
+    def _field_data_external(self, timestep, field, elementset, current_hash=None, mesh_hash=None):
 
         object_key_list = list()
 
-        # This is so dumb.
-        import backend.global_settings as gloset
-        ext_index = gloset.scene_manager.ext_src_dataset_index(
-            update=False, dataset=self._dataset_name)
-
-        try:
-            dest_field_name = field["name"]
-        except TypeError:
-            dest_field_name = "__no__field__"
-
-        ta_ma = list(ext_index[self._dataset_name][timestep].keys())
-
-        if len(ta_ma) == 1:
-            timestep_dict = ext_index[self._dataset_name][timestep]["ta"]
-        elif "ma" in ta_ma:
-            if dest_field_name in ext_index[self._dataset_name][timestep]["ma"]:
-                timestep_dict = ext_index[self._dataset_name][timestep]["ma"]
-            else:
-                timestep_dict = ext_index[self._dataset_name][timestep]["ta"]
-        else:
-            timestep_dict = ext_index[self._dataset_name][timestep]["ta"]
+        timestep_index, simtype = self._external_timestep_index(
+            timestep, field)
 
         req_field_type = field['type']
         req_field_name = field['name']
@@ -743,7 +817,10 @@ class ParseDataset:
 
             hash_list = list()
 
-            hash_list.append(timestep_dict['nodal'][req_field_name]['sha1sum'])
+            nodal_field = timestep_index.entry(
+                (simtype, "nodal", req_field_name))
+
+            hash_list.append(nodal_field['sha1sum'])
             for element_type in elementset:
                 hash_list.append(elementset[element_type]['sha1sum'])
 
@@ -759,27 +836,42 @@ class ParseDataset:
                         update=field_hash
                     )
 
-            object_key = timestep_dict['nodal'][req_field_name]['object_key']
+            object_key = nodal_field['object_key']
+            object_key_list = [object_key]
+
+            field_hash = self._mesh_field_hash(field_hash, mesh_hash)
 
             if current_hash is None or field_hash is None or field_hash not in current_hash:
                 nodal_field_data = self._read_binary_data_external([object_key], [field_format])[0]  # get the only thing in the array
-                field_hash = nodal_field_data["sha1sum"]
+
+                # calculate the hash the same way as from the index, so we
+                # recognize the field the next time
+                field_hash = self._string_hash(nodal_field_data["sha1sum"])
+                for element_type in elementset:
+                    field_hash = self._string_hash(
+                        elementset[element_type]['sha1sum'],
+                        update=field_hash
+                    )
+                field_hash = self._mesh_field_hash(field_hash, mesh_hash)
+
                 data = {
                     'nodal': nodal_field_data["contents"]
                 }
-                object_key_list = [object_key]
             else:
                 data = {'nodal': None}
 
         if req_field_type == 'elemental':
 
-            elem_types = list(timestep_dict['elemental'][req_field_name].keys())
+            elem_types = timestep_index.children(
+                (simtype, "elemental", req_field_name))
             elements_to_load = {}
 
             hash_list = list()
 
             for elem_type in elem_types:
-                hash_list.append(timestep_dict['elemental'][req_field_name][elem_type]['sha1sum'])
+                hash_list.append(timestep_index.entry(
+                    (simtype, "elemental", req_field_name, elem_type)
+                )['sha1sum'])
             for element_type in elementset:
                 hash_list.append(elementset[element_type]['sha1sum'])
 
@@ -795,21 +887,19 @@ class ParseDataset:
                         update=field_hash
                     )
 
-                # update the field hash with the selected elementset
-                for element_type in elementset:
-                    elementset_sha1 = elementset[element_type]['sha1sum']
-                    field_hash = self._string_hash(
-                        elementset_sha1,
-                        update=field_hash
-                    )
-
             for elem_type in elem_types:
 
-                object_key = timestep_dict['elemental'][req_field_name][elem_type]['object_key']
-                object_hash = timestep_dict['elemental'][req_field_name][elem_type]['sha1sum']
+                elemental_field = timestep_index.entry(
+                    (simtype, "elemental", req_field_name, elem_type))
+                object_key = elemental_field['object_key']
+                object_hash = elemental_field['sha1sum']
 
                 elements_to_load[elem_type] = object_key
 
+            object_key_list = list(elements_to_load.values())
+
+            field_hash = self._mesh_field_hash(field_hash, mesh_hash)
+
             if current_hash is None or field_hash is None or field_hash not in current_hash:
                 data = {
                     'elemental': {}
@@ -829,6 +919,9 @@ class ParseDataset:
                 for it, element_key in enumerate(elements_to_load):
                     data['elemental'][element_key] = element_data_list[it]
 
+                # calculate the hash the same way as from the index, so we
+                # recognize the field the next time
+                field_hash = None
 
                 for one_field in element_data_dict_list:
                     one_hash = one_field["sha1sum"]
@@ -844,8 +937,7 @@ class ParseDataset:
                         elementset_sha1,
                         update=field_hash
                     )
-
-                object_key_list = elements_to_load_list
+                field_hash = self._mesh_field_hash(field_hash, mesh_hash)
 
             else:
                 data = {'elemental': None}
@@ -907,24 +999,44 @@ class ParseDataset:
             'free_edges': {'data': None}
         }
 
+        # we can only skip the meshes whose surface we still have
+        try:
+            cached_mesh_hashes = [
+                mesh_hash for mesh_hash in hash_dict['mesh']
+                if mesh_hash in self._mesh_cache
+            ]
+        except (TypeError, KeyError):
+            cached_mesh_hashes = []
+
         try:
             mesh_dict = self._geometry_data(
-                timestep, field, elementset, current_hash=hash_dict['mesh'])
+                timestep, field, elementset, current_hash=cached_mesh_hashes)
 
         except (TypeError, KeyError) as e:
             bl.debug_warning("No mesh for given hash_dict found: {}".format(e))
             mesh_dict = self._geometry_data(
                 timestep, field, elementset, current_hash=None)
 
+        mesh_surface = None
+        if mesh_dict['nodes'] is None:
+            mesh_surface = self._mesh_cache.get(mesh_dict['hash'])
+
+            if mesh_surface is None:
+                # evicted in the meantime
+                mesh_dict = self._geometry_data(
+                    timestep, field, elementset, current_hash=[])
+
         if field is not None:
             try:
                 field_dict = self._field_data(
-                    timestep, field, elementset, current_hash=hash_dict['field'])
+                    timestep, field, elementset, current_hash=hash_dict['field'],
+                    mesh_hash=mesh_dict['hash'])
 
             except (TypeError, KeyError) as e:
                 bl.debug_warning("No field for given hash_dict found: {}".format(e))
                 field_dict = self._field_data(
-                    timestep, field, elementset, current_hash=None)
+                    timestep, field, elementset, current_hash=None,
+                    mesh_hash=mesh_dict['hash'])
 
         else:
             # Corner case for unsetting the fields once they were set
@@ -942,31 +1054,32 @@ class ParseDataset:
         mesh_elements = mesh_dict['elements']
         mesh_skins = mesh_dict["skins"]
 
-        return_object_keys = mesh_dict["object_key_list"]  # gets modified later
-
-        if mesh_elements is not None:
-            self._mesh_elements = mesh_elements
+        return_object_keys = list(mesh_dict["object_key_list"])  # gets modified later
 
         if mesh_nodes is not None:
 
             elementset_data = self._elementset_data(elementset)
 
-            self._compressed_model_surface = dm.model_surface(mesh_elements, mesh_nodes, mesh_skins, elementset_data)
+            compressed_model_surface = dm.model_surface(mesh_elements, mesh_nodes, mesh_skins, elementset_data)
 
-            self._nodal_field_map_dict[mesh_dict['hash']] = self._compressed_model_surface['nodal_field_map']
-            self._blank_field_node_count_dict[mesh_dict['hash']] = self._compressed_model_surface['old_max_node_index']
-            self._surface_triangulation_dict[mesh_dict['hash']] = self._compressed_model_surface['surface_triangulation']
+            mesh_surface = {
+                'elements': mesh_elements,
+                'nodal_field_map': compressed_model_surface['nodal_field_map'],
+                'blank_field_node_count': compressed_model_surface['old_max_node_index'],
+                'surface_triangulation': compressed_model_surface['surface_triangulation']
+            }
+            self._mesh_cache[mesh_dict['hash']] = mesh_surface
 
-            return_dict['nodes'] = self._compressed_model_surface['nodes']
-            return_dict['nodes_center'] = self._compressed_model_surface['nodes_center']
-            return_dict['tets'] = self._compressed_model_surface['triangles']
-            return_dict['wireframe'] = self._compressed_model_surface['wireframe']
-            return_dict['free_edges'] = self._compressed_model_surface['free_edges']
+            return_dict['nodes'] = compressed_model_surface['nodes']
+            return_dict['nodes_center'] = compressed_model_surface['nodes_center']
+            return_dict['tets'] = compressed_model_surface['triangles']
+            return_dict['wireframe'] = compressed_model_surface['wireframe']
+            return_dict['free_edges'] = compressed_model_surface['free_edges']
 
         # field does not exist
         if field_dict is None:
 
-            node_count = self._blank_field_node_count_dict[mesh_dict['hash']]
+            node_count = mesh_surface['blank_field_node_count']
 
             field_values = self._blank_field(node_count)['data']['nodal']
 
@@ -992,6 +1105,7 @@ class ParseDataset:
                         elementset_sha1,
                         update=field_hash
                     )
+            field_hash = self._mesh_field_hash(field_hash, mesh_dict['hash'])
             return_dict['hash_dict']['field'] = field_hash
 
         # field dict is not None
@@ -1004,13 +1118,17 @@ class ParseDataset:
 
             if field_type == 'elemental':
                 elemental_field_dict = field_dict['data']['elemental']
-                field_values = dm.expand_elemental_fields(elemental_field_dict, self._mesh_elements, self._surface_triangulation_dict[mesh_dict['hash']])
+                if elemental_field_dict is None:
+                    # we already have this field
+                    field_values = None
+                else:
+                    field_values = dm.expand_elemental_fields(elemental_field_dict, mesh_surface['elements'], mesh_surface['surface_triangulation'])
             return_dict['hash_dict']['field'] = field_dict['hash']
 
         if field_values is not None:
             if field_type == 'nodal':
                 return_dict['field'] = dm.model_surface_fields_nodal(
-                    self._nodal_field_map_dict[mesh_dict['hash']], field_values)
+                    mesh_surface['nodal_field_map'], field_values)
 
             if field_type == 'elemental':
                 return_dict['field'] = dm.model_surface_fields_elemental(field_values)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Play back a series of timesteps of a dataset.
+
+Instead of the browser requesting one timestep after another, the server
+precomputes the surface data for the timesteps in a background pipeline and
+shows them at a target rate. When the pipeline can not keep up, frames are
+skipped instead of slowing down the playback.
+
+"""
+import time
+import threading
+
+from util.loggers import BackendLog as bl
+
+
+class DatasetPlayback(object):
+    """
+    Loads frames in a producer thread and shows them in a streamer thread.
+
+    The producer stays at most ``lookahead`` frames ahead of the streamer, so
+    memory is bounded. It does not load frames that are already overdue. The
+    streamer shows the newest frame that is ready and due, frames in between
+    are skipped.
+
+    Args:
+     timesteps (list): The timesteps we want to play back, in order.
+     load (callable): Called as ``load(timestep)`` in the producer thread,
+      returns the precomputed frame.
+     show (callable): Called as ``show(timestep, frame)`` in the streamer
+      thread when a frame is due.
+     rate (float, defaults to 5.0): Target rate in frames per second.
+     lookahead (int or None, defaults to None): The maximum number of frames
+      that are loaded ahead of the shown frame, None for two seconds worth of
+      frames.
+
+    Raises:
+     ValueError: If ``rate`` is not positive or ``timesteps`` is empty.
+
+    """
+    def __init__(self, timesteps, load, show, rate=5.0, lookahead=None):
+        if not rate > 0:
+            raise ValueError('rate is {}, expected a positive number'.format(
+                rate))
+
+        if len(timesteps) == 0:
+            raise ValueError('no timesteps to play back')
+
+        self._timesteps = list(timesteps)
+        self._load = load
+        self._show = show
+        self._rate = float(rate)
+        self._interval = 1 / self._rate
+
+        if lookahead is None:
+            lookahead = int(2 * self._rate)
+        self._lookahead = max(1, lookahead)
+
+        self._condition = threading.Condition()
+
+        # serializes show() with stop(), so nothing is shown after stop()
+        self._show_lock = threading.Lock()
+
+        # index -> frame, for loaded frames that were not shown yet
+        self._frames = dict()
+
+        self._start_time = None
+        self._position = -1
+        self._produced_all = False
+        self._stopped = False
+
+        self._frames_shown = 0
+        self._frames_skipped = 0
+
+        self._producer = threading.Thread(
+            target=self._produce, name='DatasetPlaybackProducer', daemon=True)
+        self._streamer = threading.Thread(
+            target=self._stream, name='DatasetPlaybackStreamer', daemon=True)
+
+    def start(self):
+        """
+        Start loading and showing frames.
+
+        """
+        self._producer.start()
+        self._streamer.start()
+
+    def stop(self):
+        """
+        Stop the playback. Once this returns no further frame is shown.
+
+        """
+        with self._condition:
+            self._stopped = True
+            self._frames.clear()
+            self._condition.notify_all()
+
+        with self._show_lock:
+            pass
+
+    def playing(self):
+        """
+        Return True while the playback runs.
+
+        """
+        return self._streamer.is_alive() and not self._stopped
+
+    def status(self):
+        """
+        Return a dictionary describing the playback.
+
+        """
+        with self._condition:
+            if self._position < 0:
+                current_timestep = None
+            else:
+                current_timestep = self._timesteps[self._position]
+
+            return {
+                'playbackActive': self.playing(),
+                'playbackTimesteps': self._timesteps,
+                'playbackTimestepCurrent': current_timestep,
+                'playbackRate': self._rate,
+                'playbackFramesShown': self._frames_shown,
+                'playbackFramesSkipped': self._frames_skipped
+            }
+
+    def _due_index(self):
+        """
+        Index of the frame that is due now. Call with the condition held.
+
+        """
+        if self._start_time is None:
+            return 0
+
+        return int((time.monotonic() - self._start_time) / self._interval)
+
+    def _produce(self):
+        """
+        Load the frames in order, skipping frames that are already overdue.
+
+        """
+        index = 0
+
+        while index < len(self._timesteps):
+            with self._condition:
+                # do not run too far ahead of the streamer
+                self._condition.wait_for(
+                    lambda: (
+                        self._stopped or
+                        index - self._position <= self._lookahead
+                    )
+                )
+
+                if self._stopped:
+                    return
+
+                # do not load frames that will never be shown
+                index = max(index, min(
+                    self._due_index(), len(self._timesteps) - 1))
+
+            timestep = self._timesteps[index]
+
+            try:
+                frame = self._load(timestep)
+            except Exception as e:
+                bl.warning('Loading timestep {} for playback failed: {}'.
+                           format(timestep, e))
+                frame = None
+
+            with self._condition:
+                if frame is not None and not self._stopped:
+                    self._frames[index] = frame
+                self._condition.notify_all()
+
+            index += 1
+
+        with self._condition:
+            self._produced_all = True
+            self._condition.notify_all()
+
+    def _next_frame(self):
+        """
+        Wait for the next frame to show and return its index, or None when the
+        playback is over. Call with the condition held.
+
+        """
+        while not self._stopped:
+            # the first frame that is ready starts the playback
+            if self._start_time is None and self._frames:
+                return min(self._frames)
+
+            due_index = self._due_index()
+
+            ready = [
+                index for index in self._frames
+                if self._position < index <= due_index
+            ]
+
+            if ready:
+                return max(ready)
+
+            if self._produced_all and not self._frames:
+                return None
+
+            if self._frames and min(self._frames) > due_index:
+                # the next frame is ready but not due yet
+                timeout = (
+                    self._start_time + min(self._frames) * self._interval -
+                    time.monotonic()
+                )
+            else:
+                # wait for the producer
+                timeout = self._interval
+
+            self._condition.wait(max(timeout, 0))
+
+        return None
+
+    def _stream(self):
+        """
+        Show the due frames at the target rate.
+
+        """
+        while True:
+            with self._condition:
+                index = self._next_frame()
+
+                if index is None:
+                    break
+
+                frame = self._frames.pop(index)
+
+                # drop the frames we skip
+                for skipped_index in [i for i in self._frames if i < index]:
+                    del self._frames[skipped_index]
+
+                self._frames_skipped += index - self._position - 1
+                self._position = index
+
+                # the clock starts with the first frame
+                if self._start_time is None:
+                    self._start_time = time.monotonic() - index * self._interval
+
+                self._condition.notify_all()
+
+            with self._show_lock:
+                if self._stopped:
+                    break
+
+                try:
+                    self._show(self._timesteps[index], frame)
+                except Exception as e:
+                    bl.warning('Showing timestep {} for playback failed: {}'.
+                               format(self._timesteps[index], e))
+                    continue
+
+            with self._condition:
+                self._frames_shown += 1
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Prefetch data for a dataset in the background.
+
+Loading a timestep means fetching the objects from the gateway and mangling
+them into a surface mesh and a surface field. This takes seconds for large
+datasets, so we do it in the background for the timesteps the user is likely
+to select next.
+
+"""
+import threading
+import contextlib
+import collections
+import concurrent.futures
+
+from util.loggers import BackendLog as bl
+
+
+class DatasetPrefetcher(object):
+    """
+    Runs load jobs in a bounded thread pool and keeps a bounded number of
+    results.
+
+    Every job is identified by a hashable key. Scheduling a new set of jobs
+    replaces the old set: queued jobs that are no longer wanted are cancelled
+    and results that are no longer wanted are dropped. Jobs that are already
+    running can not be interrupted, but their results are discarded if they
+    are no longer wanted when they finish.
+
+    Prefetching has a lower priority than explicit requests: while a
+    ``foreground()`` block is active no new job is started.
+
+    Args:
+     workers (int, defaults to 2): The number of jobs that run at the same
+      time.
+     max_results (int, defaults to 4): The maximum number of results that are
+      kept until they are taken.
+     name (str, defaults to 'DatasetPrefetcher'): Prefix for the names of the
+      worker threads.
+
+    """
+    def __init__(self, workers=2, max_results=4, name="DatasetPrefetcher"):
+        self._max_results = max_results
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=name)
+
+        self._lock = threading.Lock()
+
+        # number of active foreground blocks, jobs wait until it is 0
+        self._foreground_count = 0
+        self._foreground_condition = threading.Condition(self._lock)
+
+        # the keys of the jobs we currently want, in order of importance
+        self._wanted = list()
+
+        # key -> future of queued or running jobs
+        self._futures = dict()
+
+        # key -> result of finished jobs
+        self._results = collections.OrderedDict()
+
+        self._shutdown = False
+
+    def schedule(self, jobs):
+        """
+        Replace the set of wanted jobs.
+
+        Args:
+         jobs (list): A list of ``(key, function)`` tuples, most important
+          first. ``function`` is called without arguments in a worker thread
+          and its return value is kept as the result for ``key``.
+
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+
+            self._wanted = [key for key, _ in jobs]
+
+            # cancel queued jobs that are no longer wanted
+            for key in list(self._futures.keys()):
+                if key not in self._wanted:
+                    if self._futures[key].cancel():
+                        del self._futures[key]
+
+            # drop results that are no longer wanted
+            for key in list(self._results.keys()):
+                if key not in self._wanted:
+                    del self._results[key]
+
+            for key, function in jobs:
+                if key in self._futures or key in self._results:
+                    continue
+
+                self._futures[key] = self._executor.submit(
+                    self._run, key, function)
+
+    def cancel(self):
+        """
+        Cancel every queued job and drop every result.
+
+        """
+        self.schedule([])
+
+    def take(self, key):
+        """
+        Take the result for a key.
+
+        If the job for the key is running we wait for it to finish, if it is
+        still queued it is cancelled (the caller is about to do the work
+        anyway).
+
+        Args:
+         key (hashable): The key of the job.
+
+        Returns:
+         The result of the job or None if there is none.
+
+        """
+        with self._lock:
+            try:
+                return self._results.pop(key)
+            except KeyError:
+                pass
+
+            future = self._futures.get(key)
+
+            if future is None:
+                return None
+
+            if future.cancel():
+                del self._futures[key]
+                return None
+
+        # the job is running, wait for it
+        result = future.result()
+
+        with self._lock:
+            self._results.pop(key, None)
+
+        return result
+
+    @contextlib.contextmanager
+    def foreground(self):
+        """
+        Context manager for explicit requests. No prefetch job is started
+        while the block is active, jobs that are already running continue.
+
+        """
+        with self._lock:
+            self._foreground_count += 1
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._foreground_count -= 1
+                self._foreground_condition.notify_all()
+
+    def shutdown(self):
+        """
+        Cancel everything and stop the worker threads once they are idle.
+
+        """
+        self.cancel()
+
+        with self._lock:
+            self._shutdown = True
+
+        self._executor.shutdown(wait=False)
+
+    def _run(self, key, function):
+        """
+        Run one job in a worker thread.
+
+        """
+        with self._lock:
+            # give way to explicit requests
+            self._foreground_condition.wait_for(
+                lambda: self._foreground_count == 0)
+
+            if key not in self._wanted:
+                self._futures.pop(key, None)
+                return None
+
+        try:
+            result = function()
+        except Exception as e:
+            bl.debug_warning("Prefetching {} failed: {}".format(key, e))
+            result = None
+
+        with self._lock:
+            self._futures.pop(key, None)
+
+            if result is not None and key in self._wanted:
+                self._results[key] = result
+                self._results.move_to_end(key)
+
+                while len(self._results) > self._max_results:
+                    self._results.popitem(last=False)
+
+        return result
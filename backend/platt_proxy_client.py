@@ -14,15 +14,455 @@ import time
 import struct
 import asyncio
 import socket
-import threading
 import base64
 import logging
 import queue
+import mmap
+import tempfile
+import functools
+import collections
 from contextlib import suppress
 
 # from util.loggers import CoreLog as cl, BackendLog as bl, SimulationLog as sl
 from util.loggers import GatewayLog as gl
 
+import backend.util.transfer_compression as tc
+import backend.proxy_services_data as pd
+
+
+class GatewayRequestError(Exception):
+    """
+    The gateway reported an error for a single request.
+
+    """
+    pass
+
+
+def _spill_buffer(length, directory=None):
+    """
+    Create a writable buffer of ``length`` bytes that is backed by an
+    anonymous temporary file instead of memory.
+
+    The file is unlinked right away, its space is freed when the last
+    reference to the returned memory map is gone.
+
+    Returns:
+     mmap.mmap: The buffer.
+
+    """
+    with tempfile.TemporaryFile(dir=directory) as spill_file:
+        spill_file.truncate(length)
+        return mmap.mmap(spill_file.fileno(), length)
+
+
+async def _read_payload(reader, length, chunk_size=1024*1024,
+                        spill_threshold=None, spill_dir=None):
+    """
+    Read exactly ``length`` raw bytes into a preallocated buffer.
+
+    Args:
+     spill_threshold (int or None, defaults to None): Payloads of at least
+      this many bytes are streamed into a memory mapped temporary file, None
+      keeps every payload in memory.
+     spill_dir (str or None, defaults to None): The directory for the
+      temporary files, None for the system default.
+
+    Returns:
+     bytearray or mmap.mmap: The payload.
+
+    Raises:
+     asyncio.IncompleteReadError: If the connection closes early.
+
+    """
+    if spill_threshold is not None and length >= max(spill_threshold, 1):
+        payload = _spill_buffer(length, spill_dir)
+    else:
+        payload = bytearray(length)
+
+    with memoryview(payload) as payload_view:
+        offset = 0
+        while offset < length:
+            chunk = await reader.readexactly(
+                min(chunk_size, length - offset))
+            payload_view[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+
+    return payload
+
+
+async def _read_frame(reader):
+    """
+    Read a length prefixed JSON message of the pipelined protocol.
+
+    """
+    length_b = await reader.readexactly(struct.calcsize("L"))
+    length = struct.unpack("L", length_b)[0]
+    data = await reader.readexactly(length)
+
+    return json.loads(data.decode("UTF-8"))
+
+
+def _write_frame(writer, dictionary):
+    """
+    Write a length prefixed JSON message of the pipelined protocol.
+
+    """
+    data = json.dumps(dictionary).encode()
+    writer.write(struct.pack("L", len(data)) + data)
+
+
+class _PipelinedConnection(object):
+    """
+    A file download connection in pipelined mode.
+
+    Requests are tagged with a request ID and written without waiting for
+    ACKs, so many requests are in flight at the same time. A reader task
+    matches the answers to the requests by their ID. The gateway reports
+    errors per request (``{"request_id": ..., "error": ...}``).
+
+    Args:
+     reader (asyncio.StreamReader): The reader of the connection.
+     writer (asyncio.StreamWriter): The writer of the connection.
+     spill_threshold (int or None, defaults to None): Payloads of at least
+      this many bytes are streamed into memory mapped temporary files.
+     spill_dir (str or None, defaults to None): The directory for the
+      temporary files.
+
+    """
+    def __init__(self, reader, writer, spill_threshold=None, spill_dir=None):
+        self.reader = reader
+        self.writer = writer
+
+        self._spill_threshold = spill_threshold
+        self._spill_dir = spill_dir
+
+        self._next_request_id = 0
+
+        # request_id -> asyncio.Queue for the answers
+        self._pending = dict()
+
+        self._reader_task = asyncio.ensure_future(self._read_answers())
+
+    def in_flight(self):
+        """
+        Return the number of requests waiting for answers.
+
+        """
+        return len(self._pending)
+
+    def healthy(self):
+        """
+        Check if the connection can still be used.
+
+        """
+        return (
+            not self._reader_task.done() and
+            not self.writer.transport.is_closing()
+        )
+
+    async def request(self, requested_file):
+        """
+        Request a file and wait for the answer.
+
+        Returns:
+         dict: The answer of the gateway with the contents in
+         ``["file_request"]["contents"]``.
+
+        Raises:
+         GatewayRequestError: If the gateway reports an error for this
+          request.
+         ConnectionError: If the connection is lost before the answer
+          arrives.
+
+        """
+        answers = [
+            answer async for answer in self._request(
+                {"requested_file": requested_file}, 1)
+        ]
+
+        if "error" in answers[0]:
+            raise GatewayRequestError(answers[0]["error"])
+
+        return answers[0]
+
+    def request_batch(self, namespace, keys):
+        """
+        Request several files of a namespace with one message.
+
+        Returns:
+         async iterator: The answers in the order they arrive. Answers for
+         objects the gateway can not deliver contain ``object`` and
+         ``error``.
+
+        Raises:
+         ConnectionError: If the connection is lost before every answer
+          arrived.
+
+        """
+        return self._request(
+            {"requested_files": {"namespace": namespace, "keys": keys}},
+            len(keys)
+        )
+
+    async def _request(self, message, answer_count):
+        """
+        Send a tagged request and yield its answers.
+
+        """
+        if not self.healthy():
+            raise ConnectionError("pipelined connection is closed")
+
+        request_id = self._next_request_id
+        self._next_request_id += 1
+
+        answer_queue = asyncio.Queue()
+        self._pending[request_id] = answer_queue
+
+        try:
+            message["request_id"] = request_id
+            _write_frame(self.writer, message)
+            await self.writer.drain()
+
+            for i in range(answer_count):
+                answer = await answer_queue.get()
+
+                if isinstance(answer, Exception):
+                    raise answer
+
+                yield answer
+
+        finally:
+            self._pending.pop(request_id, None)
+
+    def close(self):
+        """
+        Close the connection, pending requests fail with a ConnectionError.
+
+        """
+        self.writer.close()
+        self._reader_task.cancel()
+        self._fail_pending(ConnectionError("pipelined connection closed"))
+
+    async def _read_answers(self):
+        """
+        Read answers and hand them to the waiting requests.
+
+        """
+        try:
+            while True:
+                answer = await _read_frame(self.reader)
+
+                file_request = answer.get("file_request", {})
+
+                # the payload has to be read even if nobody waits for it
+                if "contents_length" in file_request:
+                    start = time.perf_counter()
+                    file_request["contents"] = await _read_payload(
+                        self.reader, file_request.pop("contents_length"),
+                        spill_threshold=self._spill_threshold,
+                        spill_dir=self._spill_dir)
+                    answer["transfer_seconds"] = time.perf_counter() - start
+                elif "contents" in file_request:
+                    file_request["contents"] = base64.b64decode(
+                        file_request["contents"].encode())
+
+                answer_queue = self._pending.get(answer.get("request_id"))
+
+                if answer_queue is None:
+                    gl.debug_warning("Answer for unknown request {}".format(
+                        answer.get("request_id")))
+                    continue
+
+                answer_queue.put_nowait(answer)
+
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self._fail_pending(ConnectionError(
+                "pipelined connection lost: {}".format(e)))
+
+        except Exception as e:
+            gl.error("Exception in pipelined connection: {}".format(e))
+            self._fail_pending(ConnectionError(
+                "pipelined connection broken: {}".format(e)))
+
+    def _fail_pending(self, exception):
+        """
+        Fail every pending request.
+
+        """
+        for answer_queue in self._pending.values():
+            answer_queue.put_nowait(exception)
+
+
+# download priority classes, most important first
+PRIORITIES = ["interactive", "tracking", "prefetch"]
+
+# seconds we wait for the gateway to accept the pipelined protocol, gateways
+# that do not know it stay silent after the handshake
+PIPELINED_ACCEPT_TIMEOUT = 5
+
+
+class _DownloadScheduler(object):
+    """
+    Decides which queued download request starts next.
+
+    Every request belongs to a priority class. A request starts when fewer
+    than ``capacity`` requests run in total and fewer than the limit of its
+    class run in that class. Higher classes always start first. Objects that
+    run already are not queued again, objects that are queued with a lower
+    priority are moved to the new request.
+
+    Args:
+     capacity (int): The number of requests that may run at the same time.
+     limits (dict or None, defaults to None): Maps a priority class to the
+      number of its requests that may run at the same time. By default
+      interactive requests may use every slot, tracking requests leave one
+      slot and prefetch requests leave half of the slots free.
+
+    """
+    def __init__(self, capacity, limits=None):
+        self._requested_limits = dict(limits or {})
+        self.set_capacity(capacity)
+
+        self._queues = {
+            priority: collections.deque() for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+
+        # object descriptor -> queued request containing the object
+        self._queued_objects = dict()
+        self._running_objects = set()
+
+        self.coalesced_requests = 0
+        self.promoted_requests = 0
+
+    def set_capacity(self, capacity):
+        """
+        Change the number of requests that may run at the same time, the
+        default limits of the classes follow the capacity.
+
+        Args:
+         capacity (int): The number of requests that may run at the same time.
+
+        """
+        self._capacity = capacity
+
+        self._limits = {
+            "interactive": capacity,
+            "tracking": max(1, capacity - 1),
+            "prefetch": max(1, capacity // 2)
+        }
+        self._limits.update(self._requested_limits)
+
+    def submit(self, download_request):
+        """
+        Queue a download request.
+
+        Args:
+         download_request (dict): ``{"namespace", "key"}`` or
+          ``{"namespace", "keys"}``, with an optional ``priority``.
+
+        """
+        priority = download_request.get("priority", "interactive")
+        if priority not in PRIORITIES:
+            gl.debug_warning("Unknown download priority {}".format(priority))
+            priority = "interactive"
+
+        namespace = download_request["namespace"]
+        keys = download_request.get("keys", [download_request.get("key")])
+
+        new_keys = list()
+
+        for key in keys:
+            object_descriptor = "{}/{}".format(namespace, key)
+
+            if object_descriptor in self._running_objects:
+                gl.debug("{} is downloading already".format(object_descriptor))
+                self.coalesced_requests += 1
+                continue
+
+            queued_request = self._queued_objects.get(object_descriptor)
+
+            if queued_request is not None:
+                if (
+                        PRIORITIES.index(queued_request["priority"]) <=
+                        PRIORITIES.index(priority)
+                ):
+                    self.coalesced_requests += 1
+                    continue
+
+                # preempt the queued request with the lower priority
+                queued_request["keys"].remove(key)
+                self.promoted_requests += 1
+
+            new_keys.append(key)
+
+        if not new_keys:
+            return
+
+        request = {"namespace": namespace, "keys": new_keys,
+                   "priority": priority}
+
+        self._queues[priority].append(request)
+
+        for key in new_keys:
+            self._queued_objects["{}/{}".format(namespace, key)] = request
+
+    def next_request(self):
+        """
+        Take the next request that may start.
+
+        Returns:
+         dict or None: ``{"namespace", "keys", "priority"}``, None if no
+         request may start now.
+
+        """
+        if sum(self._running.values()) >= self._capacity:
+            return None
+
+        for priority in PRIORITIES:
+
+            if self._running[priority] >= self._limits[priority]:
+                continue
+
+            request_queue = self._queues[priority]
+
+            while request_queue:
+                request = request_queue.popleft()
+
+                # every object was moved to a more important request
+                if not request["keys"]:
+                    continue
+
+                self._running[priority] += 1
+
+                for key in request["keys"]:
+                    object_descriptor = "{}/{}".format(
+                        request["namespace"], key)
+                    del self._queued_objects[object_descriptor]
+                    self._running_objects.add(object_descriptor)
+
+                return request
+
+        return None
+
+    def finished(self, request):
+        """
+        Forget a request that ran.
+
+        """
+        self._running[request["priority"]] -= 1
+
+        for key in request["keys"]:
+            self._running_objects.discard(
+                "{}/{}".format(request["namespace"], key))
+
+    def queued(self, priority):
+        """
+        Return the number of queued objects of a priority class.
+
+        """
+        return sum(len(request["keys"]) for request in self._queues[priority])
+
+
 class Client(object):
     def __init__(
             self,
@@ -35,10 +475,29 @@ class Client(object):
             # index_pipe_remote,
             file_name_request_client_queue,
             file_contents_name_hash_client_queue,
-            shutdown_client_event
+            shutdown_client_event,
+            pool_size=4,
+            binary_transfer=True,
+            protocol="stop_and_wait",
+            max_in_flight=16,
+            batch_requests=False,
+            priority_limits=None,
+            compression=None,
+            spill_threshold=None,
+            spill_dir=None,
+            index_request_queue=None,
+            stream_index=True,
+            run=True
     ):
         gl.info("Client init")
 
+        if pool_size < 1:
+            raise ValueError("pool_size is {}, expected at least 1".format(
+                pool_size))
+
+        if protocol not in ["stop_and_wait", "pipelined"]:
+            raise ValueError("unknown protocol {}".format(protocol))
+
         self._host = host
         self._port = port
 
@@ -58,9 +517,82 @@ class Client(object):
         self._file_answer_connection_active = False
         self._new_file_information_connection_active = False
 
+        # remember which answers we spotted in the data queue at the last
+        # queue cleanups, see _queue_cleanup
+        self._data_in_queue_occurences = dict()
+
         self._loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self._loop)
 
+        # bounded pool of persistent file download connections, the pool size
+        # is also the number of objects we download in parallel. Connections
+        # the gateway closed while they were idle are dropped when they are
+        # taken from the pool
+        self._pool_size = pool_size
+        self._download_slots = asyncio.Semaphore(pool_size)
+        self._idle_download_connections = collections.deque()
+
+        # in pipelined mode every connection of the pool carries up to
+        # max_in_flight requests at the same time, without per message ACKs
+        self._pipelined = protocol == "pipelined"
+        if self._pipelined:
+            self._download_slots = asyncio.Semaphore(pool_size * max_in_flight)
+        self._pipelined_connections = list()
+        self._pipelined_connect_lock = asyncio.Lock()
+
+        # request all objects of a batch with one message, otherwise batches
+        # are split into single requests
+        self._batch_requests = batch_requests
+
+        # requests wait here until a download slot of their priority class
+        # is free, so queued prefetching does not delay interactive requests
+        if self._pipelined:
+            download_capacity = pool_size * max_in_flight
+        else:
+            download_capacity = pool_size
+        self._download_scheduler = _DownloadScheduler(
+            download_capacity, priority_limits)
+
+        # ask the gateway to send object contents as raw bytes after a JSON
+        # header instead of base64 inside the JSON document
+        self._binary_transfer = binary_transfer
+
+        # offer the gateway to compress object contents, see
+        # transfer_compression.offer, only with raw byte transfers
+        self._compression = compression
+
+        # objects of at least spill_threshold bytes are streamed into memory
+        # mapped temporary files, so large objects do not stay in memory
+        self._spill_threshold = spill_threshold
+        self._spill_dir = spill_dir
+
+        # index requests, e.g. for the index of one namespace, sent as they
+        # are. Without it every set get_index_event requests the whole index
+        self._index_request_queue = index_request_queue
+
+        # offer the gateway to send index answers as a stream of records,
+        # they are handed on in parts and decoded by the index
+        self._stream_index = stream_index
+
+        # what arrived over the wire and what it decompressed to
+        self._transfer_stats = {
+            "objects": 0,
+            "compressed_objects": 0,
+            "wire_bytes": 0,
+            "bytes": 0,
+            "transfer_seconds": 0.0,
+            "decompress_seconds": 0.0
+        }
+
+        # save all the open write connections in a list so we can close it if
+        # necessary
+        self._file_download_writer_list = list()
+
+        # without running, the client only sets up its state, so tests and
+        # benchmarks can drive single requests on self._loop
+        if not run:
+            return
+
         # create tasks for the individual connections
         new_file_information_connection_task = self._loop.create_task(
             self._new_file_information_connection_coro())
@@ -70,29 +602,21 @@ class Client(object):
 
         file_download_task = self._loop.create_task(
             self._file_download_coro())
-        # save all the open write connections in a list so we can close it if
-        # necessary
-        self._file_download_writer_list = list()
-
-        # create a task that watches all connections
-        connection_watchdog_task = self._loop.create_task(
-            self._connection_watchdog_coro())
 
-        # manage the queue cleanup when there are no active connections
-        queue_cleanup_task = self._loop.create_task(
-            self._queue_cleanup_coro())
+        # log how well compression works
+        transfer_report_task = self._loop.create_task(
+            self._transfer_report_coro())
 
         shutdown_watch_task = self._loop.create_task(
             self._watch_shutdown_event_coro())
 
         self.tasks = [
-            connection_watchdog_task,
             index_connection_task,
 
             file_download_task,
+            transfer_report_task,
 
             new_file_information_connection_task,
-            queue_cleanup_task,
 
             shutdown_watch_task
         ]
@@ -124,6 +648,35 @@ class Client(object):
 
 
 
+    @property
+    def coalesced_requests(self):
+        """
+        The number of requested objects that were downloading or queued
+        already.
+
+        """
+        return self._download_scheduler.coalesced_requests
+
+    def close(self):
+        """
+        Close the pooled connections and the event loop of a client that was
+        created with ``run=False``. Closing a closed client does nothing.
+
+        """
+        if self._loop.is_closed():
+            return
+
+        while self._idle_download_connections:
+            self._close_download_connection(
+                self._idle_download_connections.pop())
+
+        for connection in list(self._pipelined_connections):
+            self._close_pipelined_connection(connection)
+
+        # let the transports close
+        self._loop.run_until_complete(asyncio.sleep(0))
+        self._loop.close()
+
     ##################################################################
     # watch the shutdown event
     #
@@ -133,8 +686,7 @@ class Client(object):
 
         """
         # blocks until shutdown event is sent
-        shutdown_event = await self._loop.run_in_executor(
-            None, self._watch_shutdown_event_executor)
+        await self._shutdown_client_event.wait_async()
 
         gl.verbose("Client received shutdown event")
 
@@ -150,110 +702,94 @@ class Client(object):
                 gl.debug_warning("Could not close file download writer, was "
                                  "probably closed")
 
-    def _watch_shutdown_event_executor(self):
-        """
-        Wait for the shutdown event in a separate thread.
-
-        """
-        return self._shutdown_client_event.wait()
-
     ##################################################################
     # watch the connections to the proxy
     #
-    async def _connection_watchdog_coro(self):
+    def _set_connection_active(self, index=None, new_file_information=None):
         """
-        Watch all connections and set an event if all connections are active.
+        Note that the index or the new file information connection was opened
+        or dropped.
 
-        """
-        while True:
+        The proxy connection active event is set while both connections are
+        active. The queues are cleaned up whenever a connection drops.
 
-            if self._shutdown_client_event.is_set():
-                return
+        Args:
+         index (bool or None, defaults to None): The new state of the index
+          connection, None if it did not change.
+         new_file_information (bool or None, defaults to None): The new state
+          of the new file information connection, None if it did not change.
 
-            if (
-                self._index_connection_active and
-                self._new_file_information_connection_active
-            ):
-                if not self._proxy_connection_active_event.is_set():
-                    self._proxy_connection_active_event.set()
-            else:
-                self._proxy_connection_active_event.clear()
+        """
+        if index is not None:
+            self._index_connection_active = index
 
-            await asyncio.sleep(1e-1)
+        if new_file_information is not None:
+            self._new_file_information_connection_active = new_file_information
+
+        if (
+            self._index_connection_active and
+            self._new_file_information_connection_active
+        ):
+            self._proxy_connection_active_event.set()
+        else:
+            self._proxy_connection_active_event.clear()
 
+        if index is False or new_file_information is False:
+            self._queue_cleanup()
 
     ##################################################################
     # handle the cleanup of queues when connections are not active
     #
-    async def _queue_cleanup_coro(self):
+    def _queue_cleanup(self):
         """
-        If there are no connections to the client the queues have to be emptied.
+        Clean up the queues after a connection dropped.
 
-        If they are not then there will be an unnecessary burst of information
-        on connection.
+        If they are not emptied there will be an unnecessary burst of
+        information on connection. Answers that are still in the data queue
+        after three connection drops are removed.
 
         """
-        queue_cleanup = await self._loop.run_in_executor(
-            None, self._queue_cleanup_executor)
+        new_data_in_queue_occurences = dict()
 
-    def _queue_cleanup_executor(self):
-        """
-        Run the queue cleanup in a separate thread.
-
-        Do this because we would be blocking the thread when waiting for the
-        shutdown event.
-
-        """
-        # remember which files we spotted in the queue how many times
-        data_in_queue_occurences = dict()
-
-        while True:
-
-            # wait for 5 seconds, this is essentially a 5 second interval timer
-            if self._shutdown_client_event.wait(5):
-                return
+        # reset the index requests
+        if not self._index_connection_active:
+            self._get_index_event.clear()
 
-            new_data_in_queue_occurences = dict()
+        # clear the queue of things that are no longer needed
+        #
+        # this is of course a race condition with the actual file retrieval
+        # but qsize is a bit slow, so I think this is fine
+        data_queue_size = self._file_contents_name_hash_client_queue.qsize()
 
-            # reset the index requests
-            if not self._index_connection_active:
-                self._get_index_event.clear()
+        gl.debug("Data queue contains {} objects".format(data_queue_size))
 
-            # clear the queue of things that are no longer needed
-            #
-            # this is of course a race condition with the actual file retrieval
-            # but qsize is a bit slow, so I think this is fine
-            data_queue_size = self._file_contents_name_hash_client_queue.qsize()
+        for i in range(data_queue_size):
+            try:
+                data = self._file_contents_name_hash_client_queue.get_nowait()
+            except queue.Empty:
+                break
+            else:
+                data_object = data["file_request"]["object"]
+                data_namespace = data["file_request"]["namespace"]
 
-            gl.debug("Data queue contains {} objects".format(data_queue_size))
+                data_name = "{}/{}".format(data_namespace, data_object)
 
-            for i in range(data_queue_size):
                 try:
-                    data = self._file_contents_name_hash_client_queue.get()
-                except queue.Empty:
-                    pass
-                else:
-                    data_object = data["file_request"]["object"]
-                    data_namespace = data["file_request"]["namespace"]
-
-                    data_name = "{}/{}".format(data_namespace, data_object)
-
-                    try:
-                        last_occ_count = data_in_queue_occurences[data_name]
-                    except KeyError:
-                        last_occ_count = 0
+                    last_occ_count = self._data_in_queue_occurences[data_name]
+                except KeyError:
+                    last_occ_count = 0
 
-                    new_data_in_queue_occurences[data_name] = last_occ_count + 1
+                new_data_in_queue_occurences[data_name] = last_occ_count + 1
 
-                    # reinsert into queue or delete it (don't reinsert)
-                    if ((last_occ_count + 1) < 3):
-                        self._file_contents_name_hash_client_queue.put(data)
-                    else:
-                        gl.debug_warning("Removing {} from data "
-                                         "queue".format(data_name))
-                        pass    # delete it
+                # reinsert into queue or delete it (don't reinsert)
+                if ((last_occ_count + 1) < 3):
+                    self._file_contents_name_hash_client_queue.put(data)
+                else:
+                    gl.debug_warning("Removing {} from data "
+                                     "queue".format(data_name))
+                    pass    # delete it
 
-            data_in_queue_occurences = new_data_in_queue_occurences.copy()
+        self._data_in_queue_occurences = new_data_in_queue_occurences
 
     ##################################################################
     # handle the pushing of information about new files from the server
@@ -289,7 +825,7 @@ class Client(object):
                 await self.send_connection(
                     new_file_reader, self._new_file_writer, task_handshake)
 
-                self._new_file_information_connection_active = True
+                self._set_connection_active(new_file_information=True)
 
                 try:
                     while not new_file_reader.at_eof():
@@ -309,7 +845,7 @@ class Client(object):
 
                 finally:
                     self._new_file_writer.close()
-                    self._new_file_information_connection_active = False
+                    self._set_connection_active(new_file_information=False)
                     gl.info("New file connection closed")
 
     async def read_new_file(self, reader, writer):
@@ -362,13 +898,7 @@ class Client(object):
                 await self.send_connection(
                     index_request_reader, self._index_request_writer, task_handshake)
 
-                self._index_connection_active = True
-
-                self._cancel_index_executor_event = threading.Event()
-
-                index_connection_watchdog = self._loop.create_task(
-                    self._watch_index_connection(
-                        index_request_reader, self._index_request_writer))
+                self._set_connection_active(index=True)
 
                 try:
                     while not index_request_reader.at_eof():
@@ -389,65 +919,96 @@ class Client(object):
 
                 finally:
                     self._index_request_writer.close()
-                    self._index_connection_active = True
+                    self._set_connection_active(index=False)
                     gl.info("Index connection closed")
 
-    async def _watch_index_connection(self, reader, writer):
+    async def _next_index_request(self):
         """
-        Check the connection and set an event if it drops.
+        Wait for the next index request.
+
+        Returns:
+         dict: The request.
 
         """
-        while True:
-            if reader.at_eof():
-                self._cancel_index_executor_event.set()
-                return
-            await asyncio.sleep(.1)
+        if self._index_request_queue is not None:
+            return await self._index_request_queue.get_async()
+
+        await self._get_index_event.wait_async()
+        return {"todo": "index"}
 
     async def watch_index_events(self, reader, writer):
         """
-        Watch index events in a separate executor.
+        Wait for an index request and get the index from the server.
+
+        The gateway sends nothing on the index connection unless asked, so
+        while we wait for a request we read from the connection to notice
+        when it drops.
+
+        Raises:
+         ConnectionError: If the gateway sent something unasked.
 
         """
-        get_index_event = await self._loop.run_in_executor(
-            None, self.index_event_executor)
+        request_task = self._loop.create_task(self._next_index_request())
+        drop_task = self._loop.create_task(reader.read(1))
+
+        await asyncio.wait(
+            [request_task, drop_task], return_when=asyncio.FIRST_COMPLETED)
+
+        if drop_task.done():
+            request_task.cancel()
+            with suppress(asyncio.CancelledError):
+                request = await request_task
+                # do not lose a request that came at the same time
+                if self._index_request_queue is not None:
+                    self._index_request_queue.put(request)
 
-        if not get_index_event:
+            if drop_task.result():
+                raise ConnectionError(
+                    "unexpected data on the index connection")
+
+            # the connection was closed
             return None
 
+        drop_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await drop_task
+
+        request = await request_task
+
+        self._get_index_event.clear()
+
         gl.info("Index request received")
 
-        index = await self.get_index(reader, writer)
+        index = await self.get_index(reader, writer, request)
 
         self._index_data_queue.put(index)
 
         return True             # something other than None
 
-    def index_event_executor(self):
+    async def get_index(self, reader, writer, request=None):
         """
-        Watch the index events.
+        Request (a part of) the index and read the answer.
 
-        """
-        while True:
-
-            if self._cancel_index_executor_event.is_set():
-                self._cancel_index_executor_event.clear()
-                return None
+        When streaming, the request offers ``"stream": "ndjson"``. A gateway
+        that takes the offer answers with the header ``{"stream": "ndjson",
+        "length": n}``, followed by n bytes of newline delimited JSON records
+        and our final ACK. The records are not decoded here, they go to the
+        index data queue in parts as they arrive, see ``_read_index_stream``.
 
-            get_index_event = self._get_index_event.wait(.1)
+        Args:
+         request (dict or None, defaults to None): The request, the whole
+          index if None.
 
-            if get_index_event:
+        Returns:
+         dict or None: The answer, or the item that ends the stream.
 
-                self._get_index_event.clear()
-                return get_index_event
-            else:
-                pass
-
-    async def get_index(self, reader, writer):
         """
-        Write something over the connection.
+        if request is None:
+            request = {"todo": "index"}
 
-        """
-        dictionary = {"todo": "index"}
+        dictionary = request
+        if self._stream_index:
+            dictionary = dict(request, stream="ndjson")
 
         gl.debug("Sending index request")
         if await self.send_connection(reader, writer, dictionary):
@@ -462,15 +1023,55 @@ class Client(object):
 
             await self.send_ack(writer)
 
+            if isinstance(index, dict) and index.get("stream") == "ndjson":
+                return await self._read_index_stream(
+                    reader, writer, request, index["length"])
+
             return index
 
+    async def _read_index_stream(self, reader, writer, request, length,
+                                 chunk_size=1024*1024):
+        """
+        Hand the records of a streamed index answer to the index data queue
+        as ``{"stream": request, "data": bytes}``, in parts of at most
+        ``chunk_size`` bytes.
+
+        Returns:
+         dict: ``{"stream": request, "end": True}`` after the last part, or
+         ``{"stream": request, "error": reason}`` if the connection broke.
+
+        """
+        remaining = length
+
+        try:
+            while remaining:
+                data = await reader.read(min(chunk_size, remaining))
+
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+
+                remaining -= len(data)
+                self._index_data_queue.put({"stream": request, "data": data})
+
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            gl.warning("Index stream broke with {} of {} bytes left".format(
+                remaining, length))
+            return {"stream": request, "error": "connection lost"}
+
+        await self.send_ack(writer)
+
+        gl.debug("Index stream of {} bytes received".format(length))
+
+        return {"stream": request, "end": True}
+
 
     ##################################################################
     # handle requests for files directly by opening a connection
     #
     async def _file_download_coro(self):
         """
-        For every file request open a connection and answer directly.
+        Hand every file request to the download scheduler, which starts the
+        downloads by priority.
 
         """
         while True:
@@ -478,138 +1079,763 @@ class Client(object):
             if self._shutdown_client_event.is_set():
                 return
 
-            # self._cancel_download_request_executor_event = threading.Event()
-
             # figure out which file we want to download
-            watch_download_request_queue_task = self._loop.create_task(
-                self.watch_download_request_queue()
-            )
-            download_request = await watch_download_request_queue_task
-
-            # download that file from the proxy
-            file_download_task = self._loop.create_task(
-                self._download_and_return_file(download_request)
+            download_request = (
+                await self._file_name_request_client_queue.get_async(
+                    until=self._shutdown_client_event)
             )
 
-    async def watch_download_request_queue(self):
-        """
-        Watch index events in a separate executor.
-
-        """
-        file_request_in_queue = await self._loop.run_in_executor(
-            None, self.download_request_event_executor)
+            if download_request is None:
+                continue
 
-        if file_request_in_queue is not None:
             gl.debug("Requested file data and hash")
 
-        return file_request_in_queue
+            # single requests when the gateway can not handle batches
+            if "keys" in download_request and not self._batch_requests:
+                for key in download_request["keys"]:
+                    self._download_scheduler.submit({
+                        "namespace": download_request["namespace"],
+                        "key": key,
+                        "priority": download_request.get(
+                            "priority", "interactive")
+                    })
+            else:
+                self._download_scheduler.submit(download_request)
+
+            self._start_downloads()
 
-    def download_request_event_executor(self):
+    def _start_downloads(self):
         """
-        Watch the index events.
-
-        Do this because we block when we get from the queue in a blocking
-        fashion.
+        Start the queued downloads the scheduler allows.
 
         """
         while True:
+            request = self._download_scheduler.next_request()
 
-            if self._shutdown_client_event.is_set():
-                return None
+            if request is None:
+                return
 
-            try:
-                push_file = self._file_name_request_client_queue.get(True, .1)
-            except queue.Empty:
-                pass
+            # download the file(s) from the proxy
+            if len(request["keys"]) > 1:
+                file_download_task = self._loop.create_task(
+                    self._download_and_return_batch(request)
+                )
             else:
-                return push_file
+                file_download_task = self._loop.create_task(
+                    self._download_and_return_file(
+                        {"namespace": request["namespace"],
+                         "key": request["keys"][0]})
+                )
+
+            file_download_task.add_done_callback(
+                functools.partial(self._download_finished, request))
+
+    def _download_finished(self, request, task):
+        """
+        Free the slot of a finished download and start the next ones.
+
+        """
+        self._download_scheduler.finished(request)
+
+        if not self._loop.is_closed():
+            self._start_downloads()
 
     async def _download_and_return_file(self, requested_file):
         """
-        Request a file from a server.
+        Request a file from the server over a pooled connection.
+
+        Broken connections are replaced and the request is retried a few
+        times before we give up. Errors the gateway reports for the request
+        itself are not retried.
 
         """
-        counter = 0
-        while True:
+        requested_descriptor = "{}/{}".format(
+            requested_file["namespace"],
+            requested_file["key"])
 
-            if self._shutdown_client_event.is_set():
-                return
+        # wait for a free slot in the pool
+        async with self._download_slots:
+
+            for attempt in range(3):
+
+                if self._shutdown_client_event.is_set():
+                    return
+
+                try:
+                    if self._pipelined:
+                        res = await self._request_file_pipelined(
+                            requested_file)
+                    else:
+                        res = await self._request_file_pooled(requested_file)
+
+                except GatewayRequestError as e:
+                    gl.warning("Gateway can not deliver {}: {}".format(
+                        requested_descriptor, e))
+                    self._hand_on_error(
+                        requested_file["namespace"], requested_file["key"],
+                        str(e))
+                    return
+
+                if res is None:
+                    continue
+
+                object_descriptor = "{}/{}".format(
+                    res["file_request"]["namespace"],
+                    res["file_request"]["object"])
+
+                gl.debug("Received {}".format(object_descriptor))
+
+                if object_descriptor == requested_descriptor:
+                    await self._hand_on_answer(res)
+                    return
+
+                gl.debug_warning("Not the requested file, trying again")
+
+            gl.warning("Giving up on requesting {}".format(
+                requested_descriptor))
+            self._hand_on_error(
+                requested_file["namespace"], requested_file["key"],
+                "no answer after 3 attempts")
+
+    async def _download_and_return_batch(self, batch_request):
+        """
+        Request several files of a namespace with one message.
+
+        The answers are handed on as they arrive. If the connection breaks the
+        objects we did not get yet are requested again.
+
+        Args:
+         batch_request (dict): ``{"namespace": ..., "keys": [...]}``.
+
+        """
+        namespace = batch_request["namespace"]
+        remaining_keys = list(batch_request["keys"])
+
+        if not self._batch_requests:
+            await asyncio.gather(*[
+                self._download_and_return_file(
+                    {"namespace": namespace, "key": key})
+                for key in remaining_keys
+            ])
+            return
+
+        # a batch takes one slot in the pool
+        async with self._download_slots:
+
+            for attempt in range(3):
+
+                if self._shutdown_client_event.is_set():
+                    return
+
+                if self._pipelined:
+                    done_keys = await self._request_batch_pipelined(
+                        namespace, remaining_keys)
+                else:
+                    done_keys = await self._request_batch_pooled(
+                        namespace, remaining_keys)
+
+                remaining_keys = [
+                    key for key in remaining_keys if key not in done_keys]
+
+                if not remaining_keys:
+                    return
+
+            gl.warning("Giving up on requesting {} objects in {}".format(
+                len(remaining_keys), namespace))
+            for key in remaining_keys:
+                self._hand_on_error(
+                    namespace, key, "no answer after 3 attempts")
+
+    async def _request_batch_pooled(self, namespace, keys):
+        """
+        Request a batch over a stop-and-wait connection from the pool.
+
+        Returns:
+         set: The keys that were answered, delivered or failed.
+
+        """
+        done_keys = set()
+
+        connection = await self._acquire_download_connection()
+
+        if connection is None:
+            gl.warning("Can't establish a connection to request files, "
+                       "waiting a bit")
+            await asyncio.sleep(3.5)
+            return done_keys
+
+        reader, writer = connection
+
+        batch_request_dict = {
+            "requested_files": {"namespace": namespace, "keys": keys}}
+
+        try:
+            if not await self.send_connection(
+                    reader, writer, batch_request_dict):
+                raise ConnectionError("batch request was not acknowledged")
+
+            for key in keys:
+                res = await self._read_answer(connection)
+
+                if res is None:
+                    raise ConnectionError("batch answer is incomplete")
+
+                await self._deliver_batch_answer(namespace, res, done_keys)
+
+        except Exception as e:
+            gl.error("Exception in batch request: {}".format(e))
+            self._close_download_connection(connection)
+
+        else:
+            self._release_download_connection(connection)
+
+        return done_keys
+
+    async def _request_batch_pipelined(self, namespace, keys):
+        """
+        Request a batch over a pipelined connection.
+
+        Returns:
+         set: The keys that were answered, delivered or failed.
+
+        """
+        done_keys = set()
+
+        connection = await self._acquire_pipelined_connection()
+
+        if connection is None and not self._pipelined:
+            # the gateway does not speak the pipelined protocol
+            return await self._request_batch_pooled(namespace, keys)
+
+        if connection is None:
+            gl.warning("Can't establish a connection to request files, "
+                       "waiting a bit")
+            await asyncio.sleep(3.5)
+            return done_keys
+
+        try:
+            async for res in connection.request_batch(namespace, keys):
+                await self._deliver_batch_answer(namespace, res, done_keys)
+
+        except ConnectionError as e:
+            gl.warning("Pipelined batch request failed: {}".format(e))
+
+        return done_keys
+
+    async def _deliver_batch_answer(self, namespace, res, done_keys):
+        """
+        Hand on one answer of a batch and remember its key.
+
+        """
+        if "error" in res:
+            gl.warning("Gateway can not deliver {}/{}: {}".format(
+                namespace, res.get("object"), res["error"]))
+            done_keys.add(res.get("object"))
+            self._hand_on_error(namespace, res.get("object"), res["error"])
+            return
+
+        file_request = res["file_request"]
+
+        if file_request["namespace"] != namespace:
+            gl.debug_warning("Not a requested file: {}/{}".format(
+                file_request["namespace"], file_request["object"]))
+            return
+
+        gl.debug("Received {}/{}".format(namespace, file_request["object"]))
+
+        done_keys.add(file_request["object"])
+        await self._hand_on_answer(res)
+
+    async def _hand_on_answer(self, res):
+        """
+        Decompress the contents of an answer off the event loop, count them
+        and hand the answer on.
+
+        """
+        file_request = res["file_request"]
+        compression = file_request.pop("compression", None)
+
+        wire_bytes = len(file_request["contents"])
+        stats = self._transfer_stats
+
+        if compression is not None:
+            start = time.perf_counter()
+
+            # large objects are decompressed into a temporary file
+            out = None
+            if (
+                    self._spill_threshold is not None and
+                    compression.get("length", 0) >= max(
+                        self._spill_threshold, 1)
+            ):
+                out = _spill_buffer(compression["length"], self._spill_dir)
 
             try:
-                # open a connection
-                gl.info("Attempting to open a connection for requesting files")
-                file_request_reader, file_request_writer = (
-                    await asyncio.open_connection(
-                        self._host, self._port, loop=self._loop)
-                )
+                file_request["contents"] = await self._loop.run_in_executor(
+                    None, tc.decompress, file_request["contents"],
+                    compression, out)
+            except Exception as e:
+                gl.error("Could not decompress {}/{}: {}".format(
+                    file_request["namespace"], file_request["object"], e))
+                self._hand_on_error(
+                    file_request["namespace"], file_request["object"],
+                    "could not decompress: {}".format(e))
+                return
 
-                # store writer in list
-                self._file_download_writer_list.append(file_request_writer)
+            stats["decompress_seconds"] += time.perf_counter() - start
+            stats["compressed_objects"] += 1
 
-            except (OSError, asyncio.TimeoutError):
-                counter += 1
-                if counter == 3:
-                    gl.warning("Too many timeouts")
-                    break
+        stats["objects"] += 1
+        stats["wire_bytes"] += wire_bytes
+        stats["bytes"] += len(file_request["contents"])
+        stats["transfer_seconds"] += res.pop("transfer_seconds", 0.0)
 
-                self._file_download_writer_list.append(file_request_writer)
+        self._file_contents_name_hash_client_queue.put(res)
 
-                gl.warning("Can't establish a connection to request files, "
-                             "waiting a bit")
-                await asyncio.sleep(3.5)
+    def _hand_on_error(self, namespace, key, reason):
+        """
+        Tell the waiters of an object that it will not arrive, with an answer
+        ``{"file_request": {"namespace": ..., "object": ...}, "error": ...}``.
 
-            else:
-                try:
-                    # perform a handshake for this connection
-                    task_handshake_request = {"task": "file_download"}
-                    await self.send_connection(
-                        file_request_reader,
-                        file_request_writer,
-                        task_handshake_request
-                    )
-
-                    file_request_dict = {"requested_file": requested_file}
-                    requested_descriptor = "{}/{}".format(
-                        requested_file["namespace"],
-                        requested_file["key"])
-
-                    await self.send_connection(
-                        file_request_reader,
-                        file_request_writer,
-                        file_request_dict
-                    )
-
-                    res = await self.read_data(file_request_reader, file_request_writer)
-
-                    if not res:
-                        await self.send_nack(file_request_writer)
-                        return
-                    await self.send_ack(file_request_writer)
+        """
+        self._file_contents_name_hash_client_queue.put({
+            "file_request": {"namespace": namespace, "object": key},
+            "error": reason
+        })
 
-                    object_descriptor = "{}/{}".format(
-                        res["file_request"]["namespace"],
-                        res["file_request"]["object"])
+    def transfer_stats(self):
+        """
+        Report how well the object contents compressed and how fast they
+        arrived.
 
-                    gl.debug("Received {}".format(object_descriptor))
+        Returns:
+         dict: The counters plus ``ratio`` (bytes per byte on the wire),
+         ``wire_throughput`` and ``throughput`` (bytes per second of
+         transfer, before and after decompression) and
+         ``decompress_throughput`` (bytes per second of decompression).
 
-                    if object_descriptor == requested_descriptor:
-                        # decode the base64 contents
-                        res["file_request"]["contents"] = base64.b64decode(
-                            res["file_request"]["contents"].encode())
-                        self._file_contents_name_hash_client_queue.put(res)
-                        break
+        """
+        stats = dict(self._transfer_stats)
 
-                    else:
-                        gl.debug_warning("Not the requested file, trying again")
+        def per(numerator, denominator):
+            return numerator / denominator if denominator else None
 
-                except Exception as e:
-                    gl.error("Exception in requests: {}".format(e))
+        stats["ratio"] = per(stats["bytes"], stats["wire_bytes"])
+        stats["wire_throughput"] = per(
+            stats["wire_bytes"], stats["transfer_seconds"])
+        stats["throughput"] = per(stats["bytes"], stats["transfer_seconds"])
+        stats["decompress_throughput"] = per(
+            stats["bytes"], stats["decompress_seconds"])
 
-                finally:
-                    self._file_download_writer_list.remove(file_request_writer)
-                    file_request_writer.close()
-                    # self._file_request_connection_active = False
-                    gl.info("Request connection closed")
+        return stats
+
+    def request_stats(self):
+        """
+        Report how many object downloads were avoided because the object was
+        on its way or downloaded already.
+
+        Returns:
+         dict: The ``requested``, ``coalesced`` and ``cached`` counters of
+         the backend plus ``scheduler_coalesced``, the requests the download
+         scheduler merged with a queued or running download.
+
+        """
+        stats = pd.request_stats()
+        stats["scheduler_coalesced"] = self.coalesced_requests
+
+        return stats
+
+    async def _request_file_pooled(self, requested_file):
+        """
+        Request a file over a stop-and-wait connection from the pool.
+
+        Returns:
+         dict or None: The answer of the server or None if the request failed.
+
+        Raises:
+         GatewayRequestError: If the gateway reports an error for the request.
+
+        """
+        connection = await self._acquire_download_connection()
+
+        if connection is None:
+            gl.warning("Can't establish a connection to request files, "
+                       "waiting a bit")
+            await asyncio.sleep(3.5)
+            return None
+
+        try:
+            res = await self._request_file(connection, requested_file)
+        except Exception as e:
+            gl.error("Exception in requests: {}".format(e))
+            res = None
+
+        if res is None:
+            # the connection is in an unknown state, do not reuse it
+            self._close_download_connection(connection)
+        else:
+            self._release_download_connection(connection)
+
+        if res is not None and "error" in res:
+            raise GatewayRequestError(res["error"])
+
+        return res
+
+    async def _request_file_pipelined(self, requested_file):
+        """
+        Request a file over a pipelined connection.
+
+        Returns:
+         dict or None: The answer of the server or None if the connection
+         failed.
+
+        Raises:
+         GatewayRequestError: If the gateway reports an error for the request.
+
+        """
+        connection = await self._acquire_pipelined_connection()
+
+        if connection is None and not self._pipelined:
+            # the gateway does not speak the pipelined protocol
+            return await self._request_file_pooled(requested_file)
+
+        if connection is None:
+            gl.warning("Can't establish a connection to request files, "
+                       "waiting a bit")
+            await asyncio.sleep(3.5)
+            return None
+
+        try:
+            return await connection.request(requested_file)
+        except ConnectionError as e:
+            gl.warning("Pipelined request failed: {}".format(e))
+            return None
+
+    async def _request_file(self, connection, requested_file):
+        """
+        Request one file over an established download connection.
+
+        The contents either arrive base64 encoded inside the JSON answer, or,
+        in binary transfer mode, as raw bytes following a JSON header that
+        contains their length (``contents_length``).
+
+        Returns:
+         dict or None: The answer of the server with the decoded contents in
+         ``["file_request"]["contents"]`` or None if the request failed.
+
+        """
+        reader, writer = connection
+
+        file_request_dict = {"requested_file": requested_file}
+
+        if not await self.send_connection(reader, writer, file_request_dict):
+            return None
+
+        return await self._read_answer(connection)
+
+    async def _read_answer(self, connection):
+        """
+        Read one answer to a file request over a stop-and-wait connection.
+
+        Returns:
+         dict or None: The answer of the server with the decoded contents in
+         ``["file_request"]["contents"]``, an answer containing ``error`` if
+         the server can not deliver the file or None if reading failed.
+
+        """
+        reader, writer = connection
+
+        res = await self.read_data(reader, writer)
+
+        if not res:
+            await self.send_nack(writer)
+            return None
+
+        await self.send_ack(writer)
+
+        if "error" in res:
+            return res
+
+        file_request = res["file_request"]
+
+        if "contents_length" in file_request:
+            # binary transfer, the raw contents follow the header
+            start = time.perf_counter()
+            file_request["contents"] = await _read_payload(
+                reader, file_request.pop("contents_length"),
+                spill_threshold=self._spill_threshold,
+                spill_dir=self._spill_dir)
+            res["transfer_seconds"] = time.perf_counter() - start
+
+            await self.send_ack(writer)
+
+        else:
+            # decode the base64 contents
+            file_request["contents"] = base64.b64decode(
+                file_request["contents"].encode())
+
+        return res
+
+    ##################################################################
+    # the pool of file download connections
+    #
+    async def _acquire_download_connection(self):
+        """
+        Get a healthy connection from the pool or open a new one.
+
+        Returns:
+         tuple or None: ``(reader, writer)`` or None if we could not connect.
+
+        """
+        while self._idle_download_connections:
+            connection = self._idle_download_connections.pop()
+
+            if self._download_connection_healthy(connection):
+                return connection
+
+            gl.debug("Dropping broken file download connection")
+            self._close_download_connection(connection)
+
+        return await self._open_download_connection()
+
+    def _release_download_connection(self, connection):
+        """
+        Put a connection back into the pool.
+
+        """
+        if (
+                self._shutdown_client_event.is_set() or
+                not self._download_connection_healthy(connection)
+        ):
+            self._close_download_connection(connection)
+            return
+
+        self._idle_download_connections.append(connection)
+
+    async def _open_download_connection(self, pipelined=False):
+        """
+        Open a new file download connection and perform the handshake.
+
+        Args:
+         pipelined (bool, defaults to False): Ask for the pipelined protocol,
+          every message after the handshake is then sent without ACKs. If the
+          gateway does not accept it the client falls back to stop-and-wait.
+
+        Returns:
+         tuple or None: ``(reader, writer)`` or None if we could not connect
+         or the gateway did not accept the pipelined protocol.
+
+        """
+        try:
+            gl.info("Attempting to open a connection for requesting files")
+            reader, writer = await asyncio.open_connection(
+                self._host, self._port)
+
+        except (OSError, asyncio.TimeoutError) as e:
+            gl.debug_warning("Opening file download connection failed: "
+                             "{}".format(e))
+            return None
+
+        # store writer in list
+        self._file_download_writer_list.append(writer)
+        connection = (reader, writer)
+
+        # perform a handshake for this connection
+        task_handshake_request = {"task": "file_download"}
+        if self._binary_transfer or pipelined:
+            task_handshake_request["transfer"] = "binary"
+        if pipelined:
+            task_handshake_request["protocol"] = "pipelined"
+        if self._compression and "transfer" in task_handshake_request:
+            task_handshake_request["compression"] = self._compression
+
+        try:
+            handshake_ok = await self.send_connection(
+                reader, writer, task_handshake_request)
+
+            if handshake_ok and pipelined:
+                accepted = await self._pipelined_accepted(reader)
+
+        except Exception as e:
+            gl.error("Exception in file download handshake: {}".format(e))
+            handshake_ok = False
+
+        if not handshake_ok:
+            self._close_download_connection(connection)
+            return None
+
+        if pipelined and not accepted:
+            self._close_download_connection(connection)
+            self._fall_back_to_stop_and_wait()
+            return None
+
+        return connection
+
+    async def _pipelined_accepted(self, reader):
+        """
+        Read the answer of the gateway to a pipelined handshake.
+
+        A gateway that speaks the pipelined protocol confirms it with
+        ``{"protocol": "pipelined"}`` before the first answer. Older gateways
+        send nothing and serve the connection stop-and-wait.
+
+        Returns:
+         bool: True if the gateway accepted the pipelined protocol.
+
+        """
+        try:
+            reply = await asyncio.wait_for(
+                _read_frame(reader), PIPELINED_ACCEPT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+
+        return reply.get("protocol") == "pipelined"
+
+    def _fall_back_to_stop_and_wait(self):
+        """
+        Download over stop-and-wait connections from now on, with one request
+        per connection of the pool.
+
+        """
+        if not self._pipelined:
+            return
+
+        gl.warning("The gateway did not accept the pipelined protocol, "
+                   "falling back to stop-and-wait")
+
+        self._pipelined = False
+        self._download_slots = asyncio.Semaphore(self._pool_size)
+        self._download_scheduler.set_capacity(self._pool_size)
+
+    def _close_download_connection(self, connection):
+        """
+        Close a file download connection.
+
+        """
+        reader, writer = connection
+
+        with suppress(ValueError):
+            self._file_download_writer_list.remove(writer)
+
+        try:
+            writer.close()
+        except Exception as e:
+            gl.debug_warning("Could not close file download writer, was "
+                             "probably closed")
+
+        gl.info("Request connection closed")
+
+    def _download_connection_healthy(self, connection):
+        """
+        Check if a connection can still be used.
+
+        """
+        reader, writer = connection
+
+        return (
+            not reader.at_eof() and
+            reader.exception() is None and
+            not writer.transport.is_closing()
+        )
+
+    async def _acquire_pipelined_connection(self):
+        """
+        Get the pipelined connection with the fewest requests in flight, open
+        another one while the pool is not full.
+
+        Returns:
+         _PipelinedConnection or None: The connection or None if we could not
+         connect or the gateway did not accept the pipelined protocol.
+
+        """
+        async with self._pipelined_connect_lock:
+            if not self._pipelined:
+                return None
+
+            for connection in list(self._pipelined_connections):
+                if not connection.healthy():
+                    gl.debug("Dropping broken pipelined connection")
+                    self._close_pipelined_connection(connection)
+
+            if self._pipelined_connections:
+                connection = min(
+                    self._pipelined_connections, key=lambda c: c.in_flight())
+
+                if (
+                        connection.in_flight() == 0 or
+                        len(self._pipelined_connections) >= self._pool_size
+                ):
+                    return connection
+
+            connection = await self._open_download_connection(
+                pipelined=True)
+
+            if connection is None:
+                return None
+
+            connection = _PipelinedConnection(
+                *connection, spill_threshold=self._spill_threshold,
+                spill_dir=self._spill_dir)
+            self._pipelined_connections.append(connection)
+
+            return connection
+
+    def _close_pipelined_connection(self, connection):
+        """
+        Close a pipelined connection and remove it from the pool.
+
+        """
+        with suppress(ValueError):
+            self._pipelined_connections.remove(connection)
+        with suppress(ValueError):
+            self._file_download_writer_list.remove(connection.writer)
+
+        connection.close()
+
+    async def _transfer_report_coro(self, interval=60):
+        """
+        Regularly log the compression ratio and the throughput of the object
+        downloads, and how many duplicate downloads were avoided.
+
+        """
+        reported_objects = 0
+        reported_requests = None
+
+        while True:
+
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    self._shutdown_client_event.wait_async(), interval)
+
+            if self._shutdown_client_event.is_set():
+                return
+
+            stats = self.transfer_stats()
+
+            if stats["objects"] != reported_objects:
+                reported_objects = stats["objects"]
+
+                gl.info(
+                    "Downloaded {} objects ({} compressed), {:.1f} MB on the "
+                    "wire, ratio {:.2f}, {:.1f} MB/s".format(
+                        stats["objects"], stats["compressed_objects"],
+                        stats["wire_bytes"] / 1e6, stats["ratio"] or 1,
+                        (stats["throughput"] or 0) / 1e6))
+
+            request_stats = self.request_stats()
+
+            if request_stats != reported_requests:
+                reported_requests = request_stats
+
+                gl.info(
+                    "Requested {} objects, avoided {} duplicate downloads "
+                    "({} on their way, {} downloaded already, {} merged in "
+                    "the queue)".format(
+                        request_stats["requested"],
+                        request_stats["coalesced"] + request_stats["cached"] +
+                        request_stats["scheduler_coalesced"],
+                        request_stats["coalesced"], request_stats["cached"],
+                        request_stats["scheduler_coalesced"]))
 
     ##################################################################
     # utility functions for sending and receiving data to and from the client
@@ -625,17 +1851,17 @@ class Client(object):
         await self.send_nack(writer)
 
         """
-        # wait until we have read something that is up to 1k (until the newline
-        # comes)
+        # read exactly the length, so we never swallow the start of the next
+        # message
         try:
-            length_b = await reader.read(1024)
+            length_b = await reader.readexactly(struct.calcsize("L"))
+        except asyncio.IncompleteReadError:
+            return
         except ConnectionResetError as e:
             if self._shutdown_client_event.is_set():
                 pass
             else:
                 gl.warning("Connection reset while reading data")
-
-        if reader.at_eof():
             return
 
         try:
@@ -743,13 +1969,20 @@ class Client(object):
         Check for ack or nack.
 
         """
+        # read exactly "ack" or "nack", so we never swallow the start of the
+        # next message
         try:
-            ck = await reader.read(8)
+            ck = await reader.readexactly(3)
+            if ck.lower() == b"nac":
+                ck += await reader.readexactly(1)
+        except asyncio.IncompleteReadError:
+            return False
         except ConnectionResetError as e:
             if self._shutdown_client_event.is_set():
                 pass
             else:
                 gl.warning("Connection reset while reading ACK")
+            return False
 
         try:
             ck = ck.decode("UTF-8")
@@ -20,8 +20,14 @@ class ProxyServices(object):
     """
     Starts the proxy services.
 
+    Args:
+     comm_dict (dict): The queues and events for talking to the gateway
+      client.
+     index_file (os.PathLike or None, defaults to None): Keep the index in
+      this file, so the next start does not have to wait for the gateway.
+
     """
-    def __init__(self, comm_dict):
+    def __init__(self, comm_dict, index_file=None):
         bl.debug("Starting ProxyServices")
 
         self._comm_dict = comm_dict
@@ -29,7 +35,8 @@ class ProxyServices(object):
         self._loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self._loop)
 
-        self._pi = pi.ProxyIndex(self._loop, self._comm_dict)
+        self._pi = pi.ProxyIndex(
+            self._loop, self._comm_dict, index_file=index_file)
         self._pd = pd.ProxyData(self._loop, self._comm_dict)
 
         watch_incoming_files_task = self._loop.create_task(
@@ -89,6 +96,94 @@ def index(namespace=None):
     return pi.index(namespace=namespace)
 
 
+def namespace_list():
+    """
+    Return the names of every namespace on the gateway.
+
+    """
+    return pi.namespace_list()
+
+
+def acquire_namespace(namespace, timeout=None):
+    """
+    Load the index of a namespace and keep it loaded until
+    ``release_namespace``.
+
+    Returns:
+     bool: True if the namespace is loaded, False if it is not available.
+
+    """
+    return pi.acquire_namespace(namespace, timeout=timeout)
+
+
+def release_namespace(namespace):
+    """
+    Release a namespace, its index is evicted once nobody uses it.
+
+    """
+    pi.release_namespace(namespace)
+
+
+def timestep_index(namespace, timestep):
+    """
+    Return the ``TimestepIndex`` with the objects of one timestep, None if the
+    namespace or timestep is unknown.
+
+    """
+    return pi.timestep_index(namespace, timestep)
+
+
+def index_available():
+    """
+    Return True once there is an index, from the gateway or from the index
+    file of the last run.
+
+    """
+    return pi.index_version() > 0
+
+
+def index_version():
+    """
+    Return the version of the index, it changes whenever the index changes.
+
+    """
+    return pi.index_version()
+
+
+# the event for the state of the gateway connection, see wait_for_index
+ConnectionEvent = pi.ConnectionEvent
+
+
+def wait_for_index(connection_active_event=None, timeout=None):
+    """
+    Wait until there is an index, from the gateway or from the index file of
+    the last run, or until the connection to the gateway is active.
+
+    Returns:
+     bool: True if there is an index or the connection is active, False on
+     timeout.
+
+    """
+    return pi.wait_for_index(connection_active_event, timeout=timeout)
+
+
+def timestep_list(namespace):
+    """
+    Return the timesteps of a namespace in natural sort order, oldest first.
+
+    """
+    return pi.timestep_list(namespace)
+
+
+def adjacent_timestep(namespace, timestep, offset):
+    """
+    Return the timestep ``offset`` places after ``timestep`` in a namespace,
+    None if there is none.
+
+    """
+    return pi.adjacent_timestep(namespace, timestep, offset)
+
+
 def subscribe(source_dict=None):
     """
     Get the most recent timestep for the selected namespace/field/geometry.
@@ -107,3 +202,23 @@ def simulation_file(source_dict=None, namespace=None, object_key_list=[]):
     """
     return pd.simulation_file(source_dict=source_dict, namespace=namespace,
                               object_key_list=object_key_list)
+
+
+def download_priority(priority):
+    """
+    Request the downloads of the current thread with a priority.
+
+    Use as a context manager, the priority is one of ``interactive``,
+    ``tracking`` and ``prefetch``.
+
+    """
+    return pd.download_priority(priority)
+
+
+def request_stats():
+    """
+    Return how many downloads were requested and how many duplicates were
+    avoided.
+
+    """
+    return pd.request_stats()
@@ -7,7 +7,8 @@ import time
 import queue
 import asyncio
 import threading
-from contextlib import suppress
+import concurrent.futures
+from contextlib import suppress, contextmanager
 
 from util.loggers import BackendLog as bl
 
@@ -23,6 +24,41 @@ GATEWAY_DATA = dict()
 # after a certain time the data will be deleted again to keep memory consumption
 # down
 
+# every requested object that did not arrive yet has a future, the ingest
+# thread resolves it with the request_dict when the object lands
+PENDING_OBJECTS = dict()
+# formatting of PENDING_OBJECTS is as follows:
+# PENDING_OBJECTS = {namespace/object: concurrent.futures.Future, ...}
+# it is guarded by GW_LOCK as well
+
+# seconds simulation_file waits for requested objects by default
+DOWNLOAD_TIMEOUT = 100
+
+# download priority classes, most important first
+# interactive: data the user asked for and is waiting for
+# tracking: following the most recent timestep of a running simulation
+# prefetch: speculative downloads that may never be shown
+PRIORITIES = ["interactive", "tracking", "prefetch"]
+
+# the priority of the downloads requested by the current thread
+_PRIORITY = threading.local()
+
+# the priority every pending object was requested with, guarded by GW_LOCK
+PENDING_PRIORITIES = dict()
+
+# how simulation_file found the objects, guarded by GW_LOCK
+# requested: downloads we asked the gateway client for
+# coalesced: objects that were already on their way, no second download
+# cached: objects that were already downloaded
+REQUEST_STATS = {"requested": 0, "coalesced": 0, "cached": 0}
+
+
+class GatewayObjectError(Exception):
+    """
+    The gateway client could not get a requested object.
+
+    """
+
 
 class ProxyData(object):
     """
@@ -39,45 +75,62 @@ class ProxyData(object):
 
     async def _watch_incoming_files_coro(self):
         """
-        Start the watcher in an executor.
+        Enter new files into the global list as soon as they arrive.
 
         """
-        file_watcher = await self._loop.run_in_executor(
-            None, self._watch_incoming_files_executor)
+        while True:
+
+            ans = await self._file_request_answer_queue.get_async(
+                until=self._shutdown_event)
 
-    def _watch_incoming_files_executor(self):
+            if ans is None:
+                return
+
+            self._add_incoming_file(ans)
+
+    def _add_incoming_file(self, ans):
         """
-        Enter new files into the global list.
+        Enter a new file into the global list and wake up its waiters.
+
+        Answers with an ``error`` fail the waiters of the object instead.
 
         """
-        while True:
+        request_dict = ans["file_request"]
+        obj_key = request_dict["object"]
+        obj_namespace = request_dict["namespace"]
 
-            if self._shutdown_event.is_set():
-                return
+        object_descriptor = "{}/{}".format(obj_namespace, obj_key)
+
+        if "error" in ans:
+            bl.debug_warning("Could not get {}: {}".format(
+                object_descriptor, ans["error"]))
 
-            try:
-                ans = self._file_request_answer_queue.get(True, .1)
+            with GW_LOCK:
+                future = PENDING_OBJECTS.pop(object_descriptor, None)
+                PENDING_PRIORITIES.pop(object_descriptor, None)
 
-            except queue.Empty:
-                pass
+            if future is not None:
+                future.set_exception(GatewayObjectError(
+                    "{}: {}".format(object_descriptor, ans["error"])))
+            return
 
-            else:
-                request_dict = ans["file_request"]
-                obj_key = request_dict["object"]
-                obj_namespace = request_dict["namespace"]
+        bl.debug("Reading {} and making available".format(
+            object_descriptor))
 
-                object_descriptor = "{}/{}".format(obj_namespace, obj_key)
-                bl.debug("Reading {} and making available".format(
-                    object_descriptor))
+        occurence_key = object_descriptor
+        occurence_dict = {
+            "timestamp": time.time(),
+            "request_dict": request_dict
+        }
 
-                occurence_key = object_descriptor
-                occurence_dict = {
-                    "timestamp": time.time(),
-                    "request_dict": request_dict
-                }
+        with GW_LOCK:
+            GATEWAY_DATA[occurence_key] = occurence_dict
+            future = PENDING_OBJECTS.pop(occurence_key, None)
+            PENDING_PRIORITIES.pop(occurence_key, None)
 
-                with GW_LOCK:
-                    GATEWAY_DATA[occurence_key] = occurence_dict
+        # wake up everybody waiting for this object
+        if future is not None:
+            future.set_result(request_dict)
 
     async def _periodic_file_deletion_coro(self):
         """
@@ -121,92 +174,153 @@ def simulation_file(source_dict=None, namespace=None, object_key_list=[]):
     """
     Obtain a simulation file from the ceph cluster.
 
-    Note: this is an async function so that we can perform this action in
-    parallel.
+    Blocks until every requested object arrived, the gateway client reported
+    that an object can not be delivered or the deadline passed. The
+    deadline is ``source_dict["external"]["timeout"]`` seconds, defaulting to
+    ``DOWNLOAD_TIMEOUT``. Objects that are already on their way are not
+    requested again, unless they were requested with a lower priority. The
+    priority is set with ``download_priority``.
+
+    Returns:
+     list or None: The request dicts of the objects in the order of
+     ``object_key_list``, None if an object can not be delivered or the
+     deadline passed.
 
     """
     bl.debug("Requesting {} in namespace {}".format(object_key_list, namespace))
 
-    expectation_list = list()
-    for item in object_key_list:
-        expectation_list.append("{}/{}".format(namespace, item))
-
-    occurence_dict = dict()
-
     comm_dict = source_dict["external"]["comm_dict"]
     file_request_queue = comm_dict["file_request_queue"]
-    file_request_answer_queue = comm_dict["file_contents_name_hash_queue"]
+    timeout = source_dict["external"].get("timeout", DOWNLOAD_TIMEOUT)
+    priority = current_download_priority()
 
-    before_qsize = file_request_answer_queue.qsize()
-    if (before_qsize > 0):
-        bl.debug_warning("Data return queue is not empty, contains {} "
-                         "objects".format(before_qsize))
+    expectation_list = list()
+    future_list = list()
 
     # see if we have the data downloaded already, if not make the gateway client get it
-    for obj in object_key_list:
+    missing_key_list = list()
 
-        object_descriptor = "{}/{}".format(namespace, obj)
+    with GW_LOCK:
+        for obj in object_key_list:
+
+            object_descriptor = "{}/{}".format(namespace, obj)
+            expectation_list.append(object_descriptor)
 
-        with GW_LOCK:
             if object_descriptor in GATEWAY_DATA:
                 bl.debug("Found {} in downloaded data, updating timestamp".format(object_descriptor))
                 GATEWAY_DATA[object_descriptor]["timestamp"] = time.time()
+                REQUEST_STATS["cached"] += 1
+
+                future = concurrent.futures.Future()
+                future.set_result(
+                    GATEWAY_DATA[object_descriptor]["request_dict"])
+
+            elif object_descriptor in PENDING_OBJECTS:
+                bl.debug("Waiting for {}".format(object_descriptor))
+                REQUEST_STATS["coalesced"] += 1
+                future = PENDING_OBJECTS[object_descriptor]
+
+                # ask again with our priority, the gateway client moves the
+                # object ahead if it is still queued
+                if (
+                        PRIORITIES.index(priority) <
+                        PRIORITIES.index(PENDING_PRIORITIES[object_descriptor])
+                ):
+                    PENDING_PRIORITIES[object_descriptor] = priority
+                    missing_key_list.append(obj)
+
             else:
                 bl.debug("Downloading {}".format(object_descriptor))
-                req = {"namespace": namespace, "key": obj}
-                file_request_queue.put(req)
+                future = concurrent.futures.Future()
+                PENDING_OBJECTS[object_descriptor] = future
+                PENDING_PRIORITIES[object_descriptor] = priority
+                REQUEST_STATS["requested"] += 1
+                missing_key_list.append(obj)
+
+            future_list.append(future)
+
+    # request the missing objects of the namespace as one batch
+    if len(missing_key_list) == 1:
+        file_request_queue.put({"namespace": namespace, "key": missing_key_list[0],
+                                "priority": priority})
+    elif missing_key_list:
+        file_request_queue.put({"namespace": namespace, "keys": missing_key_list,
+                                "priority": priority})
+
+    # wait until we have everything downloaded or something failed
+    done, not_done = concurrent.futures.wait(
+        future_list, timeout=timeout,
+        return_when=concurrent.futures.FIRST_EXCEPTION)
+
+    failed = [future for future in done if future.exception() is not None]
+
+    if failed:
+        bl.warning("Could not get {} objects from gateway: {}".format(
+            len(failed), failed[0].exception()))
+        return None
+
+    if not_done:
+        bl.warning("Could not get {} objects from gateway within {} "
+                   "seconds.".format(len(not_done), timeout))
+
+        # forget the requests, so the next call requests the objects again
+        with GW_LOCK:
+            for object_descriptor, future in zip(expectation_list, future_list):
+                if PENDING_OBJECTS.get(object_descriptor) is future:
+                    del PENDING_OBJECTS[object_descriptor]
+                    del PENDING_PRIORITIES[object_descriptor]
 
+        return None
 
-    # keep track how often we try to get data from the dictionary
-    counter = 0
+    bl.debug("Data complete")
 
-    # wait until we have everything downloaded
-    while True:
+    # keep the data around while it is used
+    with GW_LOCK:
+        for object_descriptor in expectation_list:
+            if object_descriptor in GATEWAY_DATA:
+                GATEWAY_DATA[object_descriptor]["timestamp"] = time.time()
 
-        # wait a fraction of a second (rate throttling)
-        time.sleep(.1)
+    return [future.result() for future in future_list]
 
-        # do we have every file?
-        all_present = True
 
-        # get a list of keys in the GATEWAY_DATA
-        with GW_LOCK:
-            keys = list(GATEWAY_DATA.keys())
+def request_stats():
+    """
+    Return how often objects were requested, coalesced with a running
+    download or found in the downloaded data.
 
-        for object_descriptor in expectation_list:
+    """
+    with GW_LOCK:
+        return dict(REQUEST_STATS)
 
-            if not object_descriptor in keys:
-                all_present = False
 
-            # update timestamp
-            if object_descriptor in keys:
-                with GW_LOCK:
-                    GATEWAY_DATA[object_descriptor]["timestamp"] = time.time()
+@contextmanager
+def download_priority(priority):
+    """
+    Request the downloads of the current thread with a priority.
 
-        # break the loop
-        if all_present:
-            bl.debug("Data complete")
-            break
+    Args:
+     priority (str): One of ``PRIORITIES``.
 
-        counter += 1
-        if (counter > 1000):    # very large meshes take some time
-            bl.warning("Too many iterations. Could not get data from gateway.")
-            return
+    Raises:
+     ValueError: If the priority is unknown.
 
-    # prepare output of function
-    res_bin = [None] * len(object_key_list)
+    """
+    if priority not in PRIORITIES:
+        raise ValueError("unknown download priority {}".format(priority))
 
-    for object_descriptor in expectation_list:
-        with GW_LOCK:
-            GATEWAY_DATA[object_descriptor]["timestamp"] = time.time()
-            request_dict = GATEWAY_DATA[object_descriptor]["request_dict"]
+    previous_priority = current_download_priority()
+    _PRIORITY.value = priority
 
-        obj_namespace = request_dict["namespace"]
-        obj_key = request_dict["object"]
+    try:
+        yield
+    finally:
+        _PRIORITY.value = previous_priority
 
-        bl.debug("Loading {}/{}".format(obj_namespace, obj_key))
 
-        index = object_key_list.index(obj_key)
-        res_bin[index] = request_dict
+def current_download_priority():
+    """
+    Return the download priority of the current thread, interactive by
+    default.
 
-    return res_bin
+    """
+    return getattr(_PRIORITY, "value", "interactive")
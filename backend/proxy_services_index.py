@@ -2,24 +2,136 @@
 """
 Maintains the local index for the platt proxy.
 
+The index is published as immutable, versioned snapshots. Writers copy the
+part of the index they change, build a new ``IndexSnapshot`` and swap the
+module global ``INDEX_SNAPSHOT``. Readers take the current snapshot and work
+on it without locking, it never changes under their feet.
+
+The index of every namespace is a compact ``NamespaceIndex``, see
+``backend.util.compact_index``.
+
+Gateways that support it send a listing of the namespaces first::
+
+    {"todo": "index", "scope": "namespaces"} -> {"namespaces": [...]}
+
+and the index of a namespace when a dataset of it is opened::
+
+    {"todo": "index", "namespace": ns} -> {"namespace": ns,
+                                           "index": {ns: {...}}}
+
+Every opened dataset holds a reference to its namespace with
+``acquire_namespace``, the index of a namespace is evicted once the last
+reference is released. Older gateways ignore ``scope`` and answer with the
+index of every namespace, which we then keep as a whole.
+
+Gateways may stream any of these answers as newline delimited records, which
+are decoded in the index executor thread while they arrive, see
+``_IndexStream``.
+
 """
-import re
+import os
+import gzip
+import json
 import queue
-import asyncio
+import time
+import pathlib
 import threading
+import functools
 from contextlib import suppress
 
-import backend.util.recursive_dict_update as rcu
-import backend.util.nested_dict_check as ndc
+import backend.proxy_services_data as pd
+from backend.util.loop_signal import LoopQueue
+from backend.util.coalescing_workers import CoalescingWorkers
+from backend.util.compact_index import (
+    NamespaceIndex, parse_key, tree_objects)
 
 from util.loggers import BackendLog as bl
 
 
-# for locking the LOCAL_INDEX dictionary (thread safety)
+# for serializing the writers of the index, readers do not need it
 LI_LOCK = threading.Lock()
 
-# make this file-globally available
-LOCAL_INDEX = dict()
+# notified whenever a new snapshot is published, uses LI_LOCK
+_INDEX_CONDITION = threading.Condition(LI_LOCK)
+
+
+class IndexSnapshot(object):
+    """
+    One version of the index. Never modify a snapshot or the dicts in it.
+
+    Args:
+     version (int, defaults to 0): The version, every published snapshot
+      has a higher version than the one before.
+     namespaces (dict or None, defaults to None): The index, formatted as
+      {namespace: NamespaceIndex, ...}. Only the loaded namespaces.
+     listing (tuple or None, defaults to None): The names of every namespace
+      on the gateway, None until the gateway told us.
+
+    """
+    def __init__(self, version=0, namespaces=None, listing=None):
+        self.version = version
+        self.namespaces = namespaces if namespaces is not None else dict()
+        self.listing = listing
+
+
+# make this file-globally available, replaced by the writers as a whole
+INDEX_SNAPSHOT = IndexSnapshot()
+
+
+# the files announced while we wait for the fresh index, they are added to it
+# once it arrives, guarded by LI_LOCK
+_REPLAY_FILES = None
+
+# True if the gateway sends the index of every namespace on its own, the
+# namespaces are then loaded on demand and evicted, guarded by LI_LOCK
+_LAZY = False
+
+# the namespaces we asked the gateway for, with the files announced for them
+# in the meantime, {namespace: [parsed file, ...]}, guarded by LI_LOCK
+_LOADING = dict()
+
+# the number of datasets using a namespace, guarded by LI_LOCK
+_REFERENCES = dict()
+
+# the names of every namespace from the index file, listed until the gateway
+# tells us, guarded by LI_LOCK
+_FILE_LISTING = None
+
+# requests to the index connection of the gateway client, set by ProxyIndex
+_INDEX_REQUEST_QUEUE = None
+
+# put on the index data queue to wake the index updater on shutdown
+_SHUTDOWN = object()
+
+
+def _publish(namespaces, listing):
+    """
+    Make a new version of the index available to the readers.
+
+    The caller holds LI_LOCK.
+
+    """
+    global INDEX_SNAPSHOT
+
+    INDEX_SNAPSHOT = IndexSnapshot(
+        INDEX_SNAPSHOT.version + 1, namespaces, listing)
+
+    _INDEX_CONDITION.notify_all()
+
+
+class ConnectionEvent(threading.Event):
+    """
+    Tells if the connection to the gateway is active.
+
+    Setting it wakes ``wait_for_index``, so we can wait for the index and the
+    connection at the same time.
+
+    """
+    def set(self):
+        super().set()
+
+        with _INDEX_CONDITION:
+            _INDEX_CONDITION.notify_all()
 
 
 class ProxyIndex(object):
@@ -27,14 +139,29 @@ class ProxyIndex(object):
     Maintains a local index for the platt proxy.
 
     """
-    def __init__(self, event_loop, comm_dict):
+    def __init__(self, event_loop, comm_dict, batch_size=10000,
+                 index_file=None, index_file_interval=600):
         bl.debug("Starting ProxyIndex")
 
         self._loop = event_loop
         self._comm_dict = comm_dict
 
+        # the index of the last run, for starting without waiting for the
+        # gateway, and how often (seconds) we write it
+        self._index_file = index_file
+        self._index_file_interval = index_file_interval
+
+        # the most new file announcements that are added in one go
+        self._batch_size = batch_size
+
+        # the index answer that is streaming in, see _IndexStream
+        self._index_stream = None
+
         self._shutdown_event = comm_dict["shutdown_platt_gateway_event"]
 
+        global _INDEX_REQUEST_QUEUE
+        _INDEX_REQUEST_QUEUE = comm_dict.get("index_request_queue")
+
     async def _periodic_index_update_coro(self):
         """
         Update the index in periodic intervals.
@@ -45,234 +172,920 @@ class ProxyIndex(object):
 
     def _periodic_index_update_executor(self):
         """
-        Update the index in periodic intervals.
+        Load the index and keep answering our index requests.
+
+        If there is an index file from the last run it is published first,
+        so datasets can be listed right away. The fresh index, or the listing
+        of the namespaces, from the gateway replaces it once it arrives,
+        together with the files announced in the meantime. Afterwards the
+        index of a namespace arrives whenever we ask for it and the index file
+        is written periodically.
 
         Executor thread.
 
         """
         global LI_LOCK
-        global LOCAL_INDEX
+        global _REPLAY_FILES
 
-        while True:
+        receive_index_data_queue = self._comm_dict["get_index_data_queue"]
+
+        with LI_LOCK:
+            # files announced from now on also go into the fresh index
+            _REPLAY_FILES = list()
 
-            get_index_event = self._comm_dict["get_index_event"]
-            receive_index_data_queue = self._comm_dict["get_index_data_queue"]
+        if _INDEX_REQUEST_QUEUE is not None:
+            _INDEX_REQUEST_QUEUE.put({"todo": "index", "scope": "namespaces"})
+        else:
+            self._comm_dict["get_index_event"].set()
 
-            get_index_event.set()
+        if self._index_file is not None:
+            self._load_index_file()
 
-            with LI_LOCK:
+        bl.debug("Waiting for index")
 
-                try:
-                    bl.debug("Waiting for index")
-                    index = receive_index_data_queue.get(True, 100)
+        # nothing polls, the thread sleeps until an answer arrives, the
+        # shutdown or one of two timers: the warning while we wait for the
+        # index and writing the index file
+        threading.Thread(
+            target=self._wake_on_shutdown, args=(receive_index_data_queue,),
+            name="IndexUpdaterShutdown", daemon=True
+        ).start()
 
-                except queue.Empty as e:
-                    bl.warning("Took more than 100 seconds to wait for "
-                               "index ({}). There will be nothing on display "
-                               "here.".format(e))
+        waiting_since = time.monotonic()
+        warnings = 0
 
-                else:
-                    LOCAL_INDEX = index["index"]
+        # we do not periodically update the index, the announced files keep
+        # it up to date
+        saved_version = None
+        next_save_time = None
 
-            # if self._shutdown_event.wait(120):  # update every 2 minutes
-            if self._shutdown_event.wait():  # wait forever, do not periodically update the index
+        while True:
+            if INDEX_SNAPSHOT.listing is None:
+                timer = waiting_since + 100 * (warnings + 1)
+            elif self._index_file is not None and next_save_time is not None:
+                timer = next_save_time
+            else:
+                timer = None
+
+            try:
+                answer = receive_index_data_queue.get(
+                    True, None if timer is None else
+                    max(timer - time.monotonic(), 0))
+
+            except queue.Empty:
+                if INDEX_SNAPSHOT.listing is None:
+                    warnings += 1
+                    bl.warning("Waiting for the index for {} seconds".format(
+                        100 * warnings))
+
+            else:
+                if answer is not _SHUTDOWN:
+                    self._apply_answer(answer)
+
+            if self._shutdown_event.is_set():
+                if (
+                        self._index_file is not None and
+                        INDEX_SNAPSHOT.listing is not None
+                ):
+                    self._save_index_file()
                 return
 
-    async def _watch_new_files_coro(self):
+            if self._index_file is None or INDEX_SNAPSHOT.listing is None:
+                continue
+
+            if next_save_time is None or time.monotonic() >= next_save_time:
+                if INDEX_SNAPSHOT.version != saved_version:
+                    saved_version = self._save_index_file()
+                next_save_time = time.monotonic() + self._index_file_interval
+
+    def _wake_on_shutdown(self, receive_index_data_queue):
         """
-        Watch for new files to add to the index.
+        Wake the index updater when the proxy services shut down.
+
+        Runs in its own thread.
 
         """
-        new_files = await self._loop.run_in_executor(
-            None, self._watch_new_files_executor)
+        self._shutdown_event.wait()
+        receive_index_data_queue.put(_SHUTDOWN)
 
-    def _watch_new_files_executor(self):
+    def _apply_answer(self, answer):
         """
-        Watch for new files to add to the index.
+        Apply an answer of the gateway to the index and tell the subscription
+        crawler about the subscribed namespaces that changed.
 
-        Executor thread.
+        """
+        if isinstance(answer, dict) and "stream" in answer:
+            changed_namespaces = self._apply_stream_item(answer)
+        else:
+            changed_namespaces = _apply_index_answer(answer)
+
+        with SD_LOCK:
+            subscribed_namespaces = {
+                subscription["namespace"]
+                for subscription in SUBSCRIPTION_DICT.values()
+            }
 
+        for namespace in changed_namespaces & subscribed_namespaces:
+            CHANGED_NAMESPACE_QUEUE.put(namespace)
+
+    def _apply_stream_item(self, item):
         """
-        global LI_LOCK
-        global LOCAL_INDEX
+        Decode a part of a streamed index answer, the gateway client hands
+        them over as ``{"stream": request, "data": bytes}``, followed by
+        ``{"stream": request, "end": True}`` or ``{"stream": request,
+        "error": reason}``.
 
-        new_file_queue = self._comm_dict["tell_new_file_queue"]
+        Decoding happens here in the executor thread, not on an event loop.
 
-        while True:
+        Returns:
+         set: The namespaces that changed.
 
-            if self._shutdown_event.is_set():
-                return
+        """
+        request = item["stream"]
 
-            try:
-                new_file = new_file_queue.get(True, .1)  # block for 0.1 seconds
-            except queue.Empty as e:
-                pass
+        if (
+                self._index_stream is None or
+                self._index_stream.request != request
+        ):
+            self._index_stream = _IndexStream(request)
+
+        try:
+            if "error" in item:
+                raise ValueError(item["error"])
+
+            stream = self._index_stream
+            changed_namespaces = stream.feed(item.get("data", b""))
+
+            if item.get("end"):
+                self._index_stream = None
+                changed_namespaces |= stream.finish()
+
+        except (ValueError, KeyError, TypeError) as e:
+            bl.warning("Index stream for {} broke, asking again: {}".format(
+                request, e))
+            self._index_stream = None
+
+            if _INDEX_REQUEST_QUEUE is not None:
+                _INDEX_REQUEST_QUEUE.put(request)
             else:
-                update_dict = self._create_index_entry_from_new_file_dict(new_file)
+                self._comm_dict["get_index_event"].set()
+
+            return set()
 
-                # bl.debug("Adding {}".format(update_dict))
+        return changed_namespaces
 
-                with LI_LOCK:
-                    # this updates the LOCAL_INDEX with the dictionary
-                    # update_dict
-                    # update_dict may also be nested
-                    rcu.update(LOCAL_INDEX, update_dict)
+    def _load_index_file(self):
+        """
+        Publish the index from the index file, if there is one.
 
-    @staticmethod
-    def _create_dict_from_key(key, sha1sum=None):
-    # def _create_dict_from_key(self, key, sha1sum=None):
         """
-        Create a dictionary from a key.
+        global LI_LOCK
+        global _FILE_LISTING
 
-        TODO: Refactor this.
+        try:
+            parsed_files, listing = read_index_file(self._index_file)
 
+        except FileNotFoundError:
+            bl.debug("No index file at {}".format(self._index_file))
+            return
+
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            bl.warning("Can not read the index file {}: {}".format(
+                self._index_file, e))
+            return
+
+        with LI_LOCK:
+            # the fresh index may not be here yet, but announced files are
+            namespaces, _ = _insert_files(
+                dict(), parsed_files + _REPLAY_FILES)
+
+            # with a lazy gateway only the namespaces that were in use are in
+            # the file, the others are listed from the listing
+            if listing is not None:
+                _FILE_LISTING = tuple(listing)
+
+            _publish(namespaces, INDEX_SNAPSHOT.listing)
+
+        bl.info("Loaded {} objects from the index file {}".format(
+            len(parsed_files), self._index_file))
+
+    def _save_index_file(self):
         """
-        simtype = None
-        to_parse = None
-        field_type = None
-        fieldname = None
-        skintype = None
-        elemtype = None
+        Write the current index to the index file.
 
-        return_dict = dict()
+        Returns:
+         int or None: The version of the written index, None if writing
+         failed.
+
+        """
+        snapshot = INDEX_SNAPSHOT
 
         try:
-            string = key.split("universe.fo.")[1]
-            objects, timestep = string.split("@")
+            write_index_file(self._index_file, snapshot)
 
-            objects_definition = objects.split(".")
+        except OSError as e:
+            bl.warning("Can not write the index file {}: {}".format(
+                self._index_file, e))
+            return None
 
-            simtype = objects_definition[0]
-            if simtype not in ["ta", "ma"]:
-                raise ValueError
+        bl.debug("Wrote index version {} to {}".format(
+            snapshot.version, self._index_file))
 
-            # parse mesh or field, only field has field_type
-            if objects_definition[1] in ["nodal", "elemental"]:
-                to_parse = "field"
-            else:
-                to_parse = "mesh"
+        return snapshot.version
+
+    async def _watch_new_files_coro(self):
+        """
+        Add new files to the index as soon as they are announced.
+
+        All announcements that are waiting are added as one batch, with one
+        new snapshot of the index.
 
-            if to_parse == "field":
-                usage = objects_definition[1]
-                fieldname = objects_definition[2]
-                try:
-                    elemtype = objects_definition[3]
-                except IndexError:
-                    pass
+        """
+        new_file_queue = self._comm_dict["tell_new_file_queue"]
 
-            elif to_parse == "mesh":
-                usage = objects_definition[1]
+        while True:
 
-                if usage == "nodes":
-                    pass
+            new_file = await new_file_queue.get_async(
+                until=self._shutdown_event)
 
-                elif usage == "elements":
-                    elemtype = objects_definition[2]
+            if new_file is None:
+                return
 
-                elif usage == "skin":
-                    skintype = objects_definition[2]
-                    elemtype = objects_definition[3]
+            new_files = [new_file]
+            with suppress(queue.Empty):
+                while len(new_files) < self._batch_size:
+                    new_files.append(new_file_queue.get_nowait())
 
-                elif usage == "elementactivationbitmap":
-                    elemtype = objects_definition[2]
+            changed_namespaces = _add_new_files(new_files)
 
-                elif usage == "elset":
-                    fieldname = objects_definition[2]
-                    elemtype = objects_definition[3]
+            for namespace in changed_namespaces:
+                CHANGED_NAMESPACE_QUEUE.put(namespace)
 
-                elif usage == "nset":
-                    fieldname = objects_definition[2]
 
-                elif usage == "boundingbox":
-                    pass
+def _add_new_files(new_files):
+    """
+    Add announced files to the index with one new snapshot.
 
-            else:
-                # not possible
-                return None
+    Files of namespaces that are not loaded only add the namespace to the
+    listing.
 
-        except Exception as e:
-            return None
+    Args:
+     new_files (list): The announcements, dicts with the keys namespace, key
+      and sha1sum.
+
+    Returns:
+     set: The namespaces that got new files.
+
+    """
+    parsed_files = list()
+
+    for new_file in new_files:
+        parsed = parse_key(new_file["key"])
+
+        if parsed is None:
+            bl.debug("Can not add file {}/{}".format(
+                new_file["namespace"], new_file["key"]))
+            continue
+
+        parsed_files.append(
+            (new_file["namespace"],) + parsed
+            + (new_file["key"], new_file["sha1sum"]))
+
+    if not parsed_files:
+        return set()
+
+    with LI_LOCK:
+        if _REPLAY_FILES is not None:
+            _REPLAY_FILES.extend(parsed_files)
+
+        snapshot = INDEX_SNAPSHOT
+        listing = snapshot.listing
+
+        if listing is not None:
+            new_namespaces = {
+                parsed_file[0] for parsed_file in parsed_files
+            }.difference(listing)
+
+            if new_namespaces:
+                listing = listing + tuple(sorted(new_namespaces))
+
+        if _LAZY:
+            for parsed_file in parsed_files:
+                with suppress(KeyError):
+                    _LOADING[parsed_file[0]].append(parsed_file)
+
+            parsed_files = [
+                parsed_file for parsed_file in parsed_files
+                if parsed_file[0] in snapshot.namespaces
+            ]
+
+        namespaces, changed_namespaces = _insert_files(
+            snapshot.namespaces, parsed_files)
+
+        if changed_namespaces or listing is not snapshot.listing:
+            _publish(namespaces, listing)
+
+    return changed_namespaces
+
+
+def _apply_index_answer(answer):
+    """
+    Put an answer of the gateway to an index request into the index.
+
+    Returns:
+     set: The namespaces that changed.
+
+    """
+    try:
+        if "namespaces" in answer:
+            return _apply_listing(tuple(answer["namespaces"]))
+
+        if "namespace" in answer:
+            namespace = answer["namespace"]
+            return _apply_namespace(namespace, NamespaceIndex.from_objects(
+                tree_objects(answer["index"].get(namespace, dict()))))
+
+        new_index = answer["index"]
+
+        return _apply_whole_index({
+            namespace: NamespaceIndex.from_objects(tree_objects(tree))
+            for namespace, tree in new_index.items()
+        })
+
+    except (TypeError, KeyError, AttributeError):
+        bl.warning("Invalid answer to an index request: {!r:.200}".format(
+            answer))
+        return set()
+
+
+def _apply_listing(listing):
+    """
+    Switch to loading namespaces on demand, with the names of every
+    namespace on the gateway.
+
+    Returns:
+     set: The namespaces that changed, none.
+
+    """
+    global _REPLAY_FILES
+    global _LAZY
+
+    with LI_LOCK:
+        _LAZY = True
+        # we ask for the index of every namespace we need anyway
+        _REPLAY_FILES = None
 
-        return_dict[timestep] = {}
+        # the namespaces of the index file that are still in use stay
+        # until their fresh index arrives
+        namespaces = {
+            namespace: namespace_index
+            for namespace, namespace_index
+            in INDEX_SNAPSHOT.namespaces.items()
+            if namespace in _REFERENCES and namespace in listing
+        }
 
-        return_dict[timestep][simtype] = {}
+        _publish(namespaces, listing)
 
-        return_dict[timestep][simtype][usage] = {}
+        for namespace in _REFERENCES:
+            if namespace in listing:
+                _request_namespace(namespace)
 
-        if usage in ["nodes", "boundingbox"]:
-            i_entry = return_dict[timestep][simtype][usage]
+    bl.debug("Listing of {} namespaces is up to date".format(len(listing)))
 
-        if usage in ["elements", "elementactivationbitmap"]:
-            return_dict[timestep][simtype][usage][elemtype] = {}
-            i_entry = return_dict[timestep][simtype][usage][elemtype]
+    return set()
 
-        if usage == "skin":
-            return_dict[timestep][simtype][usage][skintype] = {}
-            return_dict[timestep][simtype][usage][skintype][elemtype] = {}
-            i_entry = return_dict[timestep][simtype][usage][skintype][elemtype]
 
-        if usage in ["elemental", "elset"]:
-            return_dict[timestep][simtype][usage][fieldname] = {}
-            return_dict[timestep][simtype][usage][fieldname][elemtype] = {}
-            i_entry = return_dict[timestep][simtype][usage][fieldname][elemtype]
+def _apply_namespace(namespace, namespace_index):
+    """
+    Load the index of a namespace we asked for.
+
+    Returns:
+     set: The namespaces that changed.
+
+    """
+    with LI_LOCK:
+        replay_files = _LOADING.pop(namespace, None)
+
+        if replay_files is None or namespace not in _REFERENCES:
+            # nobody needs it anymore
+            return set()
+
+        namespaces = dict(INDEX_SNAPSHOT.namespaces)
+        namespaces[namespace] = namespace_index
+
+        namespaces, _ = _insert_files(namespaces, replay_files)
+
+        _publish(namespaces, INDEX_SNAPSHOT.listing)
+
+    bl.debug("Index of {} is up to date".format(namespace))
+
+    return {namespace}
+
 
-        if usage in ["nodal", "nset"]:
-            return_dict[timestep][simtype][usage][fieldname] = {}
-            i_entry = return_dict[timestep][simtype][usage][fieldname]
+def _apply_whole_index(namespaces):
+    """
+    Replace the index with the index of every namespace.
+
+    Returns:
+     set: The namespaces that changed.
+
+    """
+    global _REPLAY_FILES
+    global _LAZY
+
+    with LI_LOCK:
+        _LAZY = False
 
-        i_entry['object_key'] = key
-        i_entry['sha1sum'] = sha1sum
+        namespaces, _ = _insert_files(namespaces, _REPLAY_FILES or [])
+        _REPLAY_FILES = None
+
+        _publish(namespaces, tuple(namespaces))
+
+    bl.debug("Index is up to date")
+
+    return set(namespaces)
+
+
+def _apply_streamed_namespace(namespace, namespace_index):
+    """
+    Publish one namespace of a streamed whole index, before the rest of the
+    index arrived.
 
-        return return_dict
+    Returns:
+     set: The namespaces that changed.
 
-    def _create_index_entry_from_new_file_dict(self, new_file_dict):
+    """
+    with LI_LOCK:
+        replay_files = [
+            parsed_file for parsed_file in _REPLAY_FILES or []
+            if parsed_file[0] == namespace
+        ]
+
+        namespaces = dict(INDEX_SNAPSHOT.namespaces)
+        namespaces[namespace] = namespace_index
+
+        namespaces, _ = _insert_files(namespaces, replay_files)
+
+        _publish(namespaces, INDEX_SNAPSHOT.listing)
+
+    return {namespace}
+
+
+class _IndexStream(object):
+    """
+    Decodes an index answer that arrives as newline delimited JSON records,
+    one record per line::
+
+        {"namespace": ns}
+        {"namespace": ns, "key": key, "sha1sum": sha1sum}
+
+    The records of a namespace arrive together. Every namespace is put into
+    the index as soon as it is complete, so datasets become available while
+    the rest of the index is still on its way.
+
+    Args:
+     request (dict): The index request the stream answers.
+
+    """
+    def __init__(self, request):
+        self.request = request
+
+        # the start of a line that did not arrive completely
+        self._rest = b""
+
+        # the namespace that is arriving and its objects
+        self._namespace = None
+        self._objects = list()
+
+        # the complete namespaces, {namespace: NamespaceIndex or None}
+        self._namespaces = dict()
+
+    def feed(self, data):
         """
-        Create a dictionary entry from the new file dictionary.
+        Decode the next part of the stream.
 
-        TODO: Refactor this.
+        Returns:
+         set: The namespaces that changed.
+
+        Raises:
+         ValueError: If a record can not be decoded.
 
         """
-        key = new_file_dict["key"]
-        namespace = new_file_dict["namespace"]
-        sha1sum = new_file_dict["sha1sum"]
+        lines = (self._rest + data).split(b"\n")
+        self._rest = lines.pop()
 
-        key_dict = self._create_dict_from_key(key, sha1sum=sha1sum)
+        changed_namespaces = set()
 
-        if key_dict is not None:
+        for line in lines:
+            if not line.strip():
+                continue
 
-            return_dict = dict()
-            return_dict[namespace] = key_dict
+            record = json.loads(line)
+            namespace = record["namespace"]
 
-        else:
-            bl.debug("Can not add file {}/{}".format(namespace, key))
-            return
+            if namespace != self._namespace:
+                changed_namespaces |= self._complete_namespace()
+                self._namespace = namespace
 
-        return return_dict
+            if "key" in record:
+                self._objects.append((record["key"], record.get("sha1sum")))
 
-def index(namespace=None):
+        return changed_namespaces
+
+    def finish(self):
+        """
+        Put the rest of the stream into the index.
+
+        Returns:
+         set: The namespaces that changed.
+
+        Raises:
+         ValueError: If the stream ends with a partial record.
+
+        """
+        changed_namespaces = self.feed(b"\n")
+        changed_namespaces |= self._complete_namespace()
+
+        if self.request.get("scope") == "namespaces":
+            return _apply_listing(tuple(self._namespaces))
+
+        if "namespace" in self.request:
+            namespace = self.request["namespace"]
+            return _apply_namespace(
+                namespace,
+                self._namespaces.get(namespace) or NamespaceIndex())
+
+        return changed_namespaces | _apply_whole_index(self._namespaces)
+
+    def _complete_namespace(self):
+        """
+        Finish the namespace that arrived last.
+
+        """
+        namespace = self._namespace
+
+        if namespace is None:
+            return set()
+
+        self._namespace = None
+        objects, self._objects = self._objects, list()
+
+        if self.request.get("scope") == "namespaces":
+            self._namespaces[namespace] = None
+            return set()
+
+        namespace_index = NamespaceIndex.from_objects(objects)
+        self._namespaces[namespace] = namespace_index
+
+        if "namespace" in self.request:
+            return set()
+
+        return _apply_streamed_namespace(namespace, namespace_index)
+
+
+def _request_namespace(namespace):
     """
-    Obtain the index of the ceph cluster.
+    Ask the gateway for the index of a namespace, unless we already did.
 
-    Note: this is an async function so that we can perform this action in
-    parallel.
+    The caller holds LI_LOCK.
 
     """
-    global LI_LOCK
-    global LOCAL_INDEX
+    if namespace in _LOADING:
+        return
+
+    _LOADING[namespace] = list()
+    _INDEX_REQUEST_QUEUE.put({"todo": "index", "namespace": namespace})
+
+    bl.debug("Requested the index of {}".format(namespace))
+
 
-    loc_ind = dict()
+def acquire_namespace(namespace, timeout=None):
+    """
+    Make sure the index of a namespace is loaded and keep it loaded.
+
+    Every successful call needs a ``release_namespace`` once the namespace is
+    not needed anymore.
+
+    Args:
+     namespace (str): The namespace.
+     timeout (float or None, defaults to None): Wait at most this many seconds
+      for the index, None to wait until it arrives.
+
+    Returns:
+     bool: True if the namespace is loaded, False if it does not exist or
+     its index did not arrive in time.
+
+    """
+    def settled():
+        snapshot = INDEX_SNAPSHOT
+        return namespace in snapshot.namespaces or (
+            snapshot.listing is not None and
+            namespace not in snapshot.listing
+        )
+
+    with _INDEX_CONDITION:
+        _REFERENCES[namespace] = _REFERENCES.get(namespace, 0) + 1
+
+        if (
+                _LAZY and
+                namespace not in INDEX_SNAPSHOT.namespaces and
+                namespace in INDEX_SNAPSHOT.listing
+        ):
+            _request_namespace(namespace)
+
+        _INDEX_CONDITION.wait_for(settled, timeout)
+
+        if namespace in INDEX_SNAPSHOT.namespaces:
+            return True
+
+        bl.warning("The index of {} is not available".format(namespace))
+        _release_namespace(namespace)
+
+        return False
+
+
+def release_namespace(namespace):
+    """
+    Release a namespace acquired with ``acquire_namespace``.
+
+    The index of the namespace is evicted with the last reference, if the
+    gateway can send it again.
+
+    """
     with LI_LOCK:
-        loc_ind = LOCAL_INDEX
+        _release_namespace(namespace)
+
+
+def _release_namespace(namespace):
+    """
+    Release a namespace, the caller holds LI_LOCK.
+
+    """
+    count = _REFERENCES.get(namespace, 0) - 1
+
+    if count > 0:
+        _REFERENCES[namespace] = count
+        return
+
+    _REFERENCES.pop(namespace, None)
+    # a late answer is dropped, the next acquire asks again
+    _LOADING.pop(namespace, None)
+
+    if _LAZY and namespace in INDEX_SNAPSHOT.namespaces:
+        namespaces = dict(INDEX_SNAPSHOT.namespaces)
+        del namespaces[namespace]
+
+        _publish(namespaces, INDEX_SNAPSHOT.listing)
+
+        bl.debug("Evicted the index of {}".format(namespace))
+
+
+def _insert_files(namespaces, parsed_files):
+    """
+    Insert parsed files into a copy of an index.
+
+    Only the namespaces and timesteps that get files are rebuilt, the rest is
+    shared with the original index, which stays unchanged.
+
+    Args:
+     namespaces (dict): The index, {namespace: NamespaceIndex, ...}.
+     parsed_files (list): Tuples ``(namespace, timestep, path, key,
+      sha1sum)``.
+
+    Returns:
+     tuple: ``(namespaces, changed_namespaces)``, the new index and the set of
+     namespaces that got files.
+
+    """
+    by_namespace = dict()
+
+    for namespace, *parsed_object in parsed_files:
+        by_namespace.setdefault(namespace, list()).append(parsed_object)
+
+    namespaces = dict(namespaces)
+
+    for namespace, parsed_objects in by_namespace.items():
+        namespaces[namespace] = namespaces.get(
+            namespace, NamespaceIndex()).with_objects(parsed_objects)
+
+    return namespaces, set(by_namespace)
+
+
+# the format of the index file, format 2 added the listing
+INDEX_FILE_FORMAT = 2
+
+
+def write_index_file(path, snapshot):
+    """
+    Write an index snapshot to a file.
+
+    The file is gzip compressed JSON with the object keys and sha1sums of
+    every loaded namespace, the structure of the index follows from the keys,
+    and the names of every namespace on the gateway. It is replaced
+    atomically, readers never see a partial file.
+
+    Args:
+     path (os.PathLike): The index file.
+     snapshot (IndexSnapshot): The index.
+
+    """
+    contents = {
+        "format": INDEX_FILE_FORMAT,
+        "listing": (
+            None if snapshot.listing is None else list(snapshot.listing)),
+        "namespaces": {
+            namespace: [list(entry) for entry in namespace_index.objects()]
+            for namespace, namespace_index in snapshot.namespaces.items()
+        }
+    }
+
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    with gzip.open(str(tmp_path), "wt", encoding="utf-8", compresslevel=5) as f:
+        json.dump(contents, f, separators=(",", ":"))
+
+    os.replace(str(tmp_path), str(path))
+
+
+def read_index_file(path):
+    """
+    Read an index file written by ``write_index_file``.
+
+    Returns:
+     tuple: The objects in the file as a list of tuples ``(namespace,
+     timestep, path, key, sha1sum)``, like announced and parsed files, and
+     the list of every namespace on the gateway, None if the file has none.
+
+    Raises:
+     ValueError: If the file has an unknown format.
+
+    """
+    with gzip.open(str(path), "rt", encoding="utf-8") as f:
+        contents = json.load(f)
+
+    # format 1 files have no listing
+    if contents.get("format") not in [1, INDEX_FILE_FORMAT]:
+        raise ValueError("unknown index file format {}".format(
+            contents.get("format")))
+
+    parsed_files = list()
+
+    for namespace, entries in contents["namespaces"].items():
+        for key, sha1sum in entries:
+            parsed = parse_key(key)
+
+            if parsed is not None:
+                parsed_files.append(
+                    (namespace,) + parsed + (key, sha1sum))
+
+    return parsed_files, contents.get("listing")
+
+
+def index(namespace=None):
+    """
+    Obtain the index of the ceph cluster.
+
+    The index is part of an immutable snapshot, do not modify it.
+
+    Returns:
+     dict or NamespaceIndex: The index of every loaded namespace,
+     {namespace: NamespaceIndex, ...}, or of one namespace if ``namespace``
+     is given (empty if it is unknown or not loaded).
+
+    """
+    loc_ind = INDEX_SNAPSHOT.namespaces
 
     if namespace is not None:
         try:
             loc_ind = loc_ind[namespace]
         except KeyError:
-            loc_ind = dict()
+            loc_ind = NamespaceIndex()
 
     return loc_ind
 
 
+def namespace_list():
+    """
+    Return the names of every namespace, loaded or not.
+
+    Until the gateway sends its listing, the listing of the index file is
+    used.
+
+    """
+    snapshot = INDEX_SNAPSHOT
+
+    if snapshot.listing is None:
+        file_listing = _FILE_LISTING or ()
+        return list(file_listing) + [
+            namespace for namespace in snapshot.namespaces
+            if namespace not in file_listing
+        ]
+
+    return list(snapshot.listing)
+
+
+def timestep_index(namespace, timestep):
+    """
+    Return the objects of one timestep of a namespace.
+
+    Returns:
+     TimestepIndex or None: The objects, None if the namespace or timestep is
+     unknown.
+
+    """
+    try:
+        return INDEX_SNAPSHOT.namespaces[namespace].get(timestep)
+    except KeyError:
+        return None
+
+
+def snapshot():
+    """
+    Return the current ``IndexSnapshot``.
+
+    Everything read from one snapshot is consistent, its version changes
+    whenever the index changes.
+
+    """
+    return INDEX_SNAPSHOT
+
+
+def index_version():
+    """
+    Return the version of the current index, e.g. for invalidating caches.
+
+    """
+    return INDEX_SNAPSHOT.version
+
+
+def wait_for_index(connection_active_event=None, timeout=None):
+    """
+    Wait until there is an index or the connection to the gateway is active.
+
+    Args:
+     connection_active_event (ConnectionEvent or None, defaults to None):
+      Stop waiting once it is set.
+     timeout (float or None, defaults to None): Wait at most this many
+      seconds, None to wait until one of them happens.
+
+    Returns:
+     bool: True if there is an index or the connection is active, False on
+     timeout.
+
+    """
+    def ready():
+        return INDEX_SNAPSHOT.version > 0 or (
+            connection_active_event is not None and
+            connection_active_event.is_set()
+        )
+
+    with _INDEX_CONDITION:
+        return _INDEX_CONDITION.wait_for(ready, timeout)
+
+
+def _sorted_timesteps(namespace):
+    """
+    Return the ``SortedTimesteps`` of a namespace, empty if it is unknown.
+
+    """
+    return INDEX_SNAPSHOT.namespaces.get(
+        namespace, NamespaceIndex()).sorted_timesteps
+
+
+def timestep_list(namespace):
+    """
+    Return the timesteps of a namespace in natural sort order.
+
+    Returns:
+     list: The timesteps, oldest first, empty for an unknown namespace.
+
+    """
+    return _sorted_timesteps(namespace).timesteps()
+
+
+def adjacent_timestep(namespace, timestep, offset):
+    """
+    Return the timestep ``offset`` places after ``timestep`` in a namespace,
+    e.g. -1 for the previous one or 0 to check if the timestep exists.
+
+    Returns:
+     str or None: The timestep, None if there is none.
+
+    """
+    return _sorted_timesteps(namespace).adjacent(timestep, offset)
+
+
+def newest_timesteps(namespace, count=1):
+    """
+    Return the newest ``count`` timesteps of a namespace, newest first.
+
+    """
+    return _sorted_timesteps(namespace).newest(count)
+
+
 # dict contains dictionaries with the queue to send the update to and the
 # criterion which has to be fulfilled (i.e. all the files that need to be
 # present and the current timestep)
@@ -281,153 +1094,150 @@ SUBSCRIPTION_DICT = dict()
 # lock for the subscription dict
 SD_LOCK = threading.Lock()      # do I even need this?
 
-async def _subscription_crawler_coro(shutdown_event):
+# namespaces that got new files, the subscription crawler checks the
+# subscriptions of these namespaces
+CHANGED_NAMESPACE_QUEUE = LoopQueue()
+
+async def _subscription_crawler_coro(shutdown_event, workers=4):
+    """
+    Check the subscriptions of a namespace whenever files arrive for it.
+
+    Every namespace in ``CHANGED_NAMESPACE_QUEUE`` is checked once, no matter
+    how many files arrived for it since the last check.
+
+    Datasets are switched to their new timestep by a pool of worker threads,
+    so the event loop does not wait for the downloads. Every dataset has one
+    slot in the pool, a dataset that is still loading only loads the newest
+    timestep that arrived in the meantime.
+
+    Args:
+     shutdown_event (LoopEvent): Stops the crawler.
+     workers (int, defaults to 4): The number of datasets that are updated
+      at the same time.
+
     """
-    Iterate over all subscriptions and see if the required files are available.
+    tracking_updates = CoalescingWorkers(
+        workers=workers, name="TrackingUpdate")
+
+    try:
+        await _crawl_subscriptions(shutdown_event, tracking_updates)
+    finally:
+        tracking_updates.shutdown()
+
+
+async def _crawl_subscriptions(shutdown_event, tracking_updates):
+    """
+    The loop of ``_subscription_crawler_coro``.
 
     """
-    global LI_LOCK
-    global LOCAL_INDEX
     global SUBSCRIPTION_DICT
     global SD_LOCK
 
-    # done here because of circular import stuff
-    import backend.global_settings as gloset
-
     while True:
 
-        await asyncio.sleep(1)  # wait one second
+        namespace = await CHANGED_NAMESPACE_QUEUE.get_async(
+            until=shutdown_event)
+
+        if namespace is None:
+            return
+
+        # a burst of new files is handled with one check per namespace
+        changed_namespaces = {namespace}
+        with suppress(queue.Empty):
+            while True:
+                changed_namespaces.add(CHANGED_NAMESPACE_QUEUE.get_nowait())
 
         with SD_LOCK:
 
             for subscription in list(SUBSCRIPTION_DICT.keys()):  # make a list so we can modify the original dictionary
-                try:
-                    delete = SUBSCRIPTION_DICT[subscription]["delete"]
-                except KeyError:
-                    pass
-                else:
+                if "delete" in SUBSCRIPTION_DICT[subscription]:
                     del SUBSCRIPTION_DICT[subscription]
+                    tracking_updates.discard(subscription)
                     bl.debug("Deleted {} from subscription dict".format(subscription))
 
-        with SD_LOCK:
-
-            for subscription in SUBSCRIPTION_DICT.keys():
+            affected = [
+                (subscription, value)
+                for subscription, value in SUBSCRIPTION_DICT.items()
+                if value["namespace"] in changed_namespaces
+            ]
 
-                bl.debug("Checking subscription {}".format(subscription))
+        for dataset_hash, value in affected:
 
-                value = SUBSCRIPTION_DICT[subscription]
+            bl.debug("Checking subscription {}".format(dataset_hash))
 
-                try:
-                    _ = value["delete"]
-                    bl.debug("Skipping {}, delete flag detected".format(subscription))
+            target_timestep = _tracking_target(value)
 
-                except KeyError:
+            if target_timestep is not None:
+                tracking_updates.submit(
+                    dataset_hash, target_timestep, functools.partial(
+                        _update_tracking_dataset, dataset_hash, value))
 
-                    bl.debug("Handling subscription {}".format(subscription))
 
-                    namespace = value["namespace"]
-
-                    scene_hash = value["scene_hash"]
-                    dataset_hash = subscription
-
-                    with LI_LOCK:
-                        bl.debug("Obtaining available timesteps")
-                        avail_timesteps = list(LOCAL_INDEX[namespace].keys())
-                        bl.debug("... found {}".format(len(avail_timesteps)))
-
-                    # sorting from...
-                    # https://blog.codinghorror.com/sorting-for-humans-natural-sort-order/
-                    # neat.
-                    convert = lambda text: int(text) if text.isdigit() else text.lower()
-                    alphanum_key = lambda key: [ convert(c) for c in re.split('([0-9]+)', key) ]
-                    sorted_timesteps = sorted(avail_timesteps, key=alphanum_key)
-
-                    bl.debug("Timesteps sorted")
-
-                    # if current timestep is in sorted_timesteps  ...
-                    current_timestep = value["dataset_object"].timestep()
+def _update_tracking_dataset(dataset_hash, subscription, timestep):
+    """
+    Switch a tracking dataset to a new timestep, runs in a worker thread of
+    the subscription crawler.
 
-                    try:
-                        index = sorted_timesteps.index(current_timestep)
-                        # index = sorted_timesteps.index(value["timestep"])
-                        bl.debug("Found {} in timestep list at position {}".format(current_timestep, index))
+    Nothing happens if the dataset was unsubscribed in the meantime.
 
-                    except ValueError:
-                        # current timestep is not in list... weird
-                        # go back to start of loop
-                        bl.debug("Could not find {} in timestep list".format(current_timestep))
-                        continue
+    """
+    # done here because of circular import stuff
+    import backend.global_settings as gloset
 
-                    # check the last and second to last timestep
-                    last_timestep = sorted_timesteps[-1]
-                    bl.debug("Last timestep is {}".format(last_timestep))
+    with SD_LOCK:
+        if (SUBSCRIPTION_DICT.get(dataset_hash) is not subscription
+                or "delete" in subscription):
+            return
 
-                    # ... and not the last position
-                    if sorted_timesteps[index] == last_timestep:
-                        # is last in timestep list, nothing to do
-                        bl.debug("Index position {} is the last timestep, no update required".format(index))
-                        continue
+    with pd.download_priority("tracking"):
+        gloset.scene_manager.dataset_timesteps(
+            subscription["scene_hash"], dataset_hash, set_timestep=timestep)
 
-                    check_dicts = list()
 
-                    # check if the files we need are in the most recent timestep
-                    for object_dict in value["object_dicts"]:
-                        target = {namespace: {last_timestep: object_dict}}
-                        check_dicts.append(target)
+def _tracking_target(subscription):
+    """
+    Find the timestep a tracking dataset should switch to.
 
-                    data_avail = True
+    That is the newest timestep of the namespace if it has all the objects
+    the dataset needs, otherwise the second newest if that one does.
 
-                    with LI_LOCK:
-                        for check_dict in check_dicts:
-                            bl.debug("Checking for {} in local index".format(check_dict))
-                            avail = ndc.contains(LOCAL_INDEX, check_dict)
-                            if not avail:
-                                bl.debug_warning("Not found, can't update to most recent timestep")
-                                data_avail = False
+    Returns:
+     str or None: The timestep, None if the dataset stays where it is.
 
-                    if data_avail:
-                        # set the timestep
-                        bl.debug("Found all necessary files for most recent timestep")
-                        dataset_timesteps = gloset.scene_manager.dataset_timesteps(
-                            scene_hash, dataset_hash, set_timestep=last_timestep)
-                        continue
+    """
+    namespace = subscription["namespace"]
+    current_timestep = subscription["dataset_object"].timestep()
 
-                    else:
+    namespace_index = INDEX_SNAPSHOT.namespaces.get(
+        namespace, NamespaceIndex())
 
-                        bl.debug("Did not find all necessary files for most recent timestep, checking for files in second to last timestep")
+    if current_timestep not in namespace_index:
+        # current timestep is not in the index... weird
+        bl.debug("Could not find {} in timestep list".format(
+            current_timestep))
+        return None
 
-                        try:
-                            second_last_timestep = sorted_timesteps[-2]
-                        except:
-                            bl.debug_warning("Could not find second to last timestep")
-                            continue
+    for timestep in namespace_index.sorted_timesteps.newest(2):
 
-                        # ... and not the second to last position
-                        if sorted_timesteps[index] == second_last_timestep:
-                            # is second to last in timestep list, nothing to do
-                            bl.debug("We are already at the second to last timestep, nothing to do")
-                            continue
+        if timestep == current_timestep:
+            bl.debug("Already at timestep {}, no update required".format(
+                timestep))
+            return None
 
-                        check_dicts = list()
+        timestep_index = namespace_index[timestep]
 
-                        # check if the files we need are in the most recent timestep
-                        for object_dict in value["object_dicts"]:
-                            check_dicts.append({namespace: {second_last_timestep: object_dict}})
+        if all(
+                timestep_index.contains(object_path)
+                for object_path in subscription["object_paths"]
+        ):
+            bl.debug("Found all necessary files for timestep {}".format(
+                timestep))
+            return timestep
 
-                        second_data_avail = True
+        bl.debug_warning("Not all necessary files are in timestep {}".format(
+            timestep))
 
-                        with LI_LOCK:
-                            for check_dict in check_dicts:
-                                bl.debug("Checking for {} in local index".format(check_dict))
-                                avail = ndc.contains(LOCAL_INDEX, check_dict)
-                                if not avail:
-                                    bl.debug_warning("Not found, can't update to most recent timestep")
-                                    second_data_avail = False
-
-                        if second_data_avail:
-                            bl.debug("Found all necessary files for second to last timestep")
-                            dataset_timesteps = gloset.scene_manager.dataset_timesteps(
-                                scene_hash, dataset_hash, set_timestep=second_last_timestep)
+    return None
 
 # def _subscribe(dataset_hash, scene_hash, namespace, timestep, object_list):
 def _subscribe(dataset_hash, scene_hash, namespace, dataset_object, object_list):
@@ -441,29 +1251,35 @@ def _subscribe(dataset_hash, scene_hash, namespace, dataset_object, object_list)
     most recent timestep once all the files are available for it.
 
     """
-    global LI_LOCK
-    global LOCAL_INDEX
     global SUBSCRIPTION_DICT
     global SD_LOCK
 
     subscription = dict()
 
-    # create a dictionary of files that need to be present in the new timestep
-    object_dict_list = list()
+    # the paths of the files that need to be present in the new timestep
+    object_path_list = list()
 
     for key in object_list:
-        key_dict = ProxyIndex._create_dict_from_key(key, sha1sum=None).values()
-        object_dict_list.append(list(key_dict)[0])
+        parsed = parse_key(key)
+
+        if parsed is None:
+            bl.warning("Can not track file {}".format(key))
+            continue
+
+        object_path_list.append(parsed[1])
 
     # subscription["timestep"] = timestep
     subscription["dataset_object"] = dataset_object
     subscription["namespace"] = namespace
-    subscription["object_dicts"] = object_dict_list
+    subscription["object_paths"] = object_path_list
     subscription["scene_hash"] = scene_hash
 
     with SD_LOCK:
         SUBSCRIPTION_DICT[dataset_hash] = subscription
 
+    # the most recent timestep may already be complete
+    CHANGED_NAMESPACE_QUEUE.put(namespace)
+
 def _unsubscribe(dataset_hash):
     """
     Unsubscribe from timestep updates.
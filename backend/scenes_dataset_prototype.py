@@ -8,6 +8,9 @@ all the data points, its orientation in R3 and so on.
 """
 import os
 import re
+import json
+import threading
+import functools
 import numpy as np
 
 import queue
@@ -15,8 +18,16 @@ import asyncio
 from contextlib import suppress
 
 from backend.util.timestamp_to_sha1 import timestamp_to_sha1
+from backend.util.sorted_timesteps import natural_sorted
+from backend.util.timestep_metadata import (
+    TimestepMetadataCache, directory_version)
+from backend.util.lru_cache import LRUCache
 import backend.dataset_parser as dp
+import backend.proxy_services as ps
+import backend.proxy_services_data as pd
 import backend.proxy_services_index as pi
+from backend.dataset_prefetcher import DatasetPrefetcher
+from backend.dataset_playback import DatasetPlayback
 
 from util.loggers import BackendLog as bl
 
@@ -75,6 +86,15 @@ class _DatasetPrototype:
             self.ext_addr = source_dict['external']['addr']
             self.ext_port = source_dict['external']['port']
 
+            # load the index of the dataset, it stays loaded until the
+            # dataset releases it
+            if not ps.acquire_namespace(
+                    dataset_name, timeout=source_dict['external'].get(
+                        'timeout', pd.DOWNLOAD_TIMEOUT)):
+                raise ValueError(
+                    '{} is not in the index'.format(dataset_name))
+            self._index_released = False
+
         # shutdown event
         self._shutdown_event = source_dict["external"]["comm_dict"]["shutdown_platt_gateway_event"]
 
@@ -122,22 +142,58 @@ class _DatasetPrototype:
         self._wireframe_data_list = []
         self._timestep_data_list = []
 
-        self._fields = {}
-        self._meshes = {}
-
         # initialize the mesh parser
 
-        self._mp = dp.ParseDataset(source_dict=self.source, dataset_name=dataset_name)
+        # fields, elementsets and the objects to read of every timestep,
+        # shared with the parser
+        self._metadata_cache = TimestepMetadataCache()
+
+        self._mp = dp.ParseDataset(
+            source_dict=self.source, dataset_name=dataset_name,
+            metadata_cache=self._metadata_cache,
+            max_meshes=source_dict.get("prefetch", {}).get("max_meshes", 4)
+        )
+
+        self._init_served_data(source_dict.get("prefetch", {}))
 
-        import backend.global_settings as gloset
-        ext_index = gloset.scene_manager.ext_src_dataset_index(
-            update=True, dataset=self.dataset_name)
+        # server side playback of a timestep range
+        self._playback = None
 
         # for init: find the lowest timestep and set it
         lowest_timestep = self.timestep_list()[0]
 
         self.timestep(set_timestep=lowest_timestep)
 
+    def _init_served_data(self, prefetch_dict):
+        """
+        Initialize the served meshes and fields and the prefetching of the
+        neighbouring timesteps and the other fields.
+
+        Args:
+         prefetch_dict (dict): The prefetch settings, ``timesteps``,
+          ``workers``, ``fields``, ``max_fields`` and ``max_meshes``.
+
+        """
+        # the visited and prefetched meshes and fields by hash, the served
+        # ones are pinned
+        self._meshes = LRUCache(prefetch_dict.get("max_meshes", 4))
+        self._fields = LRUCache(prefetch_dict.get("max_fields", 32))
+
+        self._current_mesh = None
+        self._current_field = None
+
+        # guards the served meshes and fields, the prefetcher reads them
+        self._served_data_lock = threading.Lock()
+
+        # prefetch the neighbouring timesteps in the background
+        self._prefetch_timesteps = prefetch_dict.get("timesteps", 1)
+        self._prefetch_fields = prefetch_dict.get("fields", False)
+        self._prefetcher = DatasetPrefetcher(
+            workers=prefetch_dict.get("workers", 2),
+            max_results=2*self._prefetch_timesteps,
+            name="DatasetPrefetcher-{}".format(self.dataset_name)
+        )
+
     def meta(self):
         """
         Returns the meta information dictionary.
@@ -219,30 +275,45 @@ class _DatasetPrototype:
          except.
 
         """
-        timestep_list = []
-
         if self.source_type == 'local':
             dataset_dir = self.dataset_path / 'fo'
-            dirs = sorted(dataset_dir.glob('*/'))  # Glob all directories
+            dirs = dataset_dir.glob('*/')  # Glob all directories
 
-            for path in dirs:
-                timestep_list.append(path.name)
+            return natural_sorted(path.name for path in dirs)
 
         if self.source_type == 'external':
-            import backend.global_settings as gloset
-            ext_index = gloset.scene_manager.ext_src_dataset_index(
-                update=False, dataset=self.dataset_name)
+            # the proxy index keeps the timesteps sorted
+            return ps.timestep_list(self.dataset_name)
 
-            # ext_index = gloset.scene_manager.ext_src_index()
-            dataset_dict = ext_index[self.dataset_name]
-            timestep_list = list(dataset_dict.keys())
+        return []
 
-        # sorting from...
-        # https://blog.codinghorror.com/sorting-for-humans-natural-sort-order/
-        # neat.
-        convert = lambda text: int(text) if text.isdigit() else text.lower()
-        alphanum_key = lambda key: [ convert(c) for c in re.split('([0-9]+)', key) ]
-        return sorted(timestep_list, key=alphanum_key)
+    def adjacent_timestep(self, timestep, offset):
+        """
+        Get the timestep ``offset`` places after a timestep.
+
+        Args:
+         timestep (str): The timestep we start from.
+         offset (int): How many timesteps to go forward, negative numbers go
+          back, 0 checks if the timestep exists.
+
+        Returns:
+         str or None: The timestep or None if there is none.
+
+        """
+        if self.source_type == 'external':
+            return ps.adjacent_timestep(self.dataset_name, timestep, offset)
+
+        timestep_list = self.timestep_list()
+
+        try:
+            index = timestep_list.index(timestep) + offset
+        except ValueError:
+            return None
+
+        if not 0 <= index < len(timestep_list):
+            return None
+
+        return timestep_list[index]
 
     def timestep(self, set_timestep=None):
         """
@@ -258,9 +329,11 @@ class _DatasetPrototype:
 
         """
         if set_timestep is not None:
-            if set_timestep not in self.timestep_list():
+            if self.adjacent_timestep(set_timestep, 0) is None:
                 return self._selected_timestep
 
+            self.stop_playback()
+
             self._update_served_data(
                     timestep=set_timestep,
                     field=self._selected_field,
@@ -271,17 +344,74 @@ class _DatasetPrototype:
 
         return self._selected_timestep
 
-    def field_dict(self):
+    def _timestep_version(self, timestep):
+        """
+        Look up the version of a timestep for the metadata cache.
+
+        Args:
+         timestep (str): The timestep.
+
+        Returns:
+         tuple: ``(timestep_index, version)``, the ``TimestepIndex`` of the
+         timestep (None for local datasets and unknown timesteps) and its
+         version.
+
+        """
+        if self.source_type == 'external':
+            timestep_index = ps.timestep_index(self.dataset_name, timestep)
+
+            return timestep_index, timestep_index
+
+        if self.source_type == 'local':
+            timestep_dir = self.dataset_path / 'fo' / timestep
+
+            return None, directory_version(
+                timestep_dir, timestep_dir / 'eo', timestep_dir / 'no')
+
+        return None, None
+
+    def field_dict(self, timestep=None):
         """
         Get a list of fields for the selected timestep.
 
+        The lists are built once per timestep and version of the timestep, see
+        ``TimestepMetadataCache``.
+
         Args:
-         None: No args.
+         timestep (str or None, defaults to None): The timestep we want the
+          fields for, None for the selected timestep.
 
         Returns:
          dict: A dict with two lists of fields, one for elemental and one for
           nodal fields.
 
+        Raises:
+         KeyError: If the timestep is not in the index.
+
+        """
+        if timestep is None:
+            timestep = self._selected_timestep
+
+        timestep_index, version = self._timestep_version(timestep)
+
+        if self.source_type == 'external' and timestep_index is None:
+            raise KeyError(timestep)
+
+        fields = self._metadata_cache.get_or_create(
+            timestep, 'fields', version, functools.partial(
+                self._create_field_dict, timestep, timestep_index)
+        )
+
+        # the cached lists are shared
+        return {
+            'elemental': list(fields['elemental']),
+            'nodal': list(fields['nodal'])
+        }
+
+    def _create_field_dict(self, timestep, timestep_index):
+        """
+        Build the lists of fields of a timestep for ``field_dict``.
+
         Todo:
          Make this more resilient against non exising directories via try
          except.
@@ -291,7 +421,7 @@ class _DatasetPrototype:
         nodal_fields = []
 
         if self.source_type == 'local':
-            timestep_dir = self.dataset_path / 'fo' / self._selected_timestep
+            timestep_dir = self.dataset_path / 'fo' / timestep
 
             elemental_field_dir = timestep_dir / 'eo'
             elemental_field_paths = sorted(elemental_field_dir.glob('*.bin'))
@@ -316,29 +446,24 @@ class _DatasetPrototype:
                 nodal_fields.append(field.stem)  # just append the file name
 
         if self.source_type == 'external':
-            import backend.global_settings as gloset
-            ext_index = gloset.scene_manager.ext_src_dataset_index(
-                update=False, dataset=self.dataset_name)
-            timestep_dict = ext_index[self.dataset_name][self._selected_timestep]
-
             # elemental_fields = []
             # nodal_fields = []
 
             try:
-                elemental_fields += list(timestep_dict["ta"]['elemental'].keys())  # thermal fields
+                elemental_fields += timestep_index.children(("ta", "elemental"))  # thermal fields
             except KeyError as e:
                 bl.debug_warning("KeyError in thermal field_dict (elemental_fields): {}".format(e))
             try:
-                elemental_fields += list(timestep_dict["ma"]['elemental'].keys())  # mechanical fields
+                elemental_fields += timestep_index.children(("ma", "elemental"))  # mechanical fields
             except KeyError as e:
                 bl.debug_warning("KeyError in mechanical field_dict (elemental_fields): {}".format(e))
 
             try:
-                nodal_fields += list(timestep_dict["ta"]['nodal'].keys())  # thermal fields
+                nodal_fields += timestep_index.children(("ta", "nodal"))  # thermal fields
             except KeyError as e:
                 bl.debug_warning("KeyError in thermal field_dict (nodal_fields): {}".format(e))
             try:
-                nodal_fields += list(timestep_dict["ma"]['nodal'].keys())  # mechanical fields
+                nodal_fields += timestep_index.children(("ma", "nodal"))  # mechanical fields
             except KeyError as e:
                 bl.debug_warning("KeyError in mechanical field_dict (nodal_fields): {}".format(e))
 
@@ -371,6 +496,8 @@ class _DatasetPrototype:
         nodal_fields = fields['nodal']
 
         if set_field is not None:
+            self.stop_playback()
+
             set_field_type = set_field['type']
             set_field_name = set_field['name']
 
@@ -409,6 +536,10 @@ class _DatasetPrototype:
         """
         Get a list of elementsets for the selected timestep.
 
+        The elementsets are looked up once per timestep and version of the
+        timestep, see ``TimestepMetadataCache``. The dicts of the single
+        elementsets are shared and must not be changed.
+
         Args:
          None: No args.
 
@@ -416,6 +547,22 @@ class _DatasetPrototype:
          dict: A dict with two lists of elementsets, one for elemental and one for
           nodal elementsets.
 
+        """
+        timestep = self._selected_timestep
+
+        timestep_index, version = self._timestep_version(timestep)
+
+        elementsets = self._metadata_cache.get_or_create(
+            timestep, 'elementsets', version, functools.partial(
+                self._create_elementset_dict, timestep, timestep_index)
+        )
+
+        # the cached list is shared
+        return dict(elementsets, elementsets=list(elementsets['elementsets']))
+
+    def _create_elementset_dict(self, timestep, timestep_index):
+        """
+        Build the elementsets of a timestep for ``elementset_dict``.
 
         Todo:
          Make this more resilient against non exising directories via try
@@ -426,7 +573,7 @@ class _DatasetPrototype:
         return_dict = {}
 
         if self.source_type == 'local':
-            timestep_dir = self.dataset_path / 'fo' / self._selected_timestep
+            timestep_dir = self.dataset_path / 'fo' / timestep
 
             elset_names = []
             all_elsets = timestep_dir.glob('*.elset.*.bin')
@@ -449,11 +596,10 @@ class _DatasetPrototype:
                     return_dict[elset_name][elset_type] = elset
 
         if self.source_type == 'external':
-            import backend.global_settings as gloset
-            ext_index = gloset.scene_manager.ext_src_dataset_index(
-                update=False, dataset=self.dataset_name)
             try:
-                return_dict = ext_index[self.dataset_name][self._selected_timestep]['elset']
+                if timestep_index is None:
+                    raise KeyError(timestep)
+                return_dict = timestep_index.subtree(('elset',))
             except KeyError as e:
                 bl.debug_warning("KeyError in field_dict (return_dict): {}".format(e))
                 return_dict = dict()
@@ -489,6 +635,8 @@ class _DatasetPrototype:
             if set_elementset not in elementsets:
                 return self._selected_elementset_name
 
+            self.stop_playback()
+
             self._selected_elementset_name = set_elementset
             self._selected_elementset_path_dict = elementsets[set_elementset]
 
@@ -527,6 +675,115 @@ class _DatasetPrototype:
 
         return self._dataset_tracking
 
+    def playback(self, set_playback=None, send=None):
+        """
+        GET or PATCH (start/stop) the playback of a range of timesteps.
+
+        The playback uses the selected field and elementset. Every shown frame
+        becomes the selected timestep and is announced via ``send``.
+
+        Args:
+         set_playback (dict or None): None if we want to get the playback
+          status. Otherwise a dict with the keys ``active`` (bool, defaults to
+          True), ``timestepFirst`` and ``timestepLast`` (str, default to the
+          first and last timestep, playback is backwards if first is after
+          last) and ``rate`` (float, frames per second, defaults to 5).
+         send (callable or None): Called with the websocket payload of every
+          shown frame.
+
+        Returns:
+         dict: The playback status.
+
+        Raises:
+         ValueError: If a timestep is unknown or the rate is not positive.
+
+        """
+        if set_playback is not None:
+            self.stop_playback()
+
+            if set_playback.get('active', True):
+                timestep_list = self.timestep_list()
+
+                first = set_playback.get('timestepFirst', timestep_list[0])
+                last = set_playback.get('timestepLast', timestep_list[-1])
+
+                for timestep in [first, last]:
+                    if timestep not in timestep_list:
+                        raise ValueError(
+                            'timestep {} is not in dataset'.format(timestep))
+
+                first_index = timestep_list.index(first)
+                last_index = timestep_list.index(last)
+
+                if first_index <= last_index:
+                    timesteps = timestep_list[first_index:last_index + 1]
+                else:
+                    timesteps = timestep_list[last_index:first_index + 1][::-1]
+
+                self._playback = DatasetPlayback(
+                    timesteps,
+                    load=functools.partial(
+                        self._load_timestep_data,
+                        field=self._selected_field,
+                        elementset=self._selected_elementset_path_dict
+                    ),
+                    show=functools.partial(self._show_playback_frame, send),
+                    rate=float(set_playback.get('rate', 5.0))
+                )
+
+                # the playback loads everything it needs by itself
+                self._prefetcher.cancel()
+
+                self._playback.start()
+
+        if self._playback is None:
+            return {'playbackActive': False}
+
+        return self._playback.status()
+
+    def stop_playback(self):
+        """
+        Stop a running playback.
+
+        """
+        if self._playback is not None:
+            self._playback.stop()
+
+    def _show_playback_frame(self, send, timestep, mp_data):
+        """
+        Serve a frame of the playback and announce it.
+
+        """
+        if not self._serve_timestep_data(mp_data):
+            mp_data = self._load_timestep_data(
+                timestep, self._selected_field,
+                self._selected_elementset_path_dict, skip_cached=False)
+            self._serve_timestep_data(mp_data)
+
+        self._selected_timestep = timestep
+
+        if send is not None:
+            websocket_payload = self.websocket_payload()
+            websocket_payload['timestep'] = timestep
+            send(websocket_payload)
+
+    def release_index(self):
+        """
+        Release the index of the dataset, it is evicted once no dataset uses
+        it anymore.
+
+        """
+        if self.source_type == 'external' and not self._index_released:
+            self._index_released = True
+            ps.release_namespace(self.dataset_name)
+
+    def stop_prefetching(self):
+        """
+        Cancel all prefetching and stop the prefetcher threads.
+
+        """
+        self._prefetcher.shutdown()
+
     def surface_mesh(self, current_mesh_hash=None):
         """
         Get surface mesh data.
@@ -534,9 +791,9 @@ class _DatasetPrototype:
         """
         if (
                 (current_mesh_hash is None) or
-                (current_mesh_hash != self._meshes['mesh_hash'])
+                (current_mesh_hash != self._current_mesh['mesh_hash'])
         ):
-            return self._meshes['current']
+            return self._current_mesh
         else:
             return {
                 'mesh_hash': None,
@@ -554,9 +811,9 @@ class _DatasetPrototype:
         """
         if (
                 (current_field_hash is None) or
-                (current_field_hash != self._fields['field_hash'])
+                (current_field_hash != self._current_field['field_hash'])
         ):
-            return self._fields['current']
+            return self._current_field
         else:
             return {
                 'field_hash': None,
@@ -568,7 +825,7 @@ class _DatasetPrototype:
         Returns the min and max values of the currently set field.
 
         """
-        current_field = self._fields['current']['field']
+        current_field = self._current_field['field']
         current_min = np.floor(np.min(current_field)) - 1
         current_max = np.ceil(np.max(current_field)) + 1
 
@@ -581,51 +838,213 @@ class _DatasetPrototype:
         """
         Update the currently served data.
 
+        If the requested data was prefetched (or is being prefetched) we use
+        that, otherwise we load it ourselves. Afterwards the neighbouring
+        timesteps are scheduled for prefetching.
+
         """
-        hash_dict = {
-            'mesh': list(self._meshes.keys()),
-            'field': list(self._fields.keys())
-        }
+        mp_data = self._prefetcher.take(
+            self._prefetch_key(timestep, field, elementset))
+
+        if mp_data is None:
+            # explicit requests hold back the prefetcher
+            with self._prefetcher.foreground():
+                mp_data = self._load_timestep_data(
+                    timestep, field, elementset)
+
+        if not self._serve_timestep_data(mp_data):
+            # the parser skipped a mesh or field that was evicted since, read
+            # everything again
+            with self._prefetcher.foreground():
+                mp_data = self._load_timestep_data(
+                    timestep, field, elementset, skip_cached=False)
+
+            self._serve_timestep_data(mp_data)
+
+        self._schedule_prefetch(timestep, field, elementset)
+
+    def _serve_timestep_data(self, mp_data):
+        """
+        Make loaded timestep data the currently served data.
+
+        The parser skips meshes and fields that were cached when the data was
+        loaded. If one of them was evicted in the meantime, nothing is served.
+
+        Args:
+         mp_data (dict): The data from ``ParseDataset.timestep_data``.
+
+        Returns:
+         bool: True if the data is served, False if a skipped mesh or field
+         is not cached anymore.
+
+        """
+        mp_data_mesh_hash = mp_data['hash_dict']['mesh']
+        mp_data_field_hash = mp_data['hash_dict']['field']
+
+        with self._served_data_lock:
+            if (
+                    (mp_data['nodes']['data'] is None and
+                     mp_data_mesh_hash not in self._meshes) or
+                    (mp_data['field']['data'] is None and
+                     mp_data_field_hash not in self._fields)
+            ):
+                return False
 
-        mp_data = self._mp.timestep_data(
+            self._external_object_keys = mp_data["object_key_list"]
+
+            self._hash_dict['mesh'] = mp_data_mesh_hash
+            self._hash_dict['field'] = mp_data_field_hash
+
+            # pin first, storing evicts
+            self._meshes.pin(mp_data_mesh_hash)
+            self._fields.pin(mp_data_field_hash)
+            self._mp.pin_mesh(mp_data_mesh_hash)
+
+            if mp_data_mesh_hash not in self._meshes:
+
+                self._meshes[mp_data_mesh_hash] = {
+                    'mesh_hash': mp_data['hash_dict']['mesh'],
+                    'nodes': mp_data['nodes']['data'],
+                    'nodes_center': mp_data['nodes_center'],
+                    'tets': mp_data['tets']['data'],
+                    'wireframe': mp_data['wireframe']['data'],
+                    'free_edges': mp_data['free_edges']['data']
+                }
+
+            self._current_mesh = self._meshes[mp_data_mesh_hash]
+
+            if mp_data_field_hash not in self._fields:
+                self._fields[mp_data_field_hash] = {
+                    'field_hash': mp_data['hash_dict']['field'],
+                    'field': mp_data['field']['data']
+                }
+
+            self._current_field = self._fields[mp_data_field_hash]
+
+        return True
+
+    def _load_timestep_data(self, timestep, field, elementset,
+                            skip_cached=True):
+        """
+        Load the data for a timestep, skipping meshes and fields we already
+        have.
+
+        Args:
+         skip_cached (bool, defaults to True): Skip the meshes and fields
+          that are cached, False to read everything.
+
+        Returns:
+         dict: The data from ``ParseDataset.timestep_data``.
+
+        """
+        hash_dict = {'mesh': [], 'field': []}
+
+        if skip_cached:
+            with self._served_data_lock:
+                hash_dict = {
+                    'mesh': self._meshes.keys(),
+                    'field': self._fields.keys()
+                }
+
+        return self._mp.timestep_data(
             timestep=timestep,
             field=field,
             elementset=elementset,
             hash_dict=hash_dict
         )
 
-        self._external_object_keys = mp_data["object_key_list"]
+    def _prefetch_key(self, timestep, field, elementset):
+        """
+        Return a hashable key for a timestep, field and elementset selection.
 
-        mp_data_mesh_hash = mp_data['hash_dict']['mesh']
-        mp_data_field_hash = mp_data['hash_dict']['field']
+        """
+        return (
+            timestep,
+            json.dumps(field, sort_keys=True, default=str),
+            json.dumps(elementset, sort_keys=True, default=str)
+        )
 
-        self._hash_dict['mesh'] = mp_data_mesh_hash
-        self._hash_dict['field'] = mp_data_field_hash
+    def _prefetch_timestep(self, timestep, field, elementset):
+        """
+        Load a timestep for prefetching, its downloads wait for the ones the
+        user is waiting for.
 
-        if mp_data_mesh_hash not in hash_dict['mesh']:
+        Returns:
+         dict: The data from ``ParseDataset.timestep_data``.
 
-            self._meshes['current'] = {
-                'mesh_hash': mp_data['hash_dict']['mesh'],
-                'nodes': mp_data['nodes']['data'],
-                'nodes_center': mp_data['nodes_center'],
-                'tets': mp_data['tets']['data'],
-                'wireframe': mp_data['wireframe']['data'],
-                'free_edges': mp_data['free_edges']['data']
-            }
+        """
+        with ps.download_priority("prefetch"):
+            return self._load_timestep_data(timestep, field, elementset)
 
-            self._meshes[mp_data['hash_dict']['mesh']] = self._meshes['current']
+    def _prefetch_field(self, timestep, field, elementset):
+        """
+        Load a field for prefetching and put it into the field cache, so it
+        is served from memory when it is selected.
 
-        else:
+        At most ``max_fields`` fields are kept, the least recently used are
+        evicted.
 
-            self._meshes['current'] = self._meshes[mp_data_mesh_hash]
+        Returns:
+         None: The field is in the field cache, a prefetched result would only
+         take the place of the neighbouring timesteps.
 
-        if mp_data_field_hash not in hash_dict['field']:
-            self._fields['current'] = {
-                'field_hash': mp_data['hash_dict']['field'],
-                'field': mp_data['field']['data']
-            }
+        """
+        mp_data = self._prefetch_timestep(timestep, field, elementset)
 
-            self._fields[mp_data['hash_dict']['field']] = self._fields['current']
+        mp_data_field_hash = mp_data['hash_dict']['field']
 
-        else:
-            self._fields['current'] = self._fields[mp_data_field_hash]
+        with self._served_data_lock:
+            if (
+                    mp_data_field_hash not in self._fields and
+                    mp_data['field']['data'] is not None
+            ):
+                self._fields[mp_data_field_hash] = {
+                    'field_hash': mp_data_field_hash,
+                    'field': mp_data['field']['data']
+                }
+
+        return None
+
+    def _schedule_prefetch(self, timestep, field, elementset):
+        """
+        Schedule the next and previous timesteps for prefetching, nearest
+        first. If enabled, every other field of the timestep is scheduled
+        afterwards. Prefetching for an older selection is cancelled.
+
+        """
+        jobs = []
+
+        if self._prefetch_timesteps > 0:
+            for distance in range(1, self._prefetch_timesteps + 1):
+                for offset in [distance, -distance]:
+                    neighbour = self.adjacent_timestep(timestep, offset)
+                    if neighbour is not None:
+                        jobs.append((
+                            self._prefetch_key(neighbour, field, elementset),
+                            functools.partial(
+                                self._prefetch_timestep,
+                                neighbour, field, elementset)
+                        ))
+
+        if self._prefetch_fields:
+            try:
+                fields = self.field_dict(timestep=timestep)
+            except (KeyError, IndexError) as e:
+                bl.debug_warning("No fields to prefetch: {}".format(e))
+                fields = {'nodal': [], 'elemental': []}
+
+            for field_type in ['nodal', 'elemental']:
+                for field_name in fields[field_type]:
+                    other_field = {'type': field_type, 'name': field_name}
+
+                    if other_field == field:
+                        continue
+
+                    jobs.append((
+                        self._prefetch_key(timestep, other_field, elementset),
+                        functools.partial(
+                            self._prefetch_field,
+                            timestep, other_field, elementset)
+                    ))
+
+        self._prefetcher.schedule(jobs)
@@ -73,7 +73,9 @@ class SceneManager:
 
             connection_active_event = self.source["external"]["comm_dict"]["proxy_connection_active_event"]
 
-            connection_active_event.wait()
+            # the index file of the last run is enough for listing the
+            # datasets, the gateway connection follows in the background
+            ps.wait_for_index(connection_active_event)
 
             self._local_src_index = {}
             self._local_src_dataset_index = {}
@@ -133,8 +135,7 @@ class SceneManager:
         Returns externally available datasets.
 
         """
-        availableDatasets = {
-            'availableDatasets': list(self.ext_src_index().keys())}
+        availableDatasets = {'availableDatasets': ps.namespace_list()}
         return availableDatasets
 
     def new_scene(self, dataset_list):
@@ -627,21 +628,13 @@ class SceneManager:
                 set_timestep == '_next_timestep'
         ):
             current_timestep = target_dataset.timestep()
-            current_timestep_index = timestep_list.index(current_timestep)
 
             if set_timestep == '_prev_timestep':
-                new_timestep_index = current_timestep_index - 1
-                if new_timestep_index < 0:
-                    set_timestep = None
-                else:
-                    set_timestep = timestep_list[new_timestep_index]
-
-            if set_timestep == '_next_timestep':
-                new_timestep_index = current_timestep_index + 1
-                if new_timestep_index > len(timestep_list) - 1:
-                    set_timestep = None
-                else:
-                    set_timestep = timestep_list[new_timestep_index]
+                set_timestep = target_dataset.adjacent_timestep(
+                    current_timestep, -1)
+            else:
+                set_timestep = target_dataset.adjacent_timestep(
+                    current_timestep, 1)
 
         selected_timestep = target_dataset.timestep(
             set_timestep)
@@ -779,6 +772,59 @@ class SceneManager:
 
         return return_dict
 
+    def dataset_playback(self, scene_hash, dataset_hash, set_playback=None):
+        """
+        GET or PATCH (start/stop) the server side playback of a dataset.
+
+        The surface data for the timesteps is precomputed in the background
+        and every frame is announced to the WebSockets of the scene at the
+        target rate. Frames are skipped if precomputing can not keep up.
+
+        Args:
+         scene_hash (str): The hash of the scene.
+         dataset_hash (str): The hash of the dataset.
+         set_playback (None or dict): None or a dict with the keys ``active``
+          (bool), ``field`` (a field like for ``dataset_fields``, defaults to
+          the selected field), ``timestepFirst``, ``timestepLast`` and
+          ``rate`` (frames per second).
+
+        Returns:
+         dict: The playback status.
+
+        Raises:
+         TypeError: If ``type(set_playback)`` is not `NoneType` or `dict`.
+         ValueError: If a timestep is unknown or the rate is not positive.
+
+        """
+        if set_playback is not None:
+            if not isinstance(set_playback, dict):
+                raise TypeError('set_playback is {}, expected None or dict'.
+                                format(type(set_playback).__name__))
+
+        target_dataset = self._target_dataset(scene_hash, dataset_hash)
+
+        # dataset or scene do not exist
+        if target_dataset is None:
+            return None
+
+        target_scene = self.scene(scene_hash)
+
+        if set_playback is not None and 'field' in set_playback:
+            self.dataset_fields(
+                scene_hash, dataset_hash, set_field=set_playback['field'])
+
+        dataset_meta = self.list_loaded_dataset_info(scene_hash, dataset_hash)
+
+        playback_status = target_dataset.playback(
+            set_playback, send=target_scene.websocket_send)
+
+        return_dict = {
+            'datasetMeta': dataset_meta,
+            'datasetPlayback': playback_status
+        }
+
+        return return_dict
+
     def dataset_mesh_hash(self, scene_hash, dataset_hash):
 
         target_dataset = self._target_dataset(scene_hash, dataset_hash)
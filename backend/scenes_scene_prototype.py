@@ -93,6 +93,11 @@ class _ScenePrototype:
         """
         self.websocket_delete_scene()
 
+        for dataset in self._dataset_list.values():
+            dataset.stop_playback()
+            dataset.stop_prefetching()
+            dataset.release_index()
+
     def name(self):
         """
         Get the name for the scene.
@@ -193,7 +198,10 @@ class _ScenePrototype:
                 type(dataset_hash).__name__))
 
         try:
-            self._dataset_list.pop(dataset_hash)
+            dataset = self._dataset_list.pop(dataset_hash)
+            dataset.stop_playback()
+            dataset.stop_prefetching()
+            dataset.release_index()
 
             # Delegate returning of the remainder to the standard method
             return self.list_datasets()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Testing the dataset playback
+
+"""
+import os
+import sys
+import time
+import unittest
+
+# Append the parent directory for importing the file.
+sys.path.append(os.path.join('..', '..'))  # Append the program root dir
+from backend.dataset_playback import DatasetPlayback
+
+
+class Test_DatasetPlayback(unittest.TestCase):
+    """
+    Unittest for the DatasetPlayback.
+
+    """
+    def setUp(self):
+        self.timesteps = ['{:03d}'.format(i) for i in range(10)]
+        self.loaded = []
+        self.shown = []
+        self.load_time = 0
+
+    def load(self, timestep):
+        time.sleep(self.load_time)
+        self.loaded.append(timestep)
+        return 'frame {}'.format(timestep)
+
+    def show(self, timestep, frame):
+        self.shown.append((timestep, frame))
+
+    def play(self, rate=100, lookahead=None):
+        playback = DatasetPlayback(
+            self.timesteps, self.load, self.show,
+            rate=rate, lookahead=lookahead)
+        playback.start()
+        return playback
+
+    def wait_until_done(self, playback, timeout=5):
+        deadline = time.time() + timeout
+        while playback.playing():
+            if time.time() > deadline:
+                self.fail('timeout')
+            time.sleep(.01)
+
+    def test_shows_every_frame_in_order(self):
+        """A fast pipeline shows every frame in order
+
+        """
+        playback = self.play(rate=100)
+        self.wait_until_done(playback)
+
+        self.assertEqual(
+            self.shown,
+            [(timestep, 'frame {}'.format(timestep))
+             for timestep in self.timesteps]
+        )
+
+        status = playback.status()
+        self.assertFalse(status['playbackActive'])
+        self.assertEqual(status['playbackFramesShown'], 10)
+        self.assertEqual(status['playbackFramesSkipped'], 0)
+        self.assertEqual(status['playbackTimestepCurrent'], '009')
+
+    def test_keeps_the_rate(self):
+        """Frames are not shown faster than the target rate
+
+        """
+        start = time.monotonic()
+        playback = self.play(rate=50)
+        self.wait_until_done(playback)
+
+        self.assertGreaterEqual(time.monotonic() - start, 9 / 50)
+
+    def test_slow_pipeline_skips_frames(self):
+        """A pipeline that can not keep up skips frames but ends on the last
+
+        """
+        self.load_time = .05
+        playback = self.play(rate=100)
+        self.wait_until_done(playback)
+
+        shown_timesteps = [timestep for timestep, _ in self.shown]
+        self.assertLess(len(self.loaded), 10)
+        self.assertEqual(shown_timesteps, sorted(shown_timesteps))
+        self.assertEqual(shown_timesteps[-1], '009')
+
+        status = playback.status()
+        self.assertEqual(
+            status['playbackFramesShown'] + status['playbackFramesSkipped'],
+            10)
+
+    def test_lookahead_is_bounded(self):
+        """The producer does not run further ahead than the lookahead
+
+        """
+        playback = self.play(rate=5, lookahead=2)
+        time.sleep(.1)
+        self.assertLessEqual(len(self.loaded), 3)
+        playback.stop()
+
+    def test_stop(self):
+        """No frame is shown after stop
+
+        """
+        playback = self.play(rate=20)
+        time.sleep(.1)
+        playback.stop()
+        shown = len(self.shown)
+        time.sleep(.1)
+
+        self.assertEqual(len(self.shown), shown)
+        self.assertFalse(playback.playing())
+
+    def test_failing_frames_are_skipped(self):
+        """Frames that fail to load are skipped
+
+        """
+        def load(timestep):
+            if timestep == '003':
+                raise KeyError('no such object')
+            return self.load(timestep)
+
+        playback = DatasetPlayback(self.timesteps, load, self.show, rate=100)
+        playback.start()
+        self.wait_until_done(playback)
+
+        shown_timesteps = [timestep for timestep, _ in self.shown]
+        self.assertNotIn('003', shown_timesteps)
+        self.assertEqual(len(shown_timesteps), 9)
+
+    def test_invalid_arguments(self):
+        """A non positive rate or no timesteps raise a ValueError
+
+        """
+        with self.assertRaises(ValueError):
+            DatasetPlayback(self.timesteps, self.load, self.show, rate=0)
+        with self.assertRaises(ValueError):
+            DatasetPlayback([], self.load, self.show)
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Testing the dataset prefetcher
+
+"""
+import os
+import sys
+import time
+import threading
+import unittest
+from unittest import mock
+
+# Append the parent directory for importing the file.
+sys.path.append(os.path.join('..', '..'))  # Append the program root dir
+from backend.dataset_prefetcher import DatasetPrefetcher
+from backend.scenes_dataset_prototype import _DatasetPrototype
+from backend.dataset_parser import ParseDataset
+from backend.util.lru_cache import LRUCache
+
+
+class Test_DatasetPrefetcher(unittest.TestCase):
+    """
+    Unittest for the DatasetPrefetcher.
+
+    """
+    def setUp(self):
+        self.prefetcher = DatasetPrefetcher(workers=1, max_results=2)
+        self.calls = []
+        self.release = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.prefetcher.shutdown()
+
+    def load(self, key, block=False):
+        self.calls.append(key)
+        if block:
+            self.release.wait()
+        return 'data {}'.format(key)
+
+    def wait_for(self, condition, timeout=2):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                self.fail('timeout')
+            time.sleep(.01)
+
+    def test_take_prefetched_result(self):
+        """A prefetched result is handed out once
+
+        """
+        self.prefetcher.schedule([(1, lambda: self.load(1))])
+        self.wait_for(lambda: 1 in self.calls)
+        self.assertEqual(self.prefetcher.take(1), 'data 1')
+        self.assertIsNone(self.prefetcher.take(1))
+
+    def test_take_unknown_key(self):
+        """Taking a key that was never scheduled returns None
+
+        """
+        self.assertIsNone(self.prefetcher.take('unknown'))
+
+    def test_take_waits_for_running_job(self):
+        """Taking a running job waits for its result instead of loading twice
+
+        """
+        self.prefetcher.schedule([(1, lambda: self.load(1, block=True))])
+        self.wait_for(lambda: 1 in self.calls)
+        threading.Timer(.05, self.release.set).start()
+        self.assertEqual(self.prefetcher.take(1), 'data 1')
+        self.assertEqual(self.calls, [1])
+
+    def test_take_cancels_queued_job(self):
+        """Taking a queued job cancels it
+
+        """
+        self.prefetcher.schedule([
+            (1, lambda: self.load(1, block=True)),
+            (2, lambda: self.load(2))
+        ])
+        self.wait_for(lambda: 1 in self.calls)
+        self.assertIsNone(self.prefetcher.take(2))
+        self.release.set()
+        self.assertEqual(self.prefetcher.take(1), 'data 1')
+        self.assertNotIn(2, self.calls)
+
+    def test_reschedule_cancels_stale_jobs(self):
+        """Rescheduling cancels queued jobs and drops results nobody wants
+
+        """
+        self.prefetcher.schedule([
+            (1, lambda: self.load(1, block=True)),
+            (2, lambda: self.load(2))
+        ])
+        self.wait_for(lambda: 1 in self.calls)
+        self.prefetcher.schedule([(3, lambda: self.load(3))])
+        self.release.set()
+        self.wait_for(lambda: 3 in self.calls)
+        self.assertEqual(self.prefetcher.take(3), 'data 3')
+
+        self.assertNotIn(2, self.calls)
+        self.assertIsNone(self.prefetcher.take(1))
+
+    def test_results_are_bounded(self):
+        """Only max_results results are kept
+
+        """
+        self.prefetcher.schedule(
+            [(key, lambda key=key: self.load(key)) for key in range(4)])
+        self.wait_for(lambda: len(self.calls) == 4)
+        time.sleep(.05)
+        taken = [self.prefetcher.take(key) for key in range(4)]
+        self.assertEqual(taken, [None, None, 'data 2', 'data 3'])
+
+    def test_foreground_holds_back_jobs(self):
+        """No job is started while an explicit request is active
+
+        """
+        with self.prefetcher.foreground():
+            self.prefetcher.schedule([(1, lambda: self.load(1))])
+            time.sleep(.05)
+            self.assertEqual(self.calls, [])
+
+        self.wait_for(lambda: 1 in self.calls)
+        self.assertEqual(self.prefetcher.take(1), 'data 1')
+
+    def test_failing_job(self):
+        """A failing job gives no result
+
+        """
+        def fail():
+            raise KeyError('no such object')
+
+        self.prefetcher.schedule([(1, fail)])
+        self.assertIsNone(self.prefetcher.take(1))
+
+
+class _Parser(object):
+    """
+    A parser that makes up a mesh and a field for every selection.
+
+    """
+    def timestep_data(self, timestep, field, elementset, hash_dict=None):
+        mesh_hash = 'mesh {}'.format(timestep)
+        field_hash = 'field {} {}'.format(timestep, field['name'])
+        known = field_hash in hash_dict['field']
+
+        return {
+            'object_key_list': [],
+            'hash_dict': {'mesh': mesh_hash, 'field': field_hash},
+            'nodes': {'data': None if mesh_hash in hash_dict['mesh'] else []},
+            'nodes_center': [],
+            'tets': {'data': []},
+            'wireframe': {'data': []},
+            'free_edges': {'data': []},
+            'field': {'data': None if known else [timestep, field['name']]}
+        }
+
+    def pin_mesh(self, mesh_hash):
+        pass
+
+
+class Test_dataset_prefetching(unittest.TestCase):
+    """
+    Unittest for prefetching the neighbouring timesteps and the other fields
+    of a dataset at the same time.
+
+    """
+    def setUp(self):
+        field_names = ['field{:02d}'.format(i) for i in range(12)]
+
+        self.dataset = _DatasetPrototype.__new__(_DatasetPrototype)
+        self.dataset.dataset_name = 'dataset'
+        self.dataset.source_type = 'test'
+        self.dataset._mp = _Parser()
+        self.dataset._hash_dict = {'mesh': None, 'field': None}
+        self.dataset.timestep_list = lambda: ['1', '2', '3']
+        self.dataset.field_dict = lambda timestep=None: {
+            'nodal': field_names, 'elemental': []}
+        self.dataset._init_served_data({
+            'timesteps': 1, 'workers': 1, 'fields': True, 'max_fields': 4,
+            'max_meshes': 2})
+
+        self.field = {'type': 'nodal', 'name': 'field00'}
+
+    def tearDown(self):
+        self.dataset.stop_prefetching()
+
+    def wait_for_prefetching(self, timeout=5):
+        deadline = time.time() + timeout
+        while self.dataset._prefetcher._futures:
+            if time.time() > deadline:
+                self.fail('timeout')
+            time.sleep(.01)
+
+    def test_fields_leave_neighbours_alone(self):
+        """Prefetched fields do not push the neighbouring timesteps out
+
+        """
+        self.dataset._update_served_data('2', self.field, {})
+        self.wait_for_prefetching()
+
+        for neighbour in ['1', '3']:
+            mp_data = self.dataset._prefetcher.take(
+                self.dataset._prefetch_key(neighbour, self.field, {}))
+            self.assertEqual(mp_data['field']['data'], [neighbour, 'field00'])
+
+    def test_prefetched_fields_are_bounded(self):
+        """Only the served and the most recently used fields are kept
+
+        """
+        self.dataset._update_served_data('2', self.field, {})
+        self.wait_for_prefetching()
+
+        self.assertEqual(
+            self.dataset._fields.keys(),
+            ['field 2 field00'] +
+            ['field 2 field{:02d}'.format(i) for i in range(9, 12)])
+
+        # a prefetched field is served from memory
+        field = {'type': 'nodal', 'name': 'field09'}
+        self.dataset._update_served_data('2', field, {})
+        self.assertEqual(
+            self.dataset._current_field['field'], ['2', 'field09'])
+        self.assertEqual(
+            self.dataset._fields.keys()[-1], 'field 2 field09')
+
+        self.wait_for_prefetching()
+        self.assertLessEqual(len(self.dataset._fields), 4)
+        self.assertIn('field 2 field09', self.dataset._fields)
+
+    def test_visited_meshes_are_bounded(self):
+        """Only the served and the most recently used meshes are kept
+
+        """
+        with mock.patch.object(self.dataset, '_schedule_prefetch'):
+            for timestep in ['1', '2', '3', '2']:
+                self.dataset._update_served_data(timestep, self.field, {})
+
+        self.assertEqual(self.dataset._meshes.keys(), ['mesh 3', 'mesh 2'])
+        self.assertEqual(self.dataset._current_mesh['mesh_hash'], 'mesh 2')
+
+    def prefetch_fields(self, numbers):
+        for number in numbers:
+            self.dataset._prefetch_field(
+                '2', {'type': 'nodal', 'name': 'field{:02d}'.format(number)},
+                {})
+
+    def test_evicted_field_is_read_again(self):
+        """A skipped field that got evicted before serving is read again
+
+        """
+        field = {'type': 'nodal', 'name': 'field05'}
+        self.prefetch_fields([5])
+
+        # the parser skips the cached field ...
+        stale = self.dataset._load_timestep_data('2', field, {})
+        self.assertIsNone(stale['field']['data'])
+
+        # ... which is evicted before the data is served
+        self.prefetch_fields(range(6, 10))
+        self.assertNotIn('field 2 field05', self.dataset._fields)
+
+        with mock.patch.object(
+                self.dataset._prefetcher, 'take', return_value=stale):
+            self.dataset._update_served_data('2', field, {})
+
+        self.assertEqual(
+            self.dataset._current_field['field'], ['2', 'field05'])
+
+    def test_served_field_is_not_evicted(self):
+        """Prefetching other fields keeps the served field cached
+
+        """
+        self.prefetch_fields([5])
+
+        with mock.patch.object(self.dataset, '_schedule_prefetch'):
+            self.dataset._update_served_data(
+                '2', {'type': 'nodal', 'name': 'field05'}, {})
+
+        self.prefetch_fields(range(6, 12))
+
+        self.assertIn('field 2 field05', self.dataset._fields)
+        self.assertLessEqual(len(self.dataset._fields), 4)
+
+
+class Test_parser_mesh_cache(unittest.TestCase):
+    """
+    Unittest for the bounded surface information of the parser.
+
+    """
+    def setUp(self):
+        self.parser = ParseDataset.__new__(ParseDataset)
+        self.parser.source_type = 'external'
+        self.parser._mesh_cache = LRUCache(2)
+        self.parser._geometry_data = self.geometry_data
+        self.parser._elementset_data = lambda elementset: None
+
+        # the timesteps whose mesh was read
+        self.reads = []
+
+        model_surface = mock.patch(
+            'backend.dataset_mangler.model_surface',
+            return_value={
+                'nodal_field_map': [], 'old_max_node_index': 3,
+                'surface_triangulation': [], 'nodes': {'data': [1]},
+                'nodes_center': [], 'triangles': {'data': []},
+                'wireframe': {'data': []}, 'free_edges': {'data': []}
+            })
+        model_surface.start()
+        self.addCleanup(model_surface.stop)
+
+        fields_nodal = mock.patch(
+            'backend.dataset_mangler.model_surface_fields_nodal',
+            side_effect=lambda field_map, values: {'data': values})
+        fields_nodal.start()
+        self.addCleanup(fields_nodal.stop)
+
+    def geometry_data(self, timestep, field, elementset, current_hash=None):
+        mesh_hash = 'mesh {}'.format(timestep)
+
+        if current_hash is not None and mesh_hash in current_hash:
+            return {'hash': mesh_hash, 'object_key_list': [], 'nodes': None,
+                    'elements': None, 'skins': None}
+
+        self.reads.append(timestep)
+        return {'hash': mesh_hash, 'object_key_list': [], 'nodes': {},
+                'elements': {}, 'skins': {}}
+
+    def timestep_data(self, timestep, mesh_hashes):
+        return self.parser.timestep_data(
+            timestep, None, {},
+            hash_dict={'mesh': mesh_hashes, 'field': []})
+
+    def test_pinned_mesh_is_kept(self):
+        """The surface of the pinned mesh stays, the others are evicted
+
+        """
+        self.timestep_data('1', [])
+        self.parser.pin_mesh('mesh 1')
+
+        for timestep in ['2', '3']:
+            self.timestep_data(timestep, [])
+
+        self.assertEqual(
+            self.parser._mesh_cache.keys(), ['mesh 1', 'mesh 3'])
+
+        # the served mesh is skipped, the blank field still gets its size
+        mp_data = self.timestep_data('1', ['mesh 1', 'mesh 2', 'mesh 3'])
+        self.assertIsNone(mp_data['nodes']['data'])
+        self.assertEqual(mp_data['field']['data'], [0.0]*3)
+        self.assertEqual(self.reads, ['1', '2', '3'])
+
+    def test_evicted_mesh_is_read_again(self):
+        """A mesh is not skipped once its surface is evicted
+
+        """
+        for timestep in ['1', '2', '3']:
+            self.timestep_data(timestep, [])
+
+        mp_data = self.timestep_data('1', ['mesh 1', 'mesh 2', 'mesh 3'])
+        self.assertEqual(mp_data['nodes']['data'], [1])
+        self.assertEqual(self.reads, ['1', '2', '3', '1'])
+
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
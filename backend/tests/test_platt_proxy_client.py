@@ -0,0 +1,648 @@
+#!/usr/bin/env python3
+"""
+Testing the platt gateway client against the mock gateway
+
+"""
+import os
+import sys
+import mmap
+import json
+import queue
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+# Append the parent directory for importing the file.
+sys.path.append(os.path.join('..', '..'))  # Append the program root dir
+import backend.platt_proxy_client as platt_client
+from backend.platt_proxy_client import Client, _DownloadScheduler
+from backend.util.mock_gateway import MockGateway
+from backend.util.loop_signal import LoopEvent, LoopQueue
+import backend.util.transfer_compression as tc
+
+
+class Test_Client(unittest.TestCase):
+    """
+    Unittest for the file downloads of the gateway client.
+
+    """
+    def setUp(self):
+        self.objects = {
+            "universe.fo/object{}".format(i): os.urandom(100000 + i)
+            for i in range(8)
+        }
+        self.gateway = MockGateway(objects=dict(self.objects))
+        self.port = self.gateway.start()
+        self.answer_queue = queue.Queue()
+
+    def tearDown(self):
+        self.client.close()
+        self.gateway.stop()
+
+    def make_client(self, **kwargs):
+        self.request_queue = LoopQueue()
+        self.index_data_queue = queue.Queue()
+        self.shutdown_event = LoopEvent()
+        self.client = Client(
+            self.gateway.host, self.port,
+            threading.Event(), LoopQueue(), LoopEvent(), self.index_data_queue,
+            self.request_queue, self.answer_queue, self.shutdown_event,
+            run=False, **kwargs
+        )
+        return self.client
+
+    def download(self, keys):
+        async def download_all():
+            await asyncio.gather(*[
+                self.client._download_and_return_file(
+                    {"namespace": "universe.fo", "key": key})
+                for key in keys
+            ])
+
+        self.client._loop.run_until_complete(download_all())
+
+        return self.collect_answers()
+
+    def download_batch(self, keys):
+        self.client._loop.run_until_complete(
+            self.client._download_and_return_batch(
+                {"namespace": "universe.fo", "keys": keys}))
+
+        return self.collect_answers()
+
+    def collect_answers(self):
+        answers = dict()
+        self.errors = dict()
+        while not self.answer_queue.empty():
+            answer = self.answer_queue.get()
+            file_request = answer["file_request"]
+            if "error" in answer:
+                self.errors[file_request["object"]] = answer["error"]
+            else:
+                answers[file_request["object"]] = file_request
+        return answers
+
+    def check_contents(self, answers, keys):
+        self.assertEqual(sorted(answers.keys()), sorted(keys))
+        for key in keys:
+            self.assertEqual(
+                bytes(answers[key]["contents"]),
+                self.objects["universe.fo/{}".format(key)])
+
+    def test_binary_transfer(self):
+        """Objects arrive intact with binary transfer
+
+        """
+        self.make_client(binary_transfer=True)
+        keys = ["object{}".format(i) for i in range(8)]
+        answers = self.download(keys)
+        self.check_contents(answers, keys)
+        self.assertNotIn("contents_length", answers["object0"])
+
+    def test_base64_transfer(self):
+        """Objects arrive intact with base64 transfer
+
+        """
+        self.make_client(binary_transfer=False)
+        keys = ["object{}".format(i) for i in range(8)]
+        self.check_contents(self.download(keys), keys)
+
+    def test_connections_are_reused(self):
+        """Consecutive downloads reuse the pooled connections
+
+        """
+        self.make_client(pool_size=2)
+        keys = ["object{}".format(i) for i in range(8)]
+        self.download(keys)
+        self.download(keys)
+
+        self.assertEqual(self.gateway.stats["requests"], 16)
+        self.assertLessEqual(self.gateway.stats["connections"], 2)
+
+    def test_reconnect_after_connection_loss(self):
+        """Connections closed by the gateway are replaced
+
+        """
+        self.make_client(pool_size=1)
+        self.download(["object0"])
+
+        self.gateway.close_connections()
+        self.client._loop.run_until_complete(asyncio.sleep(.1))
+
+        self.check_contents(self.download(["object1"]), ["object1"])
+        self.assertEqual(self.gateway.stats["connections"], 2)
+
+    def test_pipelined_transfer(self):
+        """Objects arrive intact over pipelined connections
+
+        """
+        self.make_client(protocol="pipelined", pool_size=2)
+        keys = ["object{}".format(i) for i in range(8)]
+        self.check_contents(self.download(keys), keys)
+        self.check_contents(self.download(keys), keys)
+
+        self.assertEqual(self.gateway.stats["requests"], 16)
+        self.assertLessEqual(self.gateway.stats["connections"], 2)
+
+    def test_pipelined_errors_are_per_request(self):
+        """An unknown object fails alone, the other requests succeed
+
+        """
+        self.make_client(protocol="pipelined", pool_size=1)
+        keys = ["object0", "missing", "object1"]
+        answers = self.download(keys)
+        self.check_contents(answers, ["object0", "object1"])
+        self.assertEqual(list(self.errors), ["missing"])
+        self.assertEqual(self.gateway.stats["connections"], 1)
+
+    def test_pipelined_reconnect_after_connection_loss(self):
+        """Pipelined connections closed by the gateway are replaced
+
+        """
+        self.make_client(protocol="pipelined", pool_size=1)
+        self.download(["object0"])
+
+        self.gateway.close_connections()
+        self.client._loop.run_until_complete(asyncio.sleep(.1))
+
+        self.check_contents(self.download(["object1"]), ["object1"])
+        self.assertEqual(self.gateway.stats["connections"], 2)
+
+    def test_pipelined_fallback_without_acceptance(self):
+        """Without the acceptance of the gateway the client falls back to
+        stop-and-wait
+
+        """
+        self.gateway.stop()
+        self.gateway = MockGateway(objects=dict(self.objects), pipelined=False)
+        self.port = self.gateway.start()
+
+        keys = ["object{}".format(i) for i in range(8)]
+
+        with mock.patch.object(platt_client, "PIPELINED_ACCEPT_TIMEOUT", .2):
+            self.make_client(protocol="pipelined", pool_size=2)
+            self.check_contents(self.download(keys), keys)
+            self.check_contents(self.download_batch(keys), keys)
+
+        self.assertFalse(self.client._pipelined)
+        self.assertEqual(self.client._pipelined_connections, [])
+        # only the first connection asked for the pipelined protocol
+        connections = self.gateway.stats["connections"]
+        self.check_contents(self.download(keys[:2]), keys[:2])
+        self.assertEqual(self.gateway.stats["connections"], connections)
+
+    def test_batch_request(self):
+        """A batch is requested with one message and arrives intact
+
+        """
+        for protocol in ["stop_and_wait", "pipelined"]:
+            with self.subTest(protocol=protocol):
+                self.gateway.stats["requests"] = 0
+                self.make_client(protocol=protocol, batch_requests=True)
+                keys = ["object{}".format(i) for i in range(8)]
+                self.check_contents(self.download_batch(keys), keys)
+                self.assertEqual(self.gateway.stats["requests"], 1)
+                self.client.close()
+
+    def test_batch_with_missing_object(self):
+        """An unknown object in a batch fails alone
+
+        """
+        for protocol in ["stop_and_wait", "pipelined"]:
+            with self.subTest(protocol=protocol):
+                self.gateway.stats["requests"] = 0
+                self.make_client(protocol=protocol, batch_requests=True)
+                keys = ["object0", "missing", "object1"]
+                answers = self.download_batch(keys)
+                self.check_contents(answers, ["object0", "object1"])
+                self.assertEqual(list(self.errors), ["missing"])
+                self.assertEqual(self.gateway.stats["requests"], 1)
+                self.client.close()
+
+    def test_batch_split_without_batch_requests(self):
+        """Without batch requests a batch is split into single requests
+
+        """
+        self.make_client(batch_requests=False)
+        keys = ["object{}".format(i) for i in range(4)]
+        self.check_contents(self.download_batch(keys), keys)
+        self.assertEqual(self.gateway.stats["requests"], 4)
+
+    def test_requests_from_queue(self):
+        """Requests put on the queue by another thread are downloaded until
+        shutdown
+
+        """
+        self.make_client()
+        keys = ["object0", "object1", "object2"]
+
+        def request():
+            self.request_queue.put({"namespace": "universe.fo", "key": "object0"})
+            self.request_queue.put({"namespace": "universe.fo", "keys": keys[1:]})
+
+            answers = dict()
+            for i in range(len(keys)):
+                file_request = self.answer_queue.get(timeout=5)["file_request"]
+                answers[file_request["object"]] = file_request
+            self.answers = answers
+
+            self.shutdown_event.set()
+
+        threading.Thread(target=request, daemon=True).start()
+        self.client._loop.run_until_complete(
+            asyncio.wait_for(self.client._file_download_coro(), 5))
+
+        self.check_contents(self.answers, keys)
+
+    def test_duplicate_requests_are_coalesced(self):
+        """A request for an object that is downloading does not download it
+        again
+
+        """
+        self.gateway.latency = .05
+        self.make_client()
+
+        def request():
+            self.request_queue.put({"namespace": "universe.fo", "key": "object0"})
+            self.request_queue.put(
+                {"namespace": "universe.fo", "keys": ["object0", "object1"]})
+
+            self.answers = [
+                self.answer_queue.get(timeout=5)["file_request"]["object"]
+                for i in range(2)
+            ]
+
+            self.shutdown_event.set()
+
+        threading.Thread(target=request, daemon=True).start()
+        self.client._loop.run_until_complete(
+            asyncio.wait_for(self.client._file_download_coro(), 5))
+
+        self.assertEqual(sorted(self.answers), ["object0", "object1"])
+        self.assertEqual(self.client.coalesced_requests, 1)
+        self.assertEqual(self.gateway.stats["objects"], 2)
+        self.assertEqual(self.client._download_scheduler._running_objects,
+                         set())
+
+    def test_avoided_downloads_are_reported(self):
+        """The transfer report logs how many duplicate downloads were avoided
+
+        """
+        self.make_client()
+        self.client._download_scheduler.coalesced_requests = 3
+        backend_stats = {"requested": 5, "coalesced": 2, "cached": 4}
+
+        async def report():
+            task = asyncio.ensure_future(
+                self.client._transfer_report_coro(interval=.01))
+            await asyncio.sleep(.05)
+            self.shutdown_event.set()
+            await asyncio.wait_for(task, 5)
+
+        with mock.patch.object(platt_client.pd, "REQUEST_STATS",
+                               backend_stats), \
+                mock.patch.object(platt_client.gl, "info") as info:
+            self.assertEqual(
+                self.client.request_stats(),
+                dict(backend_stats, scheduler_coalesced=3))
+            self.client._loop.run_until_complete(report())
+
+        # reported once, the counters did not change afterwards
+        messages = [call[0][0] for call in info.call_args_list]
+        self.assertEqual(messages, [
+            "Requested 5 objects, avoided 9 duplicate downloads (2 on their "
+            "way, 4 downloaded already, 3 merged in the queue)"])
+
+    def test_interactive_requests_overtake_prefetching(self):
+        """An interactive request starts before queued prefetch requests
+
+        """
+        self.gateway.latency = .01
+        self.make_client(pool_size=2)
+        prefetch_keys = ["object{}".format(i) for i in range(1, 8)]
+
+        def request():
+            for key in prefetch_keys:
+                self.request_queue.put({
+                    "namespace": "universe.fo", "key": key,
+                    "priority": "prefetch"})
+            self.request_queue.put({"namespace": "universe.fo",
+                                    "key": "object0"})
+
+            self.order = [
+                self.answer_queue.get(timeout=5)["file_request"]["object"]
+                for i in range(8)
+            ]
+
+            self.shutdown_event.set()
+
+        threading.Thread(target=request, daemon=True).start()
+        self.client._loop.run_until_complete(
+            asyncio.wait_for(self.client._file_download_coro(), 5))
+
+        # prefetching uses one of the two slots, the other is free for us
+        self.assertIn("object0", self.order[:2])
+        self.assertEqual(sorted(self.order),
+                         sorted(["object0"] + prefetch_keys))
+
+    def test_compression(self):
+        """Compressed objects arrive intact and are counted
+
+        """
+        compressible = bytes(range(256)) * 1000
+        self.objects["universe.fo/compressible"] = compressible
+        self.gateway.add_object("universe.fo", "compressible", compressible)
+        keys = ["object0", "compressible"]
+
+        for protocol in ["stop_and_wait", "pipelined"]:
+            with self.subTest(protocol=protocol):
+                self.make_client(
+                    protocol=protocol, compression=tc.offer(1, shuffle=8))
+                self.check_contents(self.download(keys), keys)
+
+                stats = self.client.transfer_stats()
+                self.assertEqual(stats["objects"], 2)
+                # random bytes are sent as they are
+                self.assertEqual(stats["compressed_objects"], 1)
+                self.assertGreater(stats["ratio"], 1.5)
+                self.client.close()
+
+    def test_no_compression_without_offer(self):
+        """Without an offer the gateway does not compress
+
+        """
+        self.gateway.add_object("universe.fo", "compressible", bytes(100000))
+        self.objects["universe.fo/compressible"] = bytes(100000)
+        self.make_client()
+        self.check_contents(self.download(["compressible"]), ["compressible"])
+
+        self.assertEqual(self.client.transfer_stats()["compressed_objects"], 0)
+        # the client has the contents before the gateway got the last ACK
+        self.assertTrue(self.gateway.wait_answers(1))
+        self.assertEqual(self.gateway.stats["bytes_sent"], 100000)
+
+    def test_spill_large_objects(self):
+        """Objects above the spill threshold arrive as memory maps
+
+        """
+        compressible = bytes(range(256)) * 1000
+        self.objects["universe.fo/compressible"] = compressible
+        self.gateway.add_object("universe.fo", "compressible", compressible)
+        keys = ["object0", "compressible"]
+
+        for protocol, compression in [
+                ("stop_and_wait", None), ("pipelined", None),
+                ("stop_and_wait", tc.offer(1)),
+                ("pipelined", tc.offer(1, shuffle=8))]:
+            with self.subTest(protocol=protocol, compression=compression):
+                self.make_client(
+                    protocol=protocol, compression=compression,
+                    spill_threshold=200000)
+                answers = self.download(keys)
+                self.check_contents(answers, keys)
+
+                self.assertNotIsInstance(
+                    answers["object0"]["contents"], mmap.mmap)
+                self.assertIsInstance(
+                    answers["compressible"]["contents"], mmap.mmap)
+                self.client.close()
+
+    def index_answers(self, requests):
+        async def ask():
+            reader, writer = await asyncio.open_connection(
+                self.gateway.host, self.port)
+            await self.client.send_connection(
+                reader, writer, {"task": "index"})
+
+            answers = [
+                await self.client.get_index(reader, writer, request)
+                for request in requests
+            ]
+            writer.close()
+
+            return answers
+
+        return self.client._loop.run_until_complete(ask())
+
+    def test_namespace_index(self):
+        """The gateway sends the listing and single namespaces on request,
+        older gateways always the whole index
+
+        """
+        self.gateway.index = {
+            "a": {"1": {"ta": {"nodes": {
+                "object_key": "universe.fo.ta.nodes@1", "sha1sum": ""}}}},
+            "b": {}
+        }
+        requests = [
+            {"todo": "index", "scope": "namespaces"},
+            {"todo": "index", "namespace": "a"}
+        ]
+        self.make_client(stream_index=False)
+
+        self.assertEqual(self.index_answers(requests), [
+            {"namespaces": ["a", "b"]},
+            {"namespace": "a", "index": {"a": self.gateway.index["a"]}}
+        ])
+
+        self.gateway.namespace_index = False
+        self.assertEqual(
+            self.index_answers(requests),
+            [{"index": self.gateway.index}] * 2)
+
+    def test_streamed_index(self):
+        """Streamed index answers are handed on as raw records
+
+        """
+        self.gateway.index = {
+            "a": {"1": {"ta": {"nodes": {
+                "object_key": "universe.fo.ta.nodes@1", "sha1sum": ""}}}},
+            "b": {}
+        }
+        request = {"todo": "index"}
+        self.make_client()
+
+        self.assertEqual(
+            self.index_answers([request]),
+            [{"stream": request, "end": True}])
+
+        data = b""
+        while not self.index_data_queue.empty():
+            item = self.index_data_queue.get()
+            self.assertEqual(item["stream"], request)
+            data += item["data"]
+
+        self.assertEqual([json.loads(line) for line in data.splitlines()], [
+            {"namespace": "a"},
+            {"namespace": "a", "key": "universe.fo.ta.nodes@1",
+             "sha1sum": ""},
+            {"namespace": "b"}
+        ])
+
+    def test_index_connection_drop_is_noticed(self):
+        """Waiting for index requests ends when the gateway closes the
+        connection, without polling it
+
+        """
+        self.gateway.index = {"a": {}}
+        index_request_queue = LoopQueue()
+        self.make_client(
+            stream_index=False, index_request_queue=index_request_queue)
+
+        async def watch():
+            reader, writer = await asyncio.open_connection(
+                self.gateway.host, self.port)
+            await self.client.send_connection(
+                reader, writer, {"task": "index"})
+
+            index_request_queue.put({"todo": "index", "scope": "namespaces"})
+            answered = await self.client.watch_index_events(reader, writer)
+
+            self.gateway.close_connections()
+            dropped = await asyncio.wait_for(
+                self.client.watch_index_events(reader, writer), 5)
+
+            writer.close()
+            return answered, dropped, reader.at_eof()
+
+        self.assertEqual(
+            self.client._loop.run_until_complete(watch()), (True, None, True))
+        self.assertEqual(
+            self.index_data_queue.get_nowait(), {"namespaces": ["a"]})
+
+    def test_connection_state(self):
+        """The connection active event follows the connections, a dropped
+        connection cleans up the queues
+
+        """
+        self.make_client()
+        active_event = self.client._proxy_connection_active_event
+
+        self.client._set_connection_active(index=True)
+        self.assertFalse(active_event.is_set())
+        self.client._set_connection_active(new_file_information=True)
+        self.assertTrue(active_event.is_set())
+
+        self.client._get_index_event.set()
+        self.answer_queue.put(
+            {"file_request": {"namespace": "universe.fo", "object": "old"}})
+
+        # answers nobody takes are removed after three drops
+        for drop in range(3):
+            self.assertEqual(self.answer_queue.qsize(), 1)
+            self.client._set_connection_active(index=False)
+            self.assertFalse(active_event.is_set())
+            self.assertFalse(self.client._get_index_event.is_set())
+
+        self.assertEqual(self.answer_queue.qsize(), 0)
+
+    def test_unknown_protocol_raises_ValueError(self):
+        """An unknown protocol raises a ValueError
+
+        """
+        with self.assertRaises(ValueError):
+            self.make_client(protocol="carrier_pigeon")
+        self.make_client()
+
+class Test_DownloadScheduler(unittest.TestCase):
+    """
+    Unittest for the priority scheduling of downloads.
+
+    """
+    def request(self, keys, priority=None):
+        request = {"namespace": "ns", "keys": keys}
+        if priority is not None:
+            request["priority"] = priority
+        return request
+
+    def test_priority_order(self):
+        """More important classes start first
+
+        """
+        scheduler = _DownloadScheduler(4)
+        scheduler.submit(self.request(["p"], "prefetch"))
+        scheduler.submit(self.request(["t"], "tracking"))
+        scheduler.submit(self.request(["i"]))
+
+        self.assertEqual(
+            [scheduler.next_request()["keys"] for i in range(3)],
+            [["i"], ["t"], ["p"]])
+
+    def test_class_limits(self):
+        """A class does not run more requests than its limit
+
+        """
+        scheduler = _DownloadScheduler(4, limits={"prefetch": 1})
+        for key in ["a", "b"]:
+            scheduler.submit(self.request([key], "prefetch"))
+
+        first = scheduler.next_request()
+        self.assertIsNone(scheduler.next_request())
+
+        scheduler.finished(first)
+        self.assertEqual(scheduler.next_request()["keys"], ["b"])
+
+    def test_capacity(self):
+        """No more requests than the capacity run
+
+        """
+        scheduler = _DownloadScheduler(2)
+        for key in ["a", "b", "c"]:
+            scheduler.submit(self.request([key]))
+
+        first = scheduler.next_request()
+        scheduler.next_request()
+        self.assertIsNone(scheduler.next_request())
+
+        scheduler.finished(first)
+        self.assertEqual(scheduler.next_request()["keys"], ["c"])
+
+    def test_set_capacity(self):
+        """A smaller capacity lowers the default class limits
+
+        """
+        scheduler = _DownloadScheduler(8, limits={"tracking": 2})
+        scheduler.set_capacity(2)
+        for key in ["a", "b", "c"]:
+            scheduler.submit(self.request([key], "prefetch"))
+
+        scheduler.next_request()
+        self.assertIsNone(scheduler.next_request())
+        self.assertEqual(scheduler._limits["tracking"], 2)
+
+    def test_preemption(self):
+        """A more important request takes objects out of queued requests
+
+        """
+        scheduler = _DownloadScheduler(1)
+        scheduler.submit(self.request(["a", "b", "c"], "prefetch"))
+        scheduler.submit(self.request(["b"]))
+
+        self.assertEqual(scheduler.next_request()["keys"], ["b"])
+        self.assertEqual(scheduler.queued("prefetch"), 2)
+        self.assertEqual(scheduler.promoted_requests, 1)
+
+    def test_coalescing(self):
+        """Running objects and objects queued with the same or a higher
+        priority are not queued again
+
+        """
+        scheduler = _DownloadScheduler(1)
+        scheduler.submit(self.request(["a"]))
+        scheduler.next_request()
+        scheduler.submit(self.request(["b"], "tracking"))
+
+        scheduler.submit(self.request(["a"]))
+        scheduler.submit(self.request(["b"], "prefetch"))
+
+        self.assertEqual(scheduler.coalesced_requests, 2)
+        self.assertEqual(scheduler.queued("tracking"), 1)
+        self.assertEqual(scheduler.queued("prefetch"), 0)
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Testing the data part of the proxy services
+
+"""
+import os
+import sys
+import time
+import queue
+import asyncio
+import threading
+import unittest
+
+# Append the parent directory for importing the file.
+sys.path.append(os.path.join('..', '..'))  # Append the program root dir
+import backend.proxy_services_data as pd
+from backend.platt_proxy_client import Client
+from backend.util.mock_gateway import MockGateway
+from backend.util.loop_signal import LoopEvent, LoopQueue
+
+
+class Test_simulation_file(unittest.TestCase):
+    """
+    Unittest for waiting on objects requested from the gateway.
+
+    """
+    def setUp(self):
+        pd.GATEWAY_DATA.clear()
+        pd.PENDING_OBJECTS.clear()
+        for stat in pd.REQUEST_STATS:
+            pd.REQUEST_STATS[stat] = 0
+
+        self.comm_dict = {
+            "file_request_queue": LoopQueue(),
+            "file_contents_name_hash_queue": LoopQueue(),
+            "shutdown_platt_gateway_event": LoopEvent()
+        }
+        self.source_dict = {
+            "source": "external",
+            "external": {"comm_dict": self.comm_dict, "timeout": 5}
+        }
+
+        # the ingest of the proxy services runs in its own event loop
+        def ingest():
+            loop = asyncio.new_event_loop()
+            proxy_data = pd.ProxyData(loop, self.comm_dict)
+            loop.run_until_complete(proxy_data._watch_incoming_files_coro())
+            loop.close()
+
+        self.ingest = threading.Thread(target=ingest, daemon=True)
+        self.ingest.start()
+
+        self.requests = []
+
+    def tearDown(self):
+        self.comm_dict["shutdown_platt_gateway_event"].set()
+        self.ingest.join()
+
+    def serve(self, delay=0, count=1):
+        """
+        Answer ``count`` requests like the gateway client would.
+
+        """
+        def gateway():
+            for i in range(count):
+                request = self.comm_dict["file_request_queue"].get()
+                self.requests.append(request)
+                time.sleep(delay)
+
+                keys = request.get("keys", [request.get("key")])
+                for key in keys:
+                    self.comm_dict["file_contents_name_hash_queue"].put({
+                        "file_request": {
+                            "namespace": request["namespace"],
+                            "object": key,
+                            "contents": key.encode()
+                        }
+                    })
+
+        threading.Thread(target=gateway, daemon=True).start()
+
+    def simulation_file(self, keys):
+        return pd.simulation_file(
+            source_dict=self.source_dict, namespace="universe.fo",
+            object_key_list=keys)
+
+    def test_returns_objects_in_order(self):
+        """The objects are returned in the requested order
+
+        """
+        self.serve()
+        keys = ["c", "a", "b"]
+        res = self.simulation_file(keys)
+
+        self.assertEqual([entry["object"] for entry in res], keys)
+        self.assertEqual(self.requests, [
+            {"namespace": "universe.fo", "keys": keys,
+             "priority": "interactive"}])
+
+    def test_returns_when_the_data_arrives(self):
+        """The caller wakes up as soon as the data arrives
+
+        """
+        self.serve()
+        start = time.monotonic()
+        self.simulation_file(["a"])
+
+        self.assertLess(time.monotonic() - start, .05)
+
+    def test_downloaded_objects_are_not_requested(self):
+        """Objects we already have are not requested again
+
+        """
+        self.serve()
+        self.simulation_file(["a"])
+        res = self.simulation_file(["a"])
+
+        self.assertEqual(res[0]["contents"], b"a")
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(pd.request_stats()["cached"], 1)
+
+    def test_concurrent_callers_share_a_request(self):
+        """Callers waiting for the same object share one request
+
+        """
+        self.serve(delay=.1)
+        results = []
+
+        def call():
+            results.append(self.simulation_file(["a"]))
+
+        threads = [threading.Thread(target=call) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(
+            [res[0]["contents"] for res in results], [b"a"] * 4)
+        self.assertEqual(
+            pd.request_stats(),
+            {"requested": 1, "coalesced": 3, "cached": 0})
+
+    def test_deadline(self):
+        """A missing object returns None after the deadline and is requested
+        again by the next call
+
+        """
+        self.source_dict["external"]["timeout"] = .1
+        start = time.monotonic()
+
+        self.assertIsNone(self.simulation_file(["a"]))
+        self.assertGreaterEqual(time.monotonic() - start, .1)
+        self.assertEqual(pd.PENDING_OBJECTS, {})
+
+        self.comm_dict["file_request_queue"].get()
+        self.serve()
+        self.assertEqual(self.simulation_file(["a"])[0]["contents"], b"a")
+
+    def test_priority(self):
+        """Requests carry the priority of the thread, a more important caller
+        asks again for a pending object
+
+        """
+        self.serve(count=2, delay=.1)
+        results = []
+
+        def prefetch():
+            with pd.download_priority("prefetch"):
+                results.append(self.simulation_file(["a", "b"]))
+
+        prefetch_thread = threading.Thread(target=prefetch)
+        prefetch_thread.start()
+        time.sleep(.05)
+
+        res = self.simulation_file(["b"])
+        prefetch_thread.join()
+
+        self.assertEqual(res[0]["contents"], b"b")
+        self.assertEqual(len(results[0]), 2)
+        self.assertEqual(
+            [request["priority"] for request in self.requests],
+            ["prefetch", "interactive"])
+        self.assertEqual(self.requests[1]["key"], "b")
+        self.assertEqual(pd.current_download_priority(), "interactive")
+
+    def test_unknown_priority(self):
+        """An unknown priority raises a ValueError
+
+        """
+        with self.assertRaises(ValueError):
+            with pd.download_priority("urgent"):
+                pass
+
+
+class Test_simulation_file_gateway(unittest.TestCase):
+    """
+    Unittest for waiting on objects from the mock gateway through the gateway
+    client.
+
+    """
+    def setUp(self):
+        pd.GATEWAY_DATA.clear()
+        pd.PENDING_OBJECTS.clear()
+        pd.PENDING_PRIORITIES.clear()
+
+        self.gateway = MockGateway(objects={"universe.fo/a": b"a"})
+        self.port = self.gateway.start()
+
+        self.comm_dict = {
+            "file_request_queue": LoopQueue(),
+            "file_contents_name_hash_queue": LoopQueue(),
+            "shutdown_platt_gateway_event": LoopEvent()
+        }
+        self.source_dict = {
+            "source": "external",
+            "external": {"comm_dict": self.comm_dict, "timeout": 5}
+        }
+
+        def ingest():
+            loop = asyncio.new_event_loop()
+            proxy_data = pd.ProxyData(loop, self.comm_dict)
+            loop.run_until_complete(proxy_data._watch_incoming_files_coro())
+            loop.close()
+
+        self.threads = [threading.Thread(target=ingest, daemon=True)]
+        self.threads[0].start()
+
+    def tearDown(self):
+        self.comm_dict["shutdown_platt_gateway_event"].set()
+        for thread in self.threads:
+            thread.join()
+        self.gateway.stop()
+
+    def start_client(self, **kwargs):
+        def client():
+            gateway_client = Client(
+                self.gateway.host, self.port,
+                threading.Event(), LoopQueue(), LoopEvent(), queue.Queue(),
+                self.comm_dict["file_request_queue"],
+                self.comm_dict["file_contents_name_hash_queue"],
+                self.comm_dict["shutdown_platt_gateway_event"],
+                run=False, **kwargs
+            )
+            gateway_client._loop.run_until_complete(
+                gateway_client._file_download_coro())
+            gateway_client.close()
+
+        thread = threading.Thread(target=client, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def simulation_file(self, keys):
+        start = time.monotonic()
+        res = pd.simulation_file(
+            source_dict=self.source_dict, namespace="universe.fo",
+            object_key_list=keys)
+
+        return res, time.monotonic() - start
+
+    def test_unknown_object_fails_at_once(self):
+        """An object the gateway does not know fails its callers right away,
+        not after the deadline
+
+        """
+        self.start_client()
+
+        res, elapsed = self.simulation_file(["unknown"])
+        self.assertIsNone(res)
+        self.assertLess(elapsed, 1)
+        self.assertEqual(pd.PENDING_OBJECTS, {})
+
+        res, elapsed = self.simulation_file(["a"])
+        self.assertEqual(bytes(res[0]["contents"]), b"a")
+
+    def test_unknown_object_in_batch(self):
+        """An unknown object in a batch fails the whole call right away
+
+        """
+        self.start_client(protocol="pipelined", batch_requests=True)
+
+        res, elapsed = self.simulation_file(["a", "unknown"])
+        self.assertIsNone(res)
+        self.assertLess(elapsed, 1)
+        self.assertNotIn("universe.fo/unknown", pd.PENDING_OBJECTS)
+        self.assertNotIn("universe.fo/unknown", pd.GATEWAY_DATA)
+
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
@@ -0,0 +1,702 @@
+#!/usr/bin/env python3
+"""
+Testing the index part of the proxy services
+
+"""
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+# Append the parent directory for importing the file.
+sys.path.append(os.path.join('..', '..'))  # Append the program root dir
+import backend.global_settings as gloset
+import backend.proxy_services_index as pi
+from backend.util.loop_signal import LoopEvent, LoopQueue
+
+
+class _Dataset(object):
+    """
+    A tracking dataset, only knows its timestep.
+
+    """
+    def __init__(self, timestep):
+        self._timestep = timestep
+
+    def timestep(self):
+        return self._timestep
+
+
+def _objects(namespaces):
+    """
+    Return the objects of an index, for comparing indices.
+
+    """
+    return {
+        namespace: sorted(namespace_index.objects())
+        for namespace, namespace_index in namespaces.items()
+    }
+
+
+class Test_add_new_files(unittest.TestCase):
+    """
+    Unittest for parsing announced files into the index.
+
+    """
+    def setUp(self):
+        pi.INDEX_SNAPSHOT = pi.IndexSnapshot()
+
+    def test_parse_key(self):
+        """Object keys are parsed into their place in the index
+
+        """
+        self.assertEqual(
+            pi.parse_key("universe.fo.ta.nodes@1"), ("1", ("ta", "nodes")))
+        self.assertEqual(
+            pi.parse_key("universe.fo.ma.skin.outer.hex8@2"),
+            ("2", ("ma", "skin", "outer", "hex8")))
+        self.assertEqual(
+            pi.parse_key("universe.fo.ma.elemental.stress@2"),
+            ("2", ("ma", "elemental", "stress", None)))
+
+        for key in ["universe.fo.ta.nodes", "universe.fo.xx.nodes@1",
+                    "universe.fo.ta.unknown@1", "universe.fo.ta.skin.outer@1",
+                    "other.ta.nodes@1"]:
+            with self.subTest(key=key):
+                self.assertIsNone(pi.parse_key(key))
+
+    def test_batch(self):
+        """A batch of files makes one new snapshot
+
+        """
+        new_files = [
+            {"namespace": namespace, "key": key, "sha1sum": "abc"}
+            for namespace in ["a", "b"]
+            for key in ["universe.fo.ta.nodes@2",
+                        "universe.fo.ta.elements.hex8@1",
+                        "universe.fo.ta.elements.tet4@1",
+                        "universe.fo.ta.unknown@1"]
+        ]
+
+        self.assertEqual(pi._add_new_files(new_files), {"a", "b"})
+        self.assertEqual(pi.index_version(), 1)
+
+        self.assertEqual(sorted(pi.index("a")), ["1", "2"])
+        self.assertEqual(pi.timestep_index("a", "1").subtree(), {
+            "ta": {"elements": {
+                "hex8": {"object_key": "universe.fo.ta.elements.hex8@1",
+                         "sha1sum": "abc"},
+                "tet4": {"object_key": "universe.fo.ta.elements.tet4@1",
+                         "sha1sum": "abc"}}}})
+        self.assertEqual(pi.timestep_index("a", "2").subtree(), {
+            "ta": {"nodes": {"object_key": "universe.fo.ta.nodes@2",
+                             "sha1sum": "abc"}}})
+        self.assertEqual(pi.timestep_list("b"), ["1", "2"])
+
+        self.assertEqual(pi._add_new_files(new_files[3:4]), set())
+        self.assertEqual(pi.index_version(), 1)
+
+
+class Test_index_file(unittest.TestCase):
+    """
+    Unittest for starting from the index file of the last run.
+
+    """
+    def setUp(self):
+        pi.INDEX_SNAPSHOT = pi.IndexSnapshot()
+        pi._FILE_LISTING = None
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.index_file = os.path.join(self.directory.name, "index.json.gz")
+
+        self.comm_dict = {
+            "get_index_event": LoopEvent(),
+            "get_index_data_queue": queue.Queue(),
+            "shutdown_platt_gateway_event": LoopEvent()
+        }
+
+    def tearDown(self):
+        self.directory.cleanup()
+        pi._FILE_LISTING = None
+
+    def new_file(self, key, namespace="a", sha1sum="abc"):
+        return {"namespace": namespace, "key": key, "sha1sum": sha1sum}
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(.01)
+
+    def test_roundtrip(self):
+        """The index file restores the index
+
+        """
+        pi._add_new_files([
+            self.new_file("universe.fo.ta.nodes@1"),
+            self.new_file("universe.fo.ma.elemental.stress.hex8@2"),
+            self.new_file("universe.fo.ta.nodes@1", namespace="b",
+                          sha1sum=None)
+        ])
+        written = pi.snapshot()
+        pi.write_index_file(self.index_file, written)
+
+        parsed_files, listing = pi.read_index_file(self.index_file)
+        namespaces, _ = pi._insert_files(dict(), parsed_files)
+
+        self.assertIsNone(listing)
+        self.assertEqual(_objects(namespaces), _objects(written.namespaces))
+        self.assertEqual(
+            namespaces["a"].sorted_timesteps.timesteps(), ["1", "2"])
+
+    def test_start_from_index_file(self):
+        """The index file is published at once and replaced by the fresh
+        index with the files announced in the meantime
+
+        """
+        pi._add_new_files([
+            self.new_file("universe.fo.ta.nodes@1"),
+            self.new_file("universe.fo.ta.nodes@2")
+        ])
+        pi.write_index_file(self.index_file, pi.snapshot())
+        pi.INDEX_SNAPSHOT = pi.IndexSnapshot()
+
+        proxy_index = pi.ProxyIndex(
+            None, self.comm_dict, index_file=self.index_file)
+        updater = threading.Thread(
+            target=proxy_index._periodic_index_update_executor, daemon=True)
+        updater.start()
+
+        self.wait_for(lambda: pi.timestep_list("a") == ["1", "2"])
+        self.assertTrue(self.comm_dict["get_index_event"].is_set())
+
+        # announced while the gateway builds the index
+        pi._add_new_files([self.new_file("universe.fo.ta.nodes@3")])
+
+        # timestep 2 is gone on the gateway
+        fresh_index = {"a": {"1": {"ta": {"nodes": {
+            "object_key": "universe.fo.ta.nodes@1", "sha1sum": "abc"}}}}}
+        self.comm_dict["get_index_data_queue"].put({"index": fresh_index})
+
+        self.wait_for(lambda: pi.timestep_list("a") == ["1", "3"])
+
+        self.comm_dict["shutdown_platt_gateway_event"].set()
+        updater.join()
+
+        parsed_files, listing = pi.read_index_file(self.index_file)
+        namespaces, _ = pi._insert_files(dict(), parsed_files)
+        self.assertEqual(_objects(namespaces), _objects(pi.index()))
+        self.assertEqual(listing, ["a"])
+
+    def test_listing_from_index_file(self):
+        """Every namespace of the listing is listed right after a restart,
+        also the ones that were not loaded
+
+        """
+        pi._add_new_files([self.new_file("universe.fo.ta.nodes@1")])
+        pi.write_index_file(self.index_file, pi.IndexSnapshot(
+            1, pi.snapshot().namespaces, ("a", "b", "c")))
+
+        pi.INDEX_SNAPSHOT = pi.IndexSnapshot()
+        pi._REPLAY_FILES = list()
+        self.addCleanup(setattr, pi, "_REPLAY_FILES", None)
+
+        proxy_index = pi.ProxyIndex(
+            None, self.comm_dict, index_file=self.index_file)
+        proxy_index._load_index_file()
+
+        self.assertEqual(pi.namespace_list(), ["a", "b", "c"])
+        self.assertEqual(pi.timestep_list("a"), ["1"])
+        # the gateway has not told us yet
+        self.assertIsNone(pi.snapshot().listing)
+
+        # announced namespaces are listed as well
+        pi._add_new_files(
+            [self.new_file("universe.fo.ta.nodes@1", namespace="d")])
+        self.assertEqual(pi.namespace_list(), ["a", "b", "c", "d"])
+
+        # the listing of the gateway replaces it
+        with mock.patch.object(pi, "_LAZY", False):
+            pi._apply_listing(("a", "c"))
+        self.assertEqual(pi.namespace_list(), ["a", "c"])
+
+    def test_shutdown_wakes_the_updater(self):
+        """The updater sleeps until the shutdown and stops right away
+
+        """
+        proxy_index = pi.ProxyIndex(None, self.comm_dict)
+        updater = threading.Thread(
+            target=proxy_index._periodic_index_update_executor, daemon=True)
+        updater.start()
+
+        self.comm_dict["get_index_data_queue"].put({"index": {}})
+        self.wait_for(lambda: pi.snapshot().listing == ())
+
+        start = time.monotonic()
+        self.comm_dict["shutdown_platt_gateway_event"].set()
+        updater.join(2)
+
+        self.assertFalse(updater.is_alive())
+        self.assertLess(time.monotonic() - start, .5)
+
+    def test_wait_for_index(self):
+        """Waiting for the index ends with the connection or the index
+
+        """
+        def waiter(event):
+            thread = threading.Thread(
+                target=pi.wait_for_index, args=(event,), daemon=True)
+            thread.start()
+            return thread
+
+        connection_active_event = pi.ConnectionEvent()
+        self.assertFalse(pi.wait_for_index(connection_active_event, 0))
+
+        thread = waiter(connection_active_event)
+        thread.join(.1)
+        self.assertTrue(thread.is_alive())
+
+        connection_active_event.set()
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+
+        thread = waiter(pi.ConnectionEvent())
+        pi._add_new_files([self.new_file("universe.fo.ta.nodes@1")])
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+
+        self.assertTrue(pi.wait_for_index(timeout=0))
+
+    def test_broken_index_file(self):
+        """A broken index file is ignored
+
+        """
+        with open(self.index_file, "wb") as f:
+            f.write(b"no index")
+
+        proxy_index = pi.ProxyIndex(
+            None, self.comm_dict, index_file=self.index_file)
+
+        with mock.patch.object(pi.bl, "warning") as warning:
+            proxy_index._load_index_file()
+
+        self.assertTrue(warning.called)
+        self.assertEqual(pi.index_version(), 0)
+
+
+class Test_lazy_namespaces(unittest.TestCase):
+    """
+    Unittest for loading the index of a namespace on demand.
+
+    """
+    def setUp(self):
+        pi.INDEX_SNAPSHOT = pi.IndexSnapshot()
+        pi._REFERENCES.clear()
+        pi._LOADING.clear()
+
+        self.comm_dict = {
+            "get_index_event": LoopEvent(),
+            "get_index_data_queue": queue.Queue(),
+            "index_request_queue": LoopQueue(),
+            "shutdown_platt_gateway_event": LoopEvent()
+        }
+
+        proxy_index = pi.ProxyIndex(None, self.comm_dict)
+        self.updater = threading.Thread(
+            target=proxy_index._periodic_index_update_executor, daemon=True)
+        self.updater.start()
+
+        self.assertEqual(
+            self.next_request(), {"todo": "index", "scope": "namespaces"})
+
+    def tearDown(self):
+        self.comm_dict["shutdown_platt_gateway_event"].set()
+        self.updater.join()
+
+        pi._LAZY = False
+        pi._INDEX_REQUEST_QUEUE = None
+
+    def next_request(self):
+        return self.comm_dict["index_request_queue"].get(timeout=2)
+
+    def answer(self, answer):
+        self.comm_dict["get_index_data_queue"].put(answer)
+
+    def acquire(self, namespace, timeout=2):
+        result = queue.Queue()
+        threading.Thread(
+            target=lambda: result.put(
+                pi.acquire_namespace(namespace, timeout=timeout)),
+            daemon=True
+        ).start()
+        return result
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 2
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(.01)
+
+    def tree(self, namespace, timestep):
+        return {namespace: {timestep: {"ta": {"nodes": {
+            "object_key": "universe.fo.ta.nodes@{}".format(timestep),
+            "sha1sum": ""}}}}}
+
+    def new_file(self, namespace, timestep):
+        return {"namespace": namespace, "sha1sum": "",
+                "key": "universe.fo.ta.nodes@{}".format(timestep)}
+
+    def test_load_on_demand(self):
+        """Namespaces are loaded when acquired and evicted when released
+
+        """
+        self.answer({"namespaces": ["a", "b"]})
+        self.wait_for(lambda: pi.namespace_list() == ["a", "b"])
+        self.assertEqual(pi.index(), {})
+
+        acquired = self.acquire("a")
+        self.assertEqual(
+            self.next_request(), {"todo": "index", "namespace": "a"})
+
+        # announced while the gateway builds the index of a
+        pi._add_new_files([
+            self.new_file("a", "2"), self.new_file("b", "1"),
+            self.new_file("c", "1")])
+        self.assertEqual(pi.index(), {})
+        self.assertEqual(pi.namespace_list(), ["a", "b", "c"])
+
+        self.answer({"namespace": "a", "index": self.tree("a", "1")})
+        self.assertTrue(acquired.get(timeout=2))
+        self.assertEqual(pi.timestep_list("a"), ["1", "2"])
+
+        # a second user does not load it again
+        self.assertTrue(pi.acquire_namespace("a"))
+        pi.release_namespace("a")
+        self.assertIn("a", pi.index())
+
+        pi.release_namespace("a")
+        self.assertEqual(pi.index(), {})
+        self.assertEqual(pi.timestep_list("a"), [])
+
+    def test_unknown_namespace(self):
+        """Namespaces that are not on the gateway are not loaded
+
+        """
+        acquired = self.acquire("c")
+        self.answer({"namespaces": ["a"]})
+
+        self.assertFalse(acquired.get(timeout=2))
+        self.assertEqual(pi._REFERENCES, {})
+        self.assertTrue(self.comm_dict["index_request_queue"].empty())
+
+    def test_whole_index(self):
+        """An older gateway sends every namespace, nothing is evicted
+
+        """
+        whole_index = self.tree("a", "1")
+        whole_index.update(self.tree("b", "1"))
+        self.answer({"index": whole_index})
+        self.wait_for(lambda: pi.namespace_list() == ["a", "b"])
+
+        self.assertTrue(pi.acquire_namespace("a"))
+        pi.release_namespace("a")
+
+        self.assertEqual(sorted(pi.index()), ["a", "b"])
+        self.assertTrue(self.comm_dict["index_request_queue"].empty())
+
+
+class Test_index_stream(unittest.TestCase):
+    """
+    Unittest for decoding streamed index answers.
+
+    """
+    def setUp(self):
+        pi.INDEX_SNAPSHOT = pi.IndexSnapshot()
+        pi._REPLAY_FILES = list()
+
+        self.comm_dict = {
+            "get_index_event": LoopEvent(),
+            "shutdown_platt_gateway_event": LoopEvent()
+        }
+        self.proxy_index = pi.ProxyIndex(None, self.comm_dict)
+        self.request = {"todo": "index"}
+
+    def tearDown(self):
+        pi._REPLAY_FILES = None
+
+    def records(self, *records):
+        return b"".join(
+            json.dumps(record).encode() + b"\n" for record in records)
+
+    def feed(self, data, **item):
+        return self.proxy_index._apply_stream_item(
+            dict(item, stream=self.request, data=data))
+
+    def test_progressive(self):
+        """Namespaces become available one by one while the index streams
+
+        """
+        data = self.records(
+            {"namespace": "a"},
+            {"namespace": "a", "key": "universe.fo.ta.nodes@1",
+             "sha1sum": ""},
+            {"namespace": "b"},
+            {"namespace": "b", "key": "universe.fo.ta.nodes@2",
+             "sha1sum": ""}
+        )
+        # the parts end anywhere, also within a record
+        split = data.index(b'{"namespace": "b", "key"') + 5
+
+        self.assertEqual(self.feed(data[:split]), {"a"})
+        self.assertEqual(pi.namespace_list(), ["a"])
+        self.assertEqual(pi.timestep_list("a"), ["1"])
+
+        pi._add_new_files([{"namespace": "b", "sha1sum": "",
+                            "key": "universe.fo.ta.nodes@3"}])
+
+        self.assertEqual(self.feed(data[split:], end=True), {"a", "b"})
+        self.assertEqual(pi.snapshot().listing, ("a", "b"))
+        self.assertEqual(pi.timestep_list("b"), ["2", "3"])
+        self.assertIsNone(pi._REPLAY_FILES)
+
+    def test_broken_stream(self):
+        """A broken stream is requested again
+
+        """
+        self.assertEqual(self.feed(b'{"namespace": "a"}\n{"names'), set())
+        self.assertEqual(self.feed(b"", error="connection lost"), set())
+
+        self.assertTrue(self.comm_dict["get_index_event"].is_set())
+        self.assertIsNone(self.proxy_index._index_stream)
+        self.assertIsNone(pi.snapshot().listing)
+
+    def test_invalid_record(self):
+        """A stream with an invalid record is requested again
+
+        """
+        self.assertEqual(self.feed(b'{"key": "universe.fo.ta.nodes@1"}\n'),
+                         set())
+        self.assertTrue(self.comm_dict["get_index_event"].is_set())
+
+
+class Test_subscription_crawler(unittest.TestCase):
+    """
+    Unittest for tracking the newest timestep of subscribed datasets.
+
+    """
+    namespace = "universe.fo"
+    keys = ["universe.fo.ta.nodes", "universe.fo.ta.nodal.temperature"]
+
+    def setUp(self):
+        pi.INDEX_SNAPSHOT = pi.IndexSnapshot()
+        pi.SUBSCRIPTION_DICT.clear()
+        pi.CHANGED_NAMESPACE_QUEUE = LoopQueue()
+
+        self.comm_dict = {
+            "tell_new_file_queue": LoopQueue(),
+            "shutdown_platt_gateway_event": LoopEvent()
+        }
+        self.updates = LoopQueue()
+        self.datasets = dict()
+        # dataset_hash -> threading.Event, updates of the dataset wait for it
+        self.blocked = dict()
+
+        def dataset_timesteps(scene_hash, dataset_hash, set_timestep):
+            if dataset_hash in self.blocked:
+                self.blocked[dataset_hash].wait()
+            self.datasets[dataset_hash]._timestep = set_timestep
+            self.updates.put((dataset_hash, set_timestep))
+
+        scene_manager = mock.Mock()
+        scene_manager.dataset_timesteps.side_effect = dataset_timesteps
+
+        patcher = mock.patch.object(
+            gloset, "scene_manager", scene_manager, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        # the index and the crawler run in the event loop of the proxy services
+        def proxy_services():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            proxy_index = pi.ProxyIndex(loop, self.comm_dict)
+            shutdown_event = self.comm_dict["shutdown_platt_gateway_event"]
+            loop.run_until_complete(asyncio.gather(
+                proxy_index._watch_new_files_coro(),
+                pi._subscription_crawler_coro(shutdown_event)
+            ))
+            loop.close()
+
+        self.proxy_services = threading.Thread(
+            target=proxy_services, daemon=True)
+        self.proxy_services.start()
+
+    def tearDown(self):
+        for event in self.blocked.values():
+            event.set()
+        self.comm_dict["shutdown_platt_gateway_event"].set()
+        self.proxy_services.join()
+
+    def announce(self, timestep, keys=None, namespace=None):
+        for key in keys or self.keys:
+            self.comm_dict["tell_new_file_queue"].put({
+                "namespace": namespace or self.namespace,
+                "key": "{}@{}".format(key, timestep),
+                "sha1sum": ""
+            })
+
+    def subscribe(self, timestep, dataset_hash="dataset"):
+        self.datasets[dataset_hash] = _Dataset(timestep)
+        pi.subscribe(
+            dataset_hash, "scene", self.namespace,
+            self.datasets[dataset_hash],
+            ["{}@{}".format(key, timestep) for key in self.keys])
+
+    def next_update(self, timeout=1):
+        def get():
+            return asyncio.new_event_loop().run_until_complete(
+                asyncio.wait_for(self.updates.get_async(), timeout))
+
+        try:
+            return get()
+        except asyncio.TimeoutError:
+            return None
+
+    def test_complete_timestep_is_tracked(self):
+        """A dataset follows a newer timestep once all its files arrived
+
+        """
+        self.announce("2")
+        self.subscribe("2")
+        self.announce("10", keys=self.keys[:1])
+
+        self.assertIsNone(self.next_update(timeout=.1))
+
+        self.announce("10", keys=self.keys[1:])
+        self.assertEqual(self.next_update(), ("dataset", "10"))
+
+    def test_new_subscription_is_checked(self):
+        """A subscription to an outdated timestep is updated right away
+
+        """
+        self.announce("1")
+        self.announce("2")
+        self.subscribe("1")
+
+        self.assertEqual(self.next_update(), ("dataset", "2"))
+
+    def test_second_newest_timestep(self):
+        """If the newest timestep is incomplete, the second newest is used
+
+        """
+        self.announce("1")
+        self.announce("9")
+        self.announce("10", keys=self.keys[:1])
+        self.subscribe("1")
+
+        self.assertEqual(self.next_update(), ("dataset", "9"))
+
+    def test_slow_update_is_coalesced(self):
+        """A slow update does not hold up other datasets and only the newest
+        timestep is loaded after it
+
+        """
+        self.announce("1")
+        self.blocked["slow"] = threading.Event()
+        self.subscribe("1", dataset_hash="slow")
+        self.subscribe("1", dataset_hash="fast")
+
+        self.announce("2")
+        self.assertEqual(self.next_update(), ("fast", "2"))
+
+        self.announce("3")
+        self.assertEqual(self.next_update(), ("fast", "3"))
+        self.announce("4")
+        self.assertEqual(self.next_update(), ("fast", "4"))
+
+        self.blocked["slow"].set()
+        self.assertEqual(self.next_update(), ("slow", "2"))
+        self.assertEqual(self.next_update(), ("slow", "4"))
+        self.assertIsNone(self.next_update(timeout=.1))
+
+    def test_other_namespace_is_ignored(self):
+        """Files of other namespaces do not wake the subscription
+
+        """
+        self.announce("1")
+        self.subscribe("1")
+        self.announce("2", namespace="universe.other")
+
+        self.assertIsNone(self.next_update(timeout=.1))
+
+    def test_unsubscribe(self):
+        """An unsubscribed dataset is not updated anymore
+
+        """
+        self.announce("1")
+        self.subscribe("1")
+        pi.unsubscribe("dataset")
+        self.announce("2")
+
+        self.assertIsNone(self.next_update(timeout=.1))
+        self.assertEqual(pi.SUBSCRIPTION_DICT, {})
+
+    def test_timestep_list(self):
+        """New timesteps are sorted into the timestep list
+
+        """
+        for timestep in ["10", "2", "1"]:
+            self.announce(timestep)
+        self.subscribe("1")
+        self.assertEqual(self.next_update(), ("dataset", "10"))
+
+        self.assertEqual(pi.timestep_list(self.namespace), ["1", "2", "10"])
+        self.assertEqual(pi.adjacent_timestep(self.namespace, "2", 1), "10")
+        self.assertEqual(pi.adjacent_timestep(self.namespace, "2", -1), "1")
+        self.assertIsNone(pi.adjacent_timestep(self.namespace, "10", 1))
+        self.assertEqual(pi.newest_timesteps(self.namespace, 2), ["10", "2"])
+        self.assertEqual(pi.timestep_list("universe.other"), [])
+
+    def test_snapshots_do_not_change(self):
+        """New files create a new snapshot, older snapshots stay as they are
+
+        """
+        self.announce("1")
+        self.subscribe("1")
+        self.announce("2")
+        self.assertEqual(self.next_update(), ("dataset", "2"))
+
+        old_snapshot = pi.snapshot()
+        old_timestep = old_snapshot.namespaces[self.namespace]["2"]
+
+        self.announce("2", keys=["universe.fo.ta.nodal.stress"])
+        self.announce("3")
+        self.assertEqual(self.next_update(), ("dataset", "3"))
+
+        self.assertGreater(pi.index_version(), old_snapshot.version)
+        self.assertEqual(
+            sorted(old_snapshot.namespaces[self.namespace]), ["1", "2"])
+        self.assertEqual(
+            old_snapshot.namespaces[self.namespace].sorted_timesteps
+            .timesteps(), ["1", "2"])
+        self.assertNotIn("stress", old_timestep.children(("ta", "nodal")))
+        self.assertIn(
+            "stress",
+            pi.timestep_index(self.namespace, "2").children(("ta", "nodal")))
+        # unchanged timesteps are shared
+        self.assertIs(
+            pi.index(self.namespace)["1"],
+            old_snapshot.namespaces[self.namespace]["1"])
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
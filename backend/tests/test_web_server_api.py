@@ -3,6 +3,7 @@
 Test the web_server_api
 
 """
+import io
 import unittest
 from unittest import mock
 import json
@@ -1305,6 +1306,84 @@ class Test_web_server_api(unittest.TestCase):
             self.assertEqual(res, 'null')
 
 
+class Test_web_server_api_etag(unittest.TestCase):
+    """
+    Test the ETag handling of the mesh endpoints through cherrypy.
+
+    """
+    def setUp(self):
+        self.app = cherrypy.Application(
+            backend.web_server_api.ServerAPI(), '/api',
+            {'/': {'tools.gzip.on': True}})
+
+        self.mesh_hash = 'mesh_1'
+
+        scene_manager = mock.MagicMock()
+        scene_manager.dataset_mesh_hash.side_effect = (
+            lambda scene_hash, dataset_hash: {
+                'datasetMeshHash': self.mesh_hash})
+        scene_manager.dataset_mesh_geometry.side_effect = (
+            lambda scene_hash, dataset_hash: {
+                'datasetMeshHash': self.mesh_hash,
+                'nodes': [0.0, 1.0, 2.0]})
+
+        patcher = mock.patch(
+            'backend.global_settings.scene_manager', scene_manager,
+            create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_geometry(self, headers=()):
+        """
+        Request the geometry of a dataset, return status, headers and body.
+
+        """
+        request, response = self.app.get_serving(
+            cherrypy.lib.httputil.Host('127.0.0.1', 50000),
+            cherrypy.lib.httputil.Host('127.0.0.1', 50001),
+            'http', 'HTTP/1.1')
+
+        response = request.run(
+            'GET', '/api/scenes/scene/dataset/mesh/geometry', '', 'HTTP/1.1',
+            [('Host', '127.0.0.1')] + list(headers), io.BytesIO())
+
+        body = b''.join(response.body)
+        status = int(response.status.split()[0])
+        headers = response.headers
+
+        self.app.release_serving()
+
+        return status, headers, body
+
+    def test_if_none_match(self):
+        """A matching If-None-Match gets 304, a changed mesh a new ETag
+
+        """
+        status, headers, body = self.get_geometry()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['nodes'], [0.0, 1.0, 2.0])
+        etag = headers['ETag']
+
+        # the client still has the body
+        status, headers, body = self.get_geometry(
+            [('If-None-Match', etag)])
+
+        self.assertEqual(status, 304)
+        self.assertEqual(body, b'')
+        self.assertEqual(headers['ETag'], etag)
+
+        # the mesh changes, so does the content key
+        self.mesh_hash = 'mesh_2'
+
+        status, headers, body = self.get_geometry(
+            [('If-None-Match', etag)])
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            json.loads(body)['datasetMeshHash'], 'mesh_2')
+        self.assertNotEqual(headers['ETag'], etag)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
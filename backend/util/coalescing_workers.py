@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Run jobs in the background, coalescing the jobs for the same thing.
+
+Tracking datasets follow the newest timestep of their simulation. Switching a
+dataset to a new timestep fetches and mangles its data, which takes a while.
+New timesteps may arrive faster than that, and only the newest one matters,
+so a dataset has one slot: while its job runs, newer jobs replace each other
+and only the last one runs once the slot is free.
+
+"""
+import threading
+import concurrent.futures
+
+from util.loggers import BackendLog as bl
+
+
+class CoalescingWorkers(object):
+    """
+    Runs jobs in a bounded thread pool with one slot per key.
+
+    Every key has at most one running and one pending job. A job submitted
+    while the key is busy replaces the pending one. Jobs of different keys run
+    in parallel.
+
+    Args:
+     workers (int, defaults to 4): The number of jobs that run at the same
+      time.
+     name (str, defaults to 'CoalescingWorkers'): Prefix for the names of the
+      worker threads.
+
+    """
+    def __init__(self, workers=4, name="CoalescingWorkers"):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=name)
+
+        self._lock = threading.Lock()
+
+        # key -> value of the queued or running job
+        self._running = dict()
+
+        # key -> (value, function) of the job that runs after that
+        self._pending = dict()
+
+        # notified whenever a key gets idle
+        self._idle_condition = threading.Condition(self._lock)
+
+        self._shutdown = False
+
+    def submit(self, key, value, function):
+        """
+        Run ``function(value)`` in a worker thread once the slot of ``key`` is
+        free.
+
+        Args:
+         key (hashable): The slot of the job, e.g. a dataset.
+         value (object): What the job works on, e.g. a timestep. A job with the
+          value of the running job is dropped, as that job does the same.
+         function (callable): Called with ``value``, exceptions are logged.
+
+        Returns:
+         bool: True if the job runs, False if it was dropped.
+
+        """
+        with self._lock:
+            if self._shutdown:
+                return False
+
+            if key not in self._running:
+                self._running[key] = value
+                self._executor.submit(self._run, key, value, function)
+                return True
+
+            if self._running[key] == value:
+                # the running job already gets us there
+                self._pending.pop(key, None)
+                return False
+
+            self._pending[key] = (value, function)
+
+        return True
+
+    def discard(self, key):
+        """
+        Drop the pending job of a key, a running job finishes.
+
+        """
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def busy(self, key):
+        """
+        Return True if a job of the key is queued, running or pending.
+
+        """
+        with self._lock:
+            return key in self._running
+
+    def join(self, timeout=None):
+        """
+        Wait until every key is idle.
+
+        Returns:
+         bool: True if every key is idle, False on timeout.
+
+        """
+        with self._lock:
+            return self._idle_condition.wait_for(
+                lambda: not self._running, timeout)
+
+    def shutdown(self):
+        """
+        Drop every pending job and stop the worker threads once they are
+        idle.
+
+        """
+        with self._lock:
+            self._shutdown = True
+            self._pending.clear()
+
+        self._executor.shutdown(wait=False)
+
+    def _run(self, key, value, function):
+        """
+        Run one job in a worker thread and queue the pending job of its key.
+
+        """
+        try:
+            function(value)
+        except Exception as e:
+            bl.warning("Job {} for {} failed: {}".format(value, key, e))
+
+        with self._lock:
+            try:
+                value, function = self._pending.pop(key)
+            except KeyError:
+                pass
+            else:
+                if not self._shutdown:
+                    # back in line, so other keys get their turn
+                    self._running[key] = value
+                    self._executor.submit(self._run, key, value, function)
+                    return
+
+            del self._running[key]
+            self._idle_condition.notify_all()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+A compact, immutable store for the object index of the platt gateway.
+
+Object keys look like ``universe.fo.ta.nodal.temperature@000000042.000000``.
+The key already tells where the object belongs in the index, so the store
+keeps only the parsed path of every object and rebuilds the key from it:
+
+ * timesteps are interned strings,
+ * paths like ``("ta", "nodal", "temperature")`` are interned tuples, shared
+   by every timestep of every namespace,
+ * sha1sums are 20-byte values, concatenated into one bytes object per
+   timestep.
+
+Stores are never changed after they are built. Adding objects returns a new
+store that shares everything that did not change with the old one.
+
+"""
+import sys
+
+from backend.util.sorted_timesteps import SortedTimesteps
+
+
+# the prefix of every object key
+KEY_PREFIX = "universe.fo."
+
+# the number of key components after the usage that are part of the index
+# path, e.g. universe.fo.ta.skin.<skintype>.<elemtype>@<timestep>
+_KEY_LAYOUT = {
+    "nodes": 0,
+    "boundingbox": 0,
+    "elements": 1,
+    "elementactivationbitmap": 1,
+    "nset": 1,
+    "nodal": 1,
+    "skin": 2,
+    "elset": 2,
+    "elemental": 2,
+}
+
+# every path we have seen, for sharing equal paths
+_PATHS = dict()
+
+# stored for objects without a (valid) sha1sum
+_NO_SHA1SUM = bytes(20)
+
+
+def parse_key(key):
+    """
+    Parse an object key into its place in the index.
+
+    Returns:
+     tuple or None: ``(timestep, path)`` with the path below the timestep as
+     a tuple, e.g. ``("ta", "nodal", "temperature")``. None if the key can not
+     be parsed.
+
+    """
+    objects, separator, timestep = key.partition("@")
+
+    if not separator or not objects.startswith(KEY_PREFIX):
+        return None
+
+    components = objects[len(KEY_PREFIX):].split(".")
+
+    if len(components) < 2 or components[0] not in ("ta", "ma"):
+        return None
+
+    try:
+        depth = _KEY_LAYOUT[components[1]]
+    except KeyError:
+        return None
+
+    path = components[:2 + depth]
+
+    if len(path) < 2 + depth:
+        if components[1] != "elemental" or len(path) != 3:
+            return None
+        # the element type of elemental fields is optional
+        path.append(None)
+
+    return timestep, tuple(path)
+
+
+def _intern_path(path):
+    """
+    Return the shared tuple for a path.
+
+    """
+    path = tuple(sys.intern(part) if part is not None else None
+                 for part in path)
+    return _PATHS.setdefault(path, path)
+
+
+def _sha1sum_digest(sha1sum):
+    """
+    Return the 20 bytes of a sha1sum in hex, None if it is something else.
+
+    """
+    try:
+        digest = bytes.fromhex(sha1sum)
+    except (TypeError, ValueError):
+        return None
+
+    if len(digest) != 20 or digest.hex() != sha1sum:
+        return None
+
+    return digest
+
+
+def _object_key(timestep, path):
+    """
+    Rebuild the object key of an object from its path.
+
+    """
+    return "{}{}@{}".format(
+        KEY_PREFIX, ".".join(part for part in path if part is not None),
+        timestep)
+
+
+class TimestepIndex(object):
+    """
+    The objects of one timestep.
+
+    Paths address objects and parts of the index, e.g. ``("ta", "nodes")`` is
+    the nodes object, ``("ta", "nodal")`` all nodal fields.
+
+    Args:
+     timestep (str): The timestep.
+     objects (iterable, defaults to ()): Tuples ``(path, key, sha1sum)``, a
+      later object replaces an earlier one with the same path.
+
+    """
+    __slots__ = ("_timestep", "_paths", "_sha1sums", "_odd_values")
+
+    def __init__(self, timestep, objects=()):
+        self._timestep = sys.intern(timestep)
+
+        by_path = dict()
+        for path, key, sha1sum in objects:
+            by_path[_intern_path(path)] = (key, sha1sum)
+
+        self._paths = tuple(by_path)
+
+        sha1sums = bytearray()
+        # keys that can not be rebuilt from the path and sha1sums that are
+        # no 40 digit hex string, by position
+        odd_values = dict()
+
+        for position, (key, sha1sum) in enumerate(by_path.values()):
+            digest = _sha1sum_digest(sha1sum)
+
+            if digest is not None:
+                sha1sums += digest
+            else:
+                sha1sums += _NO_SHA1SUM
+                if sha1sum not in ("", None):
+                    odd_values[(position, "sha1sum")] = sha1sum
+
+            if key != _object_key(self._timestep, self._paths[position]):
+                odd_values[(position, "object_key")] = key
+
+        self._sha1sums = bytes(sha1sums)
+        self._odd_values = odd_values or None
+
+    def __len__(self):
+        return len(self._paths)
+
+    @property
+    def timestep(self):
+        return self._timestep
+
+    def objects(self):
+        """
+        Yield the objects as tuples ``(path, key, sha1sum)``.
+
+        """
+        for position, path in enumerate(self._paths):
+            yield path, self._key(position), self._sha1sum(position)
+
+    def paths(self):
+        """
+        Return the paths of all objects.
+
+        """
+        return list(self._paths)
+
+    def contains(self, path):
+        """
+        Return True if there is an object at ``path``.
+
+        """
+        return _PATHS.get(tuple(path)) in self._paths
+
+    def entry(self, path):
+        """
+        Return an object of the timestep.
+
+        Returns:
+         dict: A new dict with the keys ``object_key`` and ``sha1sum``, the
+         sha1sum is an empty string if it is unknown.
+
+        Raises:
+         KeyError: If there is no object at ``path``.
+
+        """
+        try:
+            position = self._paths.index(_PATHS[tuple(path)])
+        except (KeyError, ValueError):
+            raise KeyError(path)
+
+        return {
+            "object_key": self._key(position),
+            "sha1sum": self._sha1sum(position)
+        }
+
+    def children(self, prefix=()):
+        """
+        Return the names one level below a part of the index, e.g. the nodal
+        fields for ``("ta", "nodal")``.
+
+        Returns:
+         list: The names in the order the objects were added.
+
+        Raises:
+         KeyError: If there is nothing below ``prefix``.
+
+        """
+        prefix = tuple(prefix)
+        length = len(prefix)
+
+        children = dict()
+        for path in self._paths:
+            if len(path) > length and path[:length] == prefix:
+                children[path[length]] = None
+
+        if not children and prefix:
+            raise KeyError(prefix)
+
+        return list(children)
+
+    def subtree(self, prefix=()):
+        """
+        Return a part of the index as new nested dicts, the objects are
+        dicts like ``entry`` returns them.
+
+        Raises:
+         KeyError: If there is nothing below ``prefix``.
+
+        """
+        prefix = tuple(prefix)
+        length = len(prefix)
+
+        result = dict()
+        for position, path in enumerate(self._paths):
+            if len(path) <= length or path[:length] != prefix:
+                continue
+
+            node = result
+            for part in path[length:-1]:
+                node = node.setdefault(part, dict())
+
+            node[path[-1]] = {
+                "object_key": self._key(position),
+                "sha1sum": self._sha1sum(position)
+            }
+
+        if not result and prefix:
+            raise KeyError(prefix)
+
+        return result
+
+    def with_objects(self, objects):
+        """
+        Return a new TimestepIndex with more objects.
+
+        Args:
+         objects (iterable): Tuples ``(path, key, sha1sum)``.
+
+        """
+        return TimestepIndex(
+            self._timestep, list(self.objects()) + list(objects))
+
+    def _key(self, position):
+        if self._odd_values is not None:
+            key = self._odd_values.get((position, "object_key"))
+            if key is not None:
+                return key
+
+        return _object_key(self._timestep, self._paths[position])
+
+    def _sha1sum(self, position):
+        if self._odd_values is not None:
+            sha1sum = self._odd_values.get((position, "sha1sum"))
+            if sha1sum is not None:
+                return sha1sum
+
+        sha1sum = self._sha1sums[position * 20:(position + 1) * 20]
+
+        return "" if sha1sum == _NO_SHA1SUM else sha1sum.hex()
+
+
+class NamespaceIndex(object):
+    """
+    The timesteps of one namespace and their objects.
+
+    Behaves like a read only dict of ``TimestepIndex`` by timestep.
+
+    Args:
+     timesteps (dict or None, defaults to None): ``TimestepIndex`` by
+      timestep.
+     sorted_timesteps (SortedTimesteps or None, defaults to None): The
+      timesteps in natural sort order, built from ``timesteps`` if None.
+
+    """
+    __slots__ = ("_timesteps", "sorted_timesteps")
+
+    def __init__(self, timesteps=None, sorted_timesteps=None):
+        self._timesteps = timesteps if timesteps is not None else dict()
+
+        if sorted_timesteps is None:
+            sorted_timesteps = SortedTimesteps(self._timesteps.keys())
+        self.sorted_timesteps = sorted_timesteps
+
+    @classmethod
+    def from_objects(cls, objects):
+        """
+        Build a NamespaceIndex.
+
+        Args:
+         objects (iterable): Tuples ``(key, sha1sum)``, keys that can not be
+          parsed are skipped.
+
+        """
+        parsed_objects = list()
+
+        for key, sha1sum in objects:
+            parsed = parse_key(key)
+
+            if parsed is not None:
+                parsed_objects.append(parsed + (key, sha1sum))
+
+        return cls().with_objects(parsed_objects)
+
+    def __len__(self):
+        return len(self._timesteps)
+
+    def __iter__(self):
+        return iter(self._timesteps)
+
+    def __contains__(self, timestep):
+        return timestep in self._timesteps
+
+    def __getitem__(self, timestep):
+        return self._timesteps[timestep]
+
+    def get(self, timestep, default=None):
+        return self._timesteps.get(timestep, default)
+
+    def keys(self):
+        return self._timesteps.keys()
+
+    def items(self):
+        return self._timesteps.items()
+
+    def objects(self):
+        """
+        Yield every object as a tuple ``(key, sha1sum)``.
+
+        """
+        for timestep_index in self._timesteps.values():
+            for _, key, sha1sum in timestep_index.objects():
+                yield key, sha1sum
+
+    def with_objects(self, parsed_objects):
+        """
+        Return a new NamespaceIndex with more objects.
+
+        Only the timesteps that get objects are rebuilt, the others are shared
+        with this index.
+
+        Args:
+         parsed_objects (iterable): Tuples ``(timestep, path, key, sha1sum)``,
+          with timestep and path from ``parse_key``.
+
+        """
+        by_timestep = dict()
+
+        for timestep, path, key, sha1sum in parsed_objects:
+            by_timestep.setdefault(timestep, list()).append(
+                (path, key, sha1sum))
+
+        if not by_timestep:
+            return self
+
+        timesteps = dict(self._timesteps)
+        sorted_timesteps = self.sorted_timesteps
+
+        for timestep, timestep_objects in by_timestep.items():
+            try:
+                timesteps[timestep] = timesteps[timestep].with_objects(
+                    timestep_objects)
+
+            except KeyError:
+                timesteps[timestep] = TimestepIndex(
+                    timestep, timestep_objects)
+
+                if sorted_timesteps is self.sorted_timesteps:
+                    sorted_timesteps = sorted_timesteps.copy()
+                sorted_timesteps.add(timestep)
+
+        return NamespaceIndex(timesteps, sorted_timesteps)
+
+
+def tree_objects(tree):
+    """
+    Yield the object key and sha1sum of every object in a nested dict index,
+    like the gateway sends it.
+
+    """
+    if "object_key" in tree:
+        yield tree["object_key"], tree.get("sha1sum")
+        return
+
+    for subtree in tree.values():
+        if isinstance(subtree, dict):
+            yield from tree_objects(subtree)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+A cache for fully encoded (serialized and compressed) response bodies.
+
+Mesh geometry and field responses are large. Serializing them to JSON and
+compressing them is expensive, so we do it once per content hash and hand out
+the stored bytes for every following request.
+
+"""
+import gzip
+import json
+import hashlib
+import threading
+import collections
+
+
+# the encodings and compressions we know how to produce
+ENCODINGS = ["json"]
+COMPRESSIONS = ["identity", "gzip"]
+
+
+def encode(obj, encoding="json"):
+    """
+    Serialize an object to bytes.
+
+    Args:
+     obj (JSON parsable object): The object we want to serialize.
+     encoding (str, defaults to 'json'): The encoding of the output.
+
+    Returns:
+     bytes: The serialized object.
+
+    Raises:
+     ValueError: If the encoding is unknown.
+
+    """
+    if encoding == "json":
+        return json.dumps(obj).encode("utf-8")
+
+    raise ValueError("unknown encoding {}".format(encoding))
+
+
+def compress(body, compression="identity", compress_level=5):
+    """
+    Compress an already encoded body.
+
+    Args:
+     body (bytes): The encoded body.
+     compression (str, defaults to 'identity'): The compression to apply.
+     compress_level (int, defaults to 5): The compression level, same default
+      as the cherrypy gzip tool.
+
+    Returns:
+     bytes: The compressed body.
+
+    Raises:
+     ValueError: If the compression is unknown.
+
+    """
+    if compression == "identity":
+        return body
+
+    if compression == "gzip":
+        return gzip.compress(body, compresslevel=compress_level)
+
+    raise ValueError("unknown compression {}".format(compression))
+
+
+def entity_tag(content_key, encoding="json", compression="identity"):
+    """
+    Return a strong entity tag (ETag) for an encoded body.
+
+    The tag only depends on the content key and on the representation, so it
+    can be calculated without encoding the body. Every representation
+    (encoding and compression) gets its own tag, as is required for strong
+    entity tags.
+
+    Args:
+     content_key (hashable): Identifies the content, e.g. a tuple containing
+      the mesh or field hash.
+     encoding (str, defaults to 'json'): The encoding of the body.
+     compression (str, defaults to 'identity'): The compression of the body.
+
+    Returns:
+     str: The quoted entity tag.
+
+    """
+    tag_source = repr((content_key, encoding, compression)).encode("utf-8")
+    return '"{}"'.format(hashlib.sha1(tag_source).hexdigest())
+
+
+class EncodedResponseCache(object):
+    """
+    A thread safe LRU cache for encoded response bodies.
+
+    Entries are keyed by ``(content_key, encoding, compression)``, where
+    ``content_key`` is something that uniquely identifies the content, e.g.
+    a tuple containing the mesh or field hash. The cache is bounded by the
+    total number of bytes it holds.
+
+    Concurrent requests for the same missing entry are coalesced, so the
+    content is only serialized and compressed once.
+
+    Args:
+     max_bytes (int, defaults to 256 MiB): The maximum number of bytes that
+      are held in the cache.
+     compress_level (int, defaults to 5): The level for gzip compression.
+
+    """
+    def __init__(self, max_bytes=256*1024*1024, compress_level=5):
+        self._max_bytes = max_bytes
+        self._compress_level = compress_level
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._current_bytes = 0
+
+        # key -> threading.Event for entries that are being created
+        self._pending = dict()
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    def get(self, content_key, encoding="json", compression="identity"):
+        """
+        Return a cached body or None if it is not in the cache.
+
+        """
+        key = (content_key, encoding, compression)
+
+        with self._lock:
+            try:
+                body = self._entries[key]
+            except KeyError:
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+
+        return body
+
+    def get_or_create(self, content_key, create, encoding="json",
+                      compression="identity"):
+        """
+        Return the encoded body for content_key, creating it if necessary.
+
+        Args:
+         content_key (hashable): Identifies the content.
+         create (callable): Called without arguments on a cache miss, must
+          return the (JSON parsable) object to be encoded. If it returns None
+          nothing is cached and None is returned.
+         encoding (str, defaults to 'json'): The encoding of the body.
+         compression (str, defaults to 'identity'): The compression of the
+          body.
+
+        Returns:
+         bytes or None: The encoded body.
+
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError("unknown encoding {}".format(encoding))
+        if compression not in COMPRESSIONS:
+            raise ValueError("unknown compression {}".format(compression))
+
+        key = (content_key, encoding, compression)
+
+        while True:
+            with self._lock:
+                try:
+                    body = self._entries[key]
+                except KeyError:
+                    pass
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return body
+
+                pending_event = self._pending.get(key)
+
+                if pending_event is None:
+                    # we are the ones creating the entry
+                    pending_event = threading.Event()
+                    self._pending[key] = pending_event
+                    self._stats["misses"] += 1
+                    break
+
+            # somebody else is creating the entry, wait for them and look
+            # again
+            pending_event.wait()
+
+        try:
+            if compression == "identity":
+                obj = create()
+                body = None if obj is None else encode(obj, encoding)
+            else:
+                # compress the uncompressed body, creating that too if needed
+                raw_body = self.get_or_create(
+                    content_key, create,
+                    encoding=encoding, compression="identity")
+                body = None if raw_body is None else compress(
+                    raw_body, compression, self._compress_level)
+
+            if body is not None:
+                self._store(key, body)
+
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending_event.set()
+
+        return body
+
+    def _store(self, key, body):
+        """
+        Store a body and evict the least recently used entries if necessary.
+
+        """
+        size = len(body)
+
+        # do not even try to store things that are larger than the cache
+        if size > self._max_bytes:
+            return
+
+        with self._lock:
+            old_body = self._entries.pop(key, None)
+            if old_body is not None:
+                self._current_bytes -= len(old_body)
+
+            self._entries[key] = body
+            self._current_bytes += size
+
+            while self._current_bytes > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._current_bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+
+        """
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def stats(self):
+        """
+        Return a dictionary with cache statistics.
+
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._current_bytes
+
+        return stats
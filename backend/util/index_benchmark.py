@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark adding announced files to the proxy index.
+
+Simulates a burst of new file announcements from the gateway and measures how
+many the index takes in per second, one at a time and in batches::
+
+    python -m backend.util.index_benchmark --timesteps 1000
+
+Run it from the program root directory.
+
+"""
+import time
+import asyncio
+import argparse
+
+import backend.proxy_services_index as pi
+from backend.util.loop_signal import LoopEvent, LoopQueue
+
+
+# object keys of one timestep, like a thermal and mechanical simulation
+_OBJECT_KEYS = [
+    "universe.fo.{}.nodes",
+    "universe.fo.{}.elements.hex8",
+    "universe.fo.{}.skin.outer.hex8",
+    "universe.fo.{}.nodal.temperature",
+    "universe.fo.{}.nodal.displacement",
+    "universe.fo.{}.elemental.stress.hex8",
+    "universe.fo.{}.elset.heated.hex8",
+]
+
+
+def new_files(namespaces, timesteps):
+    """
+    Return the announcements of every object of every timestep.
+
+    """
+    return [
+        {
+            "namespace": "bench.{}".format(namespace),
+            "key": "{}@{:09d}.000000".format(
+                key.format(simtype), timestep),
+            "sha1sum": "{:040x}".format(timestep)
+        }
+        for timestep in range(timesteps)
+        for namespace in range(namespaces)
+        for simtype in ["ta", "ma"]
+        for key in _OBJECT_KEYS
+    ]
+
+
+def ingest(announcements, batch_size):
+    """
+    Add the announcements to an empty index.
+
+    Returns:
+     float: The seconds it took.
+
+    """
+    loop = asyncio.new_event_loop()
+    comm_dict = {
+        "tell_new_file_queue": LoopQueue(),
+        "shutdown_platt_gateway_event": LoopEvent()
+    }
+
+    pi.INDEX_SNAPSHOT = pi.IndexSnapshot()
+    pi.CHANGED_NAMESPACE_QUEUE = LoopQueue()
+
+    proxy_index = pi.ProxyIndex(loop, comm_dict, batch_size=batch_size)
+
+    async def until_empty():
+        # the watcher adds a batch without giving up the loop, so an empty
+        # queue means everything is in the index
+        while not comm_dict["tell_new_file_queue"].empty():
+            await asyncio.sleep(.001)
+        comm_dict["shutdown_platt_gateway_event"].set()
+
+    async def run():
+        await asyncio.gather(
+            proxy_index._watch_new_files_coro(), until_empty())
+
+    for announcement in announcements:
+        comm_dict["tell_new_file_queue"].put(announcement)
+
+    start = time.perf_counter()
+    loop.run_until_complete(run())
+    elapsed = time.perf_counter() - start
+
+    loop.close()
+
+    return elapsed
+
+
+def benchmark(namespaces=4, timesteps=500, batch_sizes=(1, 100, 10000)):
+    """
+    Print the announcements per second for different batch sizes.
+
+    """
+    announcements = new_files(namespaces, timesteps)
+
+    for batch_size in batch_sizes:
+        elapsed = ingest(announcements, batch_size)
+
+        assert len(pi.timestep_list("bench.0")) == timesteps
+
+        print("batch size {:>6}: {:8d} files in {:6.3f} s, {:9.0f} files/s, "
+              "index version {}".format(
+                  batch_size, len(announcements), elapsed,
+                  len(announcements) / elapsed, pi.index_version()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--namespaces", type=int, default=4,
+                        help="Number of simulations writing at the same time")
+    parser.add_argument("--timesteps", type=int, default=500,
+                        help="Number of timesteps of every simulation")
+    parser.add_argument("--batch_sizes", type=int, nargs="+",
+                        default=[1, 100, 10000],
+                        help="The batch sizes to compare")
+    args = parser.parse_args()
+
+    benchmark(args.namespaces, args.timesteps, args.batch_sizes)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Queues and events that threads and asyncio event loops can share.
+
+``LoopQueue`` and ``LoopEvent`` behave like ``queue.Queue`` and
+``threading.Event`` for threads. In addition coroutines can await them without
+blocking an executor thread: ``put()`` and ``set()`` wake the waiting
+coroutines with ``loop.call_soon_threadsafe``, so there is no polling and an
+idle loop sleeps until something happens.
+
+"""
+import queue
+import asyncio
+import threading
+
+
+def _wake(future):
+    """
+    Resolve a waiter, runs in the loop of the waiter.
+
+    """
+    if not future.done():
+        future.set_result(None)
+
+
+class _LoopWaiters(object):
+    """
+    Futures of coroutines waiting for a thread, with their event loops.
+
+    Not thread safe, the owner guards it with its own lock.
+
+    """
+    def __init__(self):
+        # future -> event loop of the future
+        self._waiters = dict()
+
+    def add(self, future, loop):
+        self._waiters[future] = loop
+
+    def discard(self, future):
+        self._waiters.pop(future, None)
+
+    def wake_all(self):
+        """
+        Wake every waiter and forget them.
+
+        """
+        waiters, self._waiters = self._waiters, dict()
+
+        for future, loop in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # the loop is closed, nobody waits anymore
+                pass
+
+
+class LoopEvent(threading.Event):
+    """
+    A ``threading.Event`` that coroutines can await with ``wait_async()``.
+
+    """
+    def __init__(self):
+        super().__init__()
+
+        self._loop_lock = threading.Lock()
+        self._loop_waiters = _LoopWaiters()
+
+    def set(self):
+        super().set()
+
+        with self._loop_lock:
+            self._loop_waiters.wake_all()
+
+    async def wait_async(self, until=None):
+        """
+        Wait until the event is set.
+
+        Args:
+         until (LoopEvent or None, defaults to None): Stop waiting when this
+          event is set, e.g. a shutdown event.
+
+        Returns:
+         bool: True if the event is set, False if ``until`` was set first.
+
+        """
+        loop = asyncio.get_event_loop()
+
+        while True:
+            if self.is_set():
+                return True
+
+            if until is not None and until.is_set():
+                return False
+
+            future = loop.create_future()
+
+            if not self._add_loop_waiter(future, loop):
+                continue
+
+            if until is not None and not until._add_loop_waiter(future, loop):
+                self._discard_loop_waiter(future)
+                continue
+
+            try:
+                await future
+            finally:
+                self._discard_loop_waiter(future)
+                if until is not None:
+                    until._discard_loop_waiter(future)
+
+    def _add_loop_waiter(self, future, loop):
+        """
+        Wake ``future`` when the event is set.
+
+        Returns:
+         bool: False if the event is already set and nothing was added.
+
+        """
+        with self._loop_lock:
+            if self.is_set():
+                return False
+
+            self._loop_waiters.add(future, loop)
+            return True
+
+    def _discard_loop_waiter(self, future):
+        with self._loop_lock:
+            self._loop_waiters.discard(future)
+
+
+class LoopQueue(queue.Queue):
+    """
+    A ``queue.Queue`` that coroutines can read with ``get_async()``.
+
+    Args:
+     maxsize (int, defaults to 0): The maximum size of the queue, 0 for no
+      limit.
+
+    """
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+
+        self._loop_waiters = _LoopWaiters()
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+
+        with self.mutex:
+            self._loop_waiters.wake_all()
+
+    async def get_async(self, until=None):
+        """
+        Remove and return an item, waiting until one is available.
+
+        Args:
+         until (LoopEvent or None, defaults to None): Stop waiting when this
+          event is set, e.g. a shutdown event.
+
+        Returns:
+         object: The item, or None if ``until`` was set first.
+
+        """
+        loop = asyncio.get_event_loop()
+
+        while True:
+            if until is not None and until.is_set():
+                return None
+
+            future = loop.create_future()
+
+            with self.mutex:
+                if self._qsize():
+                    item = self._get()
+                    self.not_full.notify()
+                    return item
+
+                self._loop_waiters.add(future, loop)
+
+            if until is not None and not until._add_loop_waiter(future, loop):
+                self._discard_loop_waiter(future)
+                continue
+
+            try:
+                await future
+            finally:
+                self._discard_loop_waiter(future)
+                if until is not None:
+                    until._discard_loop_waiter(future)
+
+    def _discard_loop_waiter(self, future):
+        with self.mutex:
+            self._loop_waiters.discard(future)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+A bounded cache for the meshes and fields of a dataset.
+
+Meshes and fields are stored by their hash, so the parser can skip what we
+already have. Every visited and every prefetched timestep may add a mesh and a
+field, so the cache only keeps the most recently used ones. The mesh and field
+that are currently served are pinned and never evicted.
+
+"""
+import threading
+import collections
+
+
+class LRUCache(object):
+    """
+    A thread safe mapping that keeps at most ``max_entries`` entries.
+
+    Storing an entry evicts the least recently used entries that are not
+    pinned. Storing and getting an entry make it the most recently used one,
+    checking with ``in`` does not.
+
+    Args:
+     max_entries (int): The maximum number of entries, pinned entries and the
+      entry that was stored last are kept even if there are more.
+
+    """
+    def __init__(self, max_entries):
+        self._max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+        # keys that are never evicted
+        self._pinned = frozenset()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, key):
+        with self._lock:
+            value = self._entries[key]
+            self._entries.move_to_end(key)
+
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            if len(self._entries) <= self._max_entries:
+                return
+
+            for old_key in list(self._entries.keys()):
+                if len(self._entries) <= self._max_entries:
+                    break
+
+                if old_key == key or old_key in self._pinned:
+                    continue
+
+                del self._entries[old_key]
+
+    def get(self, key, default=None):
+        """
+        Return the value of a key, or ``default`` if it is not cached.
+
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """
+        Return a list of the cached keys, least recently used first.
+
+        """
+        with self._lock:
+            return list(self._entries.keys())
+
+    def pin(self, *keys):
+        """
+        Replace the pinned keys.
+
+        Pinned keys are never evicted, pinning a key that is not cached keeps
+        it once it is stored.
+
+        Args:
+         keys (hashable): The keys to keep.
+
+        """
+        with self._lock:
+            self._pinned = frozenset(keys)
@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+A local mock of the platt gateway.
+
+Serves objects from memory over the same protocol as the real gateway, so the
+gateway client can be tested and benchmarked without a ceph cluster.
+
+Run it as a program for a small download benchmark::
+
+    python -m backend.util.mock_gateway --objects 50 --size 4000000
+
+"""
+import os
+import json
+import time
+import queue
+import base64
+import struct
+import asyncio
+import hashlib
+import argparse
+import threading
+
+from backend.platt_proxy_client import Client
+from backend.util.compact_index import tree_objects
+import backend.util.transfer_compression as tc
+
+
+class MockGateway(object):
+    """
+    A gateway that serves objects from a dictionary.
+
+    The gateway runs its own event loop in a background thread. It speaks the
+    stop-and-wait protocol of the real gateway (every length and every
+    message is acknowledged) and knows the ``file_download``, ``index`` and
+    ``new_file_message`` tasks. File downloads can also use the pipelined
+    protocol (request IDs, no ACKs, errors per request, confirmed after the
+    handshake with ``{"protocol": "pipelined"}``) and batch requests
+    that name several objects of a namespace. Contents are compressed when
+    the client offers compression in the handshake.
+
+    Args:
+     objects (dict or None, defaults to None): Maps ``namespace/key`` to the
+      contents (bytes) of an object.
+     index (dict or None, defaults to None): The index that is sent on index
+      requests, {namespace: {timestep: ...}, ...}.
+     host (str, defaults to '127.0.0.1'): The address we listen on.
+     port (int, defaults to 0): The port we listen on, 0 for a free port.
+     latency (float, defaults to 0): Seconds we wait before every answer, to
+      simulate the round trip time of a slow link.
+     namespace_index (bool, defaults to True): Answer requests for the
+      namespace listing and for single namespaces, otherwise always send the
+      whole index like older gateways.
+     stream_index (bool, defaults to True): Send index answers as a stream
+      of records if the client offers it.
+     pipelined (bool, defaults to True): Accept the pipelined protocol,
+      otherwise serve every file download stop-and-wait like older gateways.
+
+    """
+    def __init__(self, objects=None, index=None, host="127.0.0.1", port=0,
+                 latency=0, namespace_index=True, stream_index=True,
+                 pipelined=True):
+        self.objects = dict() if objects is None else objects
+        self.index = dict() if index is None else index
+        self.namespace_index = namespace_index
+        self.stream_index = stream_index
+        self.pipelined = pipelined
+
+        self.host = host
+        self.port = port
+        self.latency = latency
+
+        self.stats = {
+            "connections": 0,
+            "requests": 0,
+            "objects": 0,
+            "answers": 0,
+            "bytes_sent": 0
+        }
+
+        # notified whenever an object answer is completely sent
+        self._answer_condition = threading.Condition()
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._started_event = threading.Event()
+        self._writers = set()
+        self._new_file_queues = set()
+
+    def start(self):
+        """
+        Start the gateway in a background thread and wait until it listens.
+
+        Returns:
+         int: The port the gateway listens on.
+
+        """
+        self._thread = threading.Thread(
+            target=self._run, name="MockGateway", daemon=True)
+        self._thread.start()
+        self._started_event.wait()
+
+        return self.port
+
+    def stop(self):
+        """
+        Close every connection and stop the gateway.
+
+        """
+        if self._loop is None:
+            return
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def wait_answers(self, count, timeout=5):
+        """
+        Wait until ``count`` object answers are completely sent, including
+        their ACKs. The stats are up to date for these answers.
+
+        Returns:
+         bool: True if the answers were sent, False on timeout.
+
+        """
+        with self._answer_condition:
+            return self._answer_condition.wait_for(
+                lambda: self.stats["answers"] >= count, timeout)
+
+    def _answer_sent(self, contents):
+        """
+        Count an object answer once it is completely sent.
+
+        """
+        with self._answer_condition:
+            self.stats["bytes_sent"] += len(contents)
+            self.stats["answers"] += 1
+            self._answer_condition.notify_all()
+
+    def add_object(self, namespace, key, contents):
+        """
+        Add an object to the gateway.
+
+        """
+        self.objects["{}/{}".format(namespace, key)] = contents
+
+    def push_new_file(self, new_file):
+        """
+        Tell every ``new_file_message`` connection about a new file.
+
+        """
+        def push():
+            for new_file_queue in self._new_file_queues:
+                new_file_queue.put_nowait(new_file)
+
+        self._loop.call_soon_threadsafe(push)
+
+    def close_connections(self):
+        """
+        Close every open connection, e.g. to test reconnects.
+
+        """
+        def close():
+            for writer in list(self._writers):
+                writer.close()
+
+        self._loop.call_soon_threadsafe(close)
+
+    def _run(self):
+        """
+        Run the event loop of the gateway.
+
+        """
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle_connection, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+
+        self._started_event.set()
+
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            self._loop.run_until_complete(self._server.wait_closed())
+            self._loop.close()
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Read the handshake and serve the requested task.
+
+        """
+        self.stats["connections"] += 1
+        self._writers.add(writer)
+
+        try:
+            handshake = await self._read_message(reader, writer)
+            task = handshake["task"]
+
+            if (
+                    task == "file_download" and
+                    handshake.get("protocol") == "pipelined" and
+                    self.pipelined
+            ):
+                await self._serve_file_download_pipelined(
+                    reader, writer, handshake)
+            elif task == "file_download":
+                await self._serve_file_download(reader, writer, handshake)
+            elif task == "index":
+                await self._serve_index(reader, writer)
+            elif task == "new_file_message":
+                await self._serve_new_files(reader, writer)
+
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _serve_file_download(self, reader, writer, handshake):
+        """
+        Answer file requests until the client closes the connection.
+
+        """
+        binary_transfer = handshake.get("transfer") == "binary"
+
+        while True:
+            request = await self._read_message(reader, writer)
+            self.stats["requests"] += 1
+
+            for namespace, key in self._requested_objects(request):
+                header, contents = self._file_answer(namespace, key)
+
+                if "error" in header:
+                    await self._send_message(reader, writer, header)
+                    self._answer_sent(contents)
+                    continue
+
+                file_request = header["file_request"]
+
+                if binary_transfer:
+                    contents = self._compress(contents, handshake, header)
+                    file_request["contents_length"] = len(contents)
+                    await self._send_message(reader, writer, header)
+
+                    writer.write(contents)
+                    await writer.drain()
+                    await self._expect_ack(reader)
+
+                else:
+                    file_request["contents"] = base64.b64encode(
+                        contents).decode()
+                    await self._send_message(reader, writer, header)
+
+                self._answer_sent(contents)
+
+    async def _serve_file_download_pipelined(self, reader, writer, handshake):
+        """
+        Answer tagged file requests without ACKs, possibly out of order.
+
+        """
+        write_lock = asyncio.Lock()
+        answer_tasks = set()
+
+        # accept the protocol before the first answer
+        data = json.dumps({"protocol": "pipelined"}).encode()
+        writer.write(struct.pack("L", len(data)) + data)
+        await writer.drain()
+
+        async def answer(request_id, namespace, key):
+            await self._delay()
+
+            header, contents = self._file_answer(namespace, key)
+            header["request_id"] = request_id
+
+            if "file_request" in header:
+                contents = self._compress(contents, handshake, header)
+                header["file_request"]["contents_length"] = len(contents)
+
+            data = json.dumps(header).encode()
+
+            async with write_lock:
+                writer.write(struct.pack("L", len(data)) + data)
+                writer.write(contents)
+                await writer.drain()
+
+            self._answer_sent(contents)
+
+        try:
+            while True:
+                length_b = await reader.readexactly(struct.calcsize("L"))
+                length = struct.unpack("L", length_b)[0]
+                request = json.loads((await reader.readexactly(length)).decode())
+                self.stats["requests"] += 1
+
+                for namespace, key in self._requested_objects(request):
+                    answer_task = asyncio.ensure_future(
+                        answer(request["request_id"], namespace, key))
+                    answer_tasks.add(answer_task)
+                    answer_task.add_done_callback(answer_tasks.discard)
+        finally:
+            for answer_task in answer_tasks:
+                answer_task.cancel()
+
+    def _compress(self, contents, handshake, header):
+        """
+        Compress the contents if the client offered compression, and describe
+        the compression in the answer header.
+
+        Returns:
+         bytes: The contents to send.
+
+        """
+        if "compression" not in handshake:
+            return contents
+
+        payload, compression = tc.compress(contents, handshake["compression"])
+
+        if compression is not None:
+            header["file_request"]["compression"] = compression
+
+        return payload
+
+    def _requested_objects(self, request):
+        """
+        Return the (namespace, key) tuples of a single or a batch request.
+
+        """
+        if "requested_files" in request:
+            namespace = request["requested_files"]["namespace"]
+            return [(namespace, key)
+                    for key in request["requested_files"]["keys"]]
+
+        requested_file = request["requested_file"]
+        return [(requested_file["namespace"], requested_file["key"])]
+
+    def _file_answer(self, namespace, key):
+        """
+        Return the answer header and the contents for an object.
+
+        Unknown objects are answered with an error and empty contents.
+
+        """
+        self.stats["objects"] += 1
+
+        try:
+            contents = self.objects["{}/{}".format(namespace, key)]
+        except KeyError:
+            return {
+                "object": key,
+                "error": "no object {}/{}".format(namespace, key)
+            }, b""
+
+        return {
+            "file_request": {
+                "namespace": namespace,
+                "object": key,
+                "tags": {"sha1sum": hashlib.sha1(contents).hexdigest()}
+            }
+        }, contents
+
+    async def _serve_index(self, reader, writer):
+        """
+        Answer index requests until the client closes the connection.
+
+        """
+        while True:
+            request = await self._read_message(reader, writer)
+
+            if not self.namespace_index:
+                answer = {"index": self.index}
+            elif request.get("scope") == "namespaces":
+                answer = {"namespaces": list(self.index)}
+            elif "namespace" in request:
+                namespace = request["namespace"]
+                answer = {
+                    "namespace": namespace,
+                    "index": {namespace: self.index.get(namespace, dict())}
+                }
+            else:
+                answer = {"index": self.index}
+
+            if request.get("stream") == "ndjson" and self.stream_index:
+                await self._send_index_stream(reader, writer, answer)
+            else:
+                await self._send_message(reader, writer, answer)
+
+    async def _send_index_stream(self, reader, writer, answer):
+        """
+        Send an index answer as newline delimited JSON records.
+
+        """
+        if "namespaces" in answer:
+            trees = {namespace: dict() for namespace in answer["namespaces"]}
+        else:
+            trees = answer["index"]
+
+        records = list()
+        for namespace, tree in trees.items():
+            records.append({"namespace": namespace})
+            records.extend(
+                {"namespace": namespace, "key": key, "sha1sum": sha1sum}
+                for key, sha1sum in tree_objects(tree))
+
+        data = b"".join(
+            json.dumps(record).encode() + b"\n" for record in records)
+
+        await self._send_message(
+            reader, writer, {"stream": "ndjson", "length": len(data)})
+
+        writer.write(data)
+        await writer.drain()
+        await self._expect_ack(reader)
+
+    async def _serve_new_files(self, reader, writer):
+        """
+        Push new files to the client.
+
+        """
+        new_file_queue = asyncio.Queue()
+        self._new_file_queues.add(new_file_queue)
+
+        try:
+            while True:
+                new_file = await new_file_queue.get()
+                await self._send_message(
+                    reader, writer, {"new_file": new_file})
+        finally:
+            self._new_file_queues.discard(new_file_queue)
+
+    async def _read_message(self, reader, writer):
+        """
+        Read a length prefixed JSON message and acknowledge length and message.
+
+        """
+        length_b = await reader.readexactly(struct.calcsize("L"))
+        length = struct.unpack("L", length_b)[0]
+        await self._delay()
+        writer.write(b"ack")
+
+        data = await reader.readexactly(length)
+        await self._delay()
+        writer.write(b"ack")
+        await writer.drain()
+
+        return json.loads(data.decode("UTF-8"))
+
+    async def _send_message(self, reader, writer, message):
+        """
+        Send a length prefixed JSON message, waiting for the ACKs.
+
+        """
+        data = json.dumps(message).encode()
+
+        await self._delay()
+        writer.write(struct.pack("L", len(data)))
+        await writer.drain()
+        await self._expect_ack(reader)
+
+        writer.write(data)
+        await writer.drain()
+        await self._expect_ack(reader)
+
+    async def _delay(self):
+        """
+        Simulate the latency of the link.
+
+        """
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def _expect_ack(self, reader):
+        """
+        Read an ACK or NACK.
+
+        Raises:
+         ConnectionError: On a NACK, we just drop the connection.
+
+        """
+        ck = await reader.readexactly(3)
+        if ck == b"nac":
+            await reader.readexactly(1)
+            raise ConnectionError("NACK from client")
+
+
+def benchmark(object_count=50, object_size=4*1000*1000, pool_size=4,
+              latency=0, floats=False, compression_level=1):
+    """
+    Download objects from a mock gateway with the gateway client in the
+    different transfer modes and print the throughput.
+
+    Random bytes do not compress, with ``floats`` the objects are float64
+    arrays of a smooth random walk instead, similar to simulation results.
+
+    """
+    def contents():
+        if not floats:
+            return os.urandom(object_size)
+
+        import numpy as np
+        steps = np.random.normal(size=object_size // 8).astype(np.float32)
+        return np.cumsum(steps, dtype=np.float64).tobytes()
+
+    objects = {
+        "bench/object{}".format(i): contents()
+        for i in range(object_count)
+    }
+
+    gateway = MockGateway(objects=objects, latency=latency)
+    port = gateway.start()
+
+    modes = [
+        ("base64", {"binary_transfer": False}),
+        ("binary", {"binary_transfer": True}),
+        ("pipelined", {"protocol": "pipelined"}),
+        ("batch", {"binary_transfer": True, "batch_requests": True}),
+        ("pl-batch", {"protocol": "pipelined", "batch_requests": True}),
+        ("zlib", {"compression": tc.offer(compression_level)}),
+        ("shuffle", {"compression": tc.offer(compression_level, 8)})
+    ]
+
+    for mode_name, mode_kwargs in modes:
+        client = Client(
+            gateway.host, port,
+            threading.Event(), queue.Queue(), threading.Event(), queue.Queue(),
+            queue.Queue(), queue.Queue(), threading.Event(),
+            pool_size=pool_size, run=False, **mode_kwargs
+        )
+
+        keys = ["object{}".format(i) for i in range(object_count)]
+
+        async def download_all():
+            if mode_name.endswith("batch"):
+                await client._download_and_return_batch(
+                    {"namespace": "bench", "keys": keys})
+                return
+
+            await asyncio.gather(*[
+                client._download_and_return_file(
+                    {"namespace": "bench", "key": key})
+                for key in keys
+            ])
+
+        start = time.perf_counter()
+        client._loop.run_until_complete(download_all())
+        elapsed = time.perf_counter() - start
+
+        transfer_stats = client.transfer_stats()
+        client.close()
+
+        total_mb = sum(len(contents) for contents in objects.values()) / 1e6
+        print("{:>9}: {:6.1f} MB in {:6.3f} s, {:7.1f} MB/s, "
+              "ratio {:5.2f}".format(
+                  mode_name, total_mb, elapsed, total_mb / elapsed,
+                  transfer_stats["ratio"] or 1))
+
+    gateway.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--objects", type=int, default=50,
+                        help="Number of objects to download")
+    parser.add_argument("--size", type=int, default=4*1000*1000,
+                        help="Size of every object in bytes")
+    parser.add_argument("--pool_size", type=int, default=4,
+                        help="Number of parallel download connections")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="Simulated latency of the gateway in seconds")
+    parser.add_argument("--floats", action="store_true",
+                        help="Serve compressible float64 arrays instead of "
+                             "random bytes")
+    parser.add_argument("--level", type=int, default=1,
+                        help="zlib compression level of the compressed modes")
+    args = parser.parse_args()
+
+    benchmark(args.objects, args.size, args.pool_size, args.latency,
+              args.floats, args.level)
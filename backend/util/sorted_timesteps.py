@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Timesteps in natural sort order, kept sorted while new ones arrive.
+
+Timesteps are strings like ``000000042.000000``. They are sorted for humans,
+numbers compare as numbers, see
+https://blog.codinghorror.com/sorting-for-humans-natural-sort-order/
+
+``SortedTimesteps`` keeps the sort keys next to the timesteps and inserts
+with ``bisect``, so listing, finding neighbours and the newest timesteps does
+not sort anything.
+
+"""
+import re
+import bisect
+
+
+# splits timesteps into numbers and text
+_NUMBER_REGEX = re.compile('([0-9]+)')
+
+
+def natural_sort_key(timestep):
+    """
+    Return the key for sorting timesteps naturally.
+
+    Returns:
+     tuple: The numbers of the timestep as ints, the text in between in lower
+     case.
+
+    """
+    return tuple(
+        int(part) if part.isdigit() else part.lower()
+        for part in _NUMBER_REGEX.split(timestep)
+    )
+
+
+def natural_sorted(timesteps):
+    """
+    Return a new list with the timesteps in natural sort order.
+
+    """
+    return sorted(timesteps, key=natural_sort_key)
+
+
+class SortedTimesteps(object):
+    """
+    The timesteps of a namespace in natural sort order.
+
+    Not thread safe. The index shares it between snapshots, so it copies a
+    published one before adding timesteps.
+
+    Args:
+     timesteps (iterable, defaults to ()): The initial timesteps, duplicates
+      are dropped.
+
+    """
+    def __init__(self, timesteps=()):
+        timesteps = natural_sorted(set(timesteps))
+
+        self._keys = [natural_sort_key(timestep) for timestep in timesteps]
+        self._timesteps = timesteps
+
+    def __len__(self):
+        return len(self._timesteps)
+
+    def __contains__(self, timestep):
+        return self.position(timestep) is not None
+
+    def copy(self):
+        """
+        Return an independent copy.
+
+        """
+        result = SortedTimesteps()
+        result._keys = list(self._keys)
+        result._timesteps = list(self._timesteps)
+
+        return result
+
+    def add(self, timestep):
+        """
+        Insert a timestep at its place.
+
+        Returns:
+         bool: True if the timestep is new, False if it was known already.
+
+        """
+        position, found = self._find(timestep)
+
+        if found:
+            return False
+
+        self._keys.insert(position, natural_sort_key(timestep))
+        self._timesteps.insert(position, timestep)
+
+        return True
+
+    def position(self, timestep):
+        """
+        Return the position of a timestep, None if it is unknown.
+
+        """
+        position, found = self._find(timestep)
+
+        return position if found else None
+
+    def _find(self, timestep):
+        """
+        Look for a timestep with binary search.
+
+        Returns:
+         tuple: ``(position, found)``, the position of the timestep or where
+         it belongs.
+
+        """
+        key = natural_sort_key(timestep)
+        position = bisect.bisect_left(self._keys, key)
+
+        # different timesteps may have the same key, e.g. 01 and 1
+        for candidate in range(position, len(self._keys)):
+            if self._keys[candidate] != key:
+                break
+            if self._timesteps[candidate] == timestep:
+                return candidate, True
+
+        return position, False
+
+    def timesteps(self):
+        """
+        Return a new list with all timesteps, oldest first.
+
+        """
+        return list(self._timesteps)
+
+    def adjacent(self, timestep, offset):
+        """
+        Return the timestep ``offset`` places after ``timestep``, e.g. -1 for
+        the previous one.
+
+        Returns:
+         str or None: The timestep, None if ``timestep`` is unknown or there is
+         no timestep at that place.
+
+        """
+        position = self.position(timestep)
+
+        if position is None:
+            return None
+
+        position += offset
+
+        if not 0 <= position < len(self._timesteps):
+            return None
+
+        return self._timesteps[position]
+
+    def newest(self, count=1):
+        """
+        Return the newest ``count`` timesteps, newest first.
+
+        """
+        return self._timesteps[:-count - 1:-1] if count > 0 else []
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for the coalescing workers.
+
+"""
+import threading
+import unittest
+
+# Append the parent directory for importing the file.
+import sys
+import os
+sys.path.append(os.path.join('..', '..', '..'))  # Append the program root dir
+from backend.util.coalescing_workers import CoalescingWorkers
+
+
+class Test_CoalescingWorkers(unittest.TestCase):
+    """
+    Test class for the coalescing workers.
+
+    """
+    def setUp(self):
+        self.workers = CoalescingWorkers(workers=2)
+        self.addCleanup(self.workers.shutdown)
+
+        self.lock = threading.Lock()
+        self.done = list()
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def job(self, key):
+        def run(value):
+            self.started.set()
+            self.release.wait(5)
+            with self.lock:
+                self.done.append((key, value))
+        return run
+
+    def test_only_newest_pending_job_runs(self):
+        """Jobs submitted while a key is busy replace each other
+
+        """
+        self.assertTrue(self.workers.submit("a", 1, self.job("a")))
+        self.assertTrue(self.started.wait(5))
+
+        for value in [2, 3, 4]:
+            self.assertTrue(self.workers.submit("a", value, self.job("a")))
+        self.assertTrue(self.workers.busy("a"))
+
+        self.release.set()
+        self.assertTrue(self.workers.join(5))
+
+        self.assertEqual(self.done, [("a", 1), ("a", 4)])
+        self.assertFalse(self.workers.busy("a"))
+
+    def test_running_value_is_dropped(self):
+        """A job with the value of the running job is not run again
+
+        """
+        self.workers.submit("a", 1, self.job("a"))
+        self.assertTrue(self.started.wait(5))
+
+        self.workers.submit("a", 2, self.job("a"))
+        self.assertFalse(self.workers.submit("a", 1, self.job("a")))
+
+        self.release.set()
+        self.assertTrue(self.workers.join(5))
+
+        self.assertEqual(self.done, [("a", 1)])
+
+    def test_keys_run_in_parallel(self):
+        """A busy key does not hold up other keys
+
+        """
+        self.workers.submit("slow", 1, self.job("slow"))
+        self.assertTrue(self.started.wait(5))
+
+        fast_done = threading.Event()
+        self.workers.submit("fast", 1, lambda value: fast_done.set())
+
+        self.assertTrue(fast_done.wait(5))
+        self.assertEqual(self.done, [])
+
+        self.release.set()
+        self.assertTrue(self.workers.join(5))
+
+    def test_discard_and_failure(self):
+        """Discarded jobs do not run, failing jobs free their key
+
+        """
+        def fail(value):
+            self.started.set()
+            self.release.wait(5)
+            raise ValueError(value)
+
+        self.workers.submit("a", 1, fail)
+        self.assertTrue(self.started.wait(5))
+        self.workers.submit("a", 2, self.job("a"))
+        self.workers.discard("a")
+
+        self.release.set()
+        self.assertTrue(self.workers.join(5))
+        self.assertEqual(self.done, [])
+
+        self.workers.submit("a", 3, self.job("a"))
+        self.assertTrue(self.workers.join(5))
+        self.assertEqual(self.done, [("a", 3)])
+
+    def test_shutdown(self):
+        """Nothing is run after a shutdown
+
+        """
+        self.workers.shutdown()
+        self.assertFalse(self.workers.submit("a", 1, self.job("a")))
+        self.assertFalse(self.workers.busy("a"))
+
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
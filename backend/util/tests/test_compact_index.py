@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Tests for the compact index store.
+
+"""
+import unittest
+
+# Append the parent directory for importing the file.
+import sys
+import os
+sys.path.append(os.path.join('..', '..', '..'))  # Append the program root dir
+from backend.util.compact_index import (
+    NamespaceIndex, TimestepIndex, parse_key, tree_objects)
+
+
+SHA1SUM = "0123456789abcdef0123456789abcdef01234567"
+
+
+def _parsed(key, sha1sum=SHA1SUM):
+    return parse_key(key) + (key, sha1sum)
+
+
+class Test_TimestepIndex(unittest.TestCase):
+    """
+    Test class for the objects of one timestep.
+
+    """
+    def setUp(self):
+        self.keys = [
+            "universe.fo.ta.nodes@1",
+            "universe.fo.ta.elements.hex8@1",
+            "universe.fo.ta.nodal.temperature@1",
+            "universe.fo.ma.elemental.stress.hex8@1",
+            "universe.fo.ma.elemental.strain@1",
+            "universe.fo.ma.skin.outer.hex8@1",
+        ]
+        self.timestep_index = TimestepIndex("1", [
+            parse_key(key)[1:] + (key, SHA1SUM) for key in self.keys])
+
+    def test_keys_are_rebuilt(self):
+        """Keys and sha1sums come back as they went in
+
+        """
+        self.assertEqual(len(self.timestep_index), len(self.keys))
+        self.assertEqual(
+            [key for _, key, _ in self.timestep_index.objects()], self.keys)
+        self.assertEqual(
+            {sha1sum for _, _, sha1sum in self.timestep_index.objects()},
+            {SHA1SUM})
+        # nothing is stored besides the paths and sha1sums
+        self.assertIsNone(self.timestep_index._odd_values)
+        self.assertEqual(len(self.timestep_index._sha1sums), 20 * 6)
+
+    def test_odd_values(self):
+        """Keys and sha1sums that do not fit are kept as they are
+
+        """
+        timestep_index = TimestepIndex("1", [
+            (("ta", "nodes"), "universe.fo.ta.nodes.v2@1", "abc"),
+            (("ta", "nodal", "t"), "universe.fo.ta.nodal.t@1", None),
+            (("ta", "nodal", "u"), "universe.fo.ta.nodal.u@1",
+             SHA1SUM.upper()),
+        ])
+
+        self.assertEqual(timestep_index.entry(("ta", "nodes")), {
+            "object_key": "universe.fo.ta.nodes.v2@1", "sha1sum": "abc"})
+        self.assertEqual(
+            timestep_index.entry(("ta", "nodal", "t"))["sha1sum"], "")
+        self.assertEqual(
+            timestep_index.entry(("ta", "nodal", "u"))["sha1sum"],
+            SHA1SUM.upper())
+
+    def test_lookup(self):
+        """Parts of the index are found by their path
+
+        """
+        self.assertEqual(self.timestep_index.children(), ["ta", "ma"])
+        self.assertEqual(
+            self.timestep_index.children(("ma", "elemental")),
+            ["stress", "strain"])
+        self.assertEqual(
+            self.timestep_index.children(("ma", "elemental", "strain")),
+            [None])
+        self.assertEqual(self.timestep_index.entry(("ta", "nodes")), {
+            "object_key": "universe.fo.ta.nodes@1", "sha1sum": SHA1SUM})
+
+        self.assertTrue(self.timestep_index.contains(
+            ("ta", "nodal", "temperature")))
+        self.assertFalse(self.timestep_index.contains(("ta", "nodal")))
+        self.assertFalse(self.timestep_index.contains(("ma", "unknown")))
+
+        with self.assertRaises(KeyError):
+            self.timestep_index.entry(("ta", "nodal"))
+        with self.assertRaises(KeyError):
+            self.timestep_index.children(("ta", "elset"))
+
+    def test_subtree(self):
+        """A part of the index comes back as nested dicts
+
+        """
+        self.assertEqual(self.timestep_index.subtree(("ma", "skin")), {
+            "outer": {"hex8": {
+                "object_key": "universe.fo.ma.skin.outer.hex8@1",
+                "sha1sum": SHA1SUM}}})
+
+        with self.assertRaises(KeyError):
+            self.timestep_index.subtree(("elset",))
+
+    def test_paths_are_shared(self):
+        """Equal paths of different timesteps are the same tuple
+
+        """
+        other = TimestepIndex("2", [
+            (("ta", "nodes"), "universe.fo.ta.nodes@2", SHA1SUM)])
+
+        self.assertIs(other.paths()[0], self.timestep_index.paths()[0])
+
+
+class Test_NamespaceIndex(unittest.TestCase):
+    """
+    Test class for the timesteps of a namespace.
+
+    """
+    def test_from_objects(self):
+        """Unknown keys are skipped, timesteps are sorted
+
+        """
+        namespace_index = NamespaceIndex.from_objects([
+            ("universe.fo.ta.nodes@10", SHA1SUM),
+            ("universe.fo.ta.nodes@9", SHA1SUM),
+            ("universe.fo.ta.unknown@11", SHA1SUM),
+        ])
+
+        self.assertEqual(sorted(namespace_index), ["10", "9"])
+        self.assertEqual(
+            namespace_index.sorted_timesteps.timesteps(), ["9", "10"])
+        self.assertEqual(len(list(namespace_index.objects())), 2)
+
+    def test_with_objects(self):
+        """Adding objects leaves the old index alone and shares what did not
+        change
+
+        """
+        old = NamespaceIndex().with_objects([
+            _parsed("universe.fo.ta.nodes@1"),
+            _parsed("universe.fo.ta.nodes@2"),
+        ])
+        new = old.with_objects([
+            _parsed("universe.fo.ta.nodal.temperature@2"),
+        ])
+
+        self.assertIs(new["1"], old["1"])
+        self.assertIs(new.sorted_timesteps, old.sorted_timesteps)
+        self.assertEqual(new["2"].children(("ta", "nodal")), ["temperature"])
+        self.assertNotIn("nodal", old["2"].children(("ta",)))
+
+        newer = new.with_objects([_parsed("universe.fo.ta.nodes@3")])
+
+        self.assertEqual(newer.sorted_timesteps.timesteps(), ["1", "2", "3"])
+        self.assertEqual(new.sorted_timesteps.timesteps(), ["1", "2"])
+        self.assertIs(new.with_objects([]), new)
+
+    def test_tree_objects(self):
+        """The objects of a nested dict index are found
+
+        """
+        tree = {"1": {"ta": {
+            "nodes": {"object_key": "universe.fo.ta.nodes@1",
+                      "sha1sum": SHA1SUM},
+            "nodal": {"t": {"object_key": "universe.fo.ta.nodal.t@1",
+                            "sha1sum": ""}}}}}
+
+        self.assertEqual(sorted(tree_objects(tree)), [
+            ("universe.fo.ta.nodal.t@1", ""),
+            ("universe.fo.ta.nodes@1", SHA1SUM)])
+
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
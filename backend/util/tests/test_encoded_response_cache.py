@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Tests for the encoded response cache.
+
+"""
+import gzip
+import json
+import time
+import threading
+import unittest
+
+# Append the parent directory for importing the file.
+import sys
+import os
+sys.path.append(os.path.join('..', '..', '..'))  # Append the program root dir
+from backend.util.encoded_response_cache import (
+    EncodedResponseCache, entity_tag)
+
+
+class Test_EncodedResponseCache(unittest.TestCase):
+    """
+    Test class for the encoded response cache.
+
+    """
+    def setUp(self):
+        self.cache = EncodedResponseCache()
+        self.calls = 0
+
+    def create(self):
+        self.calls += 1
+        return {'datasetMeshHash': 'abc', 'datasetSurfaceNodes': [1, 2, 3]}
+
+    def test_identity_body_is_json(self):
+        """The identity body is the JSON encoded object
+
+        """
+        body = self.cache.get_or_create(('geometry', 'abc'), self.create)
+        self.assertEqual(json.loads(body.decode('utf-8')), self.create())
+
+    def test_gzip_body_decompresses_to_json(self):
+        """The gzip body decompresses to the identity body
+
+        """
+        gz_body = self.cache.get_or_create(
+            ('geometry', 'abc'), self.create, compression='gzip')
+        body = self.cache.get_or_create(('geometry', 'abc'), self.create)
+        self.assertEqual(gzip.decompress(gz_body), body)
+
+    def test_serialized_only_once(self):
+        """Repeated requests do not serialize the content again
+
+        """
+        for i in range(10):
+            self.cache.get_or_create(('geometry', 'abc'), self.create)
+            self.cache.get_or_create(
+                ('geometry', 'abc'), self.create, compression='gzip')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_are_coalesced(self):
+        """Concurrent requests for a missing entry create it only once
+
+        """
+        def slow_create():
+            time.sleep(.05)
+            return self.create()
+
+        threads = [
+            threading.Thread(
+                target=self.cache.get_or_create,
+                args=(('geometry', 'abc'), slow_create))
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+
+    def test_none_is_not_cached(self):
+        """A create function returning None does not fill the cache
+
+        """
+        body = self.cache.get_or_create(('geometry', 'abc'), lambda: None)
+        self.assertIsNone(body)
+        self.assertIsNone(self.cache.get(('geometry', 'abc')))
+
+    def test_lru_eviction(self):
+        """The least recently used entries are evicted when the cache is full
+
+        """
+        cache = EncodedResponseCache(max_bytes=30)
+        cache.get_or_create('a', lambda: 'a' * 10)
+        cache.get_or_create('b', lambda: 'b' * 10)
+        cache.get('a')
+        cache.get_or_create('c', lambda: 'c' * 10)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_unknown_compression_raises_ValueError(self):
+        """An unknown compression raises a ValueError
+
+        """
+        with self.assertRaises(ValueError):
+            self.cache.get_or_create('a', self.create, compression='br')
+
+
+class Test_entity_tag(unittest.TestCase):
+    """
+    Test class for the entity tags.
+
+    """
+    def test_is_quoted_strong_tag(self):
+        """The entity tag is a quoted strong tag
+
+        """
+        self.assertRegex(entity_tag(('geometry', 'abc')), '^"[0-9a-f]{40}"$')
+
+    def test_tag_is_stable(self):
+        """The same content and representation give the same tag
+
+        """
+        self.assertEqual(
+            entity_tag(('geometry', 'abc')), entity_tag(('geometry', 'abc')))
+
+    def test_tag_depends_on_content_and_representation(self):
+        """Different content or compression give different tags
+
+        """
+        identity_tag = entity_tag(('geometry', 'abc'))
+        self.assertNotEqual(identity_tag, entity_tag(('geometry', 'abd')))
+        self.assertNotEqual(
+            identity_tag, entity_tag(('geometry', 'abc'), compression='gzip'))
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
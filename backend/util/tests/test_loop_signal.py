@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for the queues and events shared by threads and event loops.
+
+"""
+import time
+import asyncio
+import threading
+import unittest
+
+# Append the parent directory for importing the file.
+import sys
+import os
+sys.path.append(os.path.join('..', '..', '..'))  # Append the program root dir
+from backend.util.loop_signal import LoopEvent, LoopQueue
+
+
+class Test_LoopQueue(unittest.TestCase):
+    """
+    Test class for the LoopQueue.
+
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.queue = LoopQueue()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def put_later(self, item, delay=.05):
+        def put():
+            time.sleep(delay)
+            self.queue.put(item)
+
+        threading.Thread(target=put, daemon=True).start()
+
+    def test_get_waiting_item(self):
+        """Items that are already queued are returned immediately
+
+        """
+        self.queue.put(1)
+        self.queue.put(2)
+        self.assertEqual(
+            self.loop.run_until_complete(self.queue.get_async()), 1)
+        self.assertEqual(self.queue.get(), 2)
+
+    def test_put_from_thread_wakes_loop(self):
+        """A put from another thread wakes the waiting coroutine at once
+
+        """
+        self.put_later("item")
+        start = time.monotonic()
+        item = self.loop.run_until_complete(self.queue.get_async())
+
+        self.assertEqual(item, "item")
+        self.assertLess(time.monotonic() - start, .09)
+
+    def test_until(self):
+        """Setting the until event stops waiting
+
+        """
+        shutdown_event = LoopEvent()
+        threading.Timer(.05, shutdown_event.set).start()
+
+        self.assertIsNone(self.loop.run_until_complete(
+            self.queue.get_async(until=shutdown_event)))
+
+    def test_several_waiters(self):
+        """Every item goes to exactly one of several waiting coroutines
+
+        """
+        async def get_all():
+            return await asyncio.gather(
+                *[self.queue.get_async() for i in range(3)])
+
+        for i in range(3):
+            self.put_later(i, delay=.01 * (i + 1))
+
+        self.assertEqual(
+            sorted(self.loop.run_until_complete(get_all())), [0, 1, 2])
+        self.assertTrue(self.queue.empty())
+
+    def test_cancelled_waiter_is_forgotten(self):
+        """A cancelled coroutine does not swallow an item
+
+        """
+        async def get_and_cancel():
+            get_task = asyncio.ensure_future(self.queue.get_async())
+            await asyncio.sleep(.01)
+            get_task.cancel()
+
+        self.loop.run_until_complete(get_and_cancel())
+        self.queue.put("item")
+
+        self.assertEqual(self.queue.get_nowait(), "item")
+
+
+class Test_LoopEvent(unittest.TestCase):
+    """
+    Test class for the LoopEvent.
+
+    """
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.event = LoopEvent()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_set_from_thread_wakes_loop(self):
+        """A set from another thread wakes the waiting coroutine
+
+        """
+        threading.Timer(.05, self.event.set).start()
+        self.assertTrue(self.loop.run_until_complete(self.event.wait_async()))
+
+    def test_already_set(self):
+        """Waiting for a set event returns immediately
+
+        """
+        self.event.set()
+        self.assertTrue(self.loop.run_until_complete(self.event.wait_async()))
+        self.assertTrue(self.event.wait(0))
+
+    def test_until(self):
+        """Setting the until event stops waiting
+
+        """
+        shutdown_event = LoopEvent()
+        threading.Timer(.05, shutdown_event.set).start()
+
+        self.assertFalse(self.loop.run_until_complete(
+            self.event.wait_async(until=shutdown_event)))
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for the LRU cache of meshes and fields.
+
+"""
+import unittest
+
+# Append the parent directory for importing the file.
+import sys
+import os
+sys.path.append(os.path.join('..', '..', '..'))  # Append the program root dir
+from backend.util.lru_cache import LRUCache
+
+
+class Test_LRUCache(unittest.TestCase):
+    """
+    Test class for the LRU cache.
+
+    """
+    def setUp(self):
+        self.cache = LRUCache(max_entries=3)
+
+    def test_least_recently_used_is_evicted(self):
+        """The cache holds at most max_entries entries
+
+        """
+        for key in ['a', 'b', 'c']:
+            self.cache[key] = key.upper()
+
+        # a was used, so b goes
+        self.assertEqual(self.cache['a'], 'A')
+        self.cache['d'] = 'D'
+
+        self.assertEqual(self.cache.keys(), ['c', 'a', 'd'])
+        self.assertNotIn('b', self.cache)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(len(self.cache), 3)
+
+    def test_contains_does_not_touch(self):
+        """Checking for a key does not keep it
+
+        """
+        for key in ['a', 'b', 'c']:
+            self.cache[key] = key
+
+        self.assertIn('a', self.cache)
+        self.cache['d'] = 'd'
+
+        self.assertEqual(sorted(self.cache), ['b', 'c', 'd'])
+
+    def test_pinned_are_kept(self):
+        """Pinned keys are never evicted, the last stored key neither
+
+        """
+        self.cache.pin('a', 'b')
+
+        for key in ['a', 'b', 'c', 'd', 'e']:
+            self.cache[key] = key
+
+        self.assertEqual(self.cache.keys(), ['a', 'b', 'e'])
+
+        # more pinned keys than entries
+        self.cache = LRUCache(max_entries=1)
+        self.cache.pin('a')
+        self.cache['a'] = 'a'
+        self.cache['b'] = 'b'
+        self.assertEqual(self.cache.keys(), ['a', 'b'])
+
+        # unpinned keys go again
+        self.cache.pin('b')
+        self.cache['c'] = 'c'
+        self.assertEqual(self.cache.keys(), ['b', 'c'])
+
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
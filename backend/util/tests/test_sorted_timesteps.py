@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the naturally sorted timesteps.
+
+"""
+import random
+import unittest
+
+# Append the parent directory for importing the file.
+import sys
+import os
+sys.path.append(os.path.join('..', '..', '..'))  # Append the program root dir
+from backend.util.sorted_timesteps import (
+    SortedTimesteps, natural_sorted, natural_sort_key)
+
+
+class Test_SortedTimesteps(unittest.TestCase):
+    """
+    Test class for the SortedTimesteps.
+
+    """
+    def setUp(self):
+        self.timesteps = [
+            "{:09d}.{:06d}".format(second, micro)
+            for second in range(20) for micro in [0, 500000]
+        ]
+
+    def test_natural_sort(self):
+        """Numbers compare as numbers
+
+        """
+        self.assertEqual(
+            natural_sorted(["10", "9", "a10", "A9"]),
+            ["9", "10", "A9", "a10"])
+        self.assertLess(natural_sort_key("step2"), natural_sort_key("step10"))
+
+    def test_add_keeps_order(self):
+        """Timesteps added in any order are listed sorted, duplicates once
+
+        """
+        shuffled = list(self.timesteps)
+        random.Random(0).shuffle(shuffled)
+
+        sorted_timesteps = SortedTimesteps(shuffled[:10])
+        for timestep in shuffled[10:]:
+            self.assertTrue(sorted_timesteps.add(timestep))
+        self.assertFalse(sorted_timesteps.add(self.timesteps[3]))
+
+        self.assertEqual(sorted_timesteps.timesteps(), self.timesteps)
+        self.assertEqual(len(sorted_timesteps), len(self.timesteps))
+
+    def test_lookups(self):
+        """Positions, neighbours and the newest timesteps
+
+        """
+        sorted_timesteps = SortedTimesteps(self.timesteps)
+        timestep = self.timesteps[5]
+
+        self.assertEqual(sorted_timesteps.position(timestep), 5)
+        self.assertIn(timestep, sorted_timesteps)
+        self.assertNotIn("unknown", sorted_timesteps)
+        self.assertEqual(
+            sorted_timesteps.adjacent(timestep, -1), self.timesteps[4])
+        self.assertEqual(
+            sorted_timesteps.adjacent(timestep, 2), self.timesteps[7])
+        self.assertIsNone(sorted_timesteps.adjacent(self.timesteps[-1], 1))
+        self.assertIsNone(sorted_timesteps.adjacent(self.timesteps[0], -1))
+        self.assertIsNone(sorted_timesteps.adjacent("unknown", 0))
+        self.assertEqual(
+            sorted_timesteps.newest(2), self.timesteps[:-3:-1])
+        self.assertEqual(SortedTimesteps().newest(2), [])
+
+    def test_copy(self):
+        """Adding to a copy does not change the original
+
+        """
+        original = SortedTimesteps(["1", "2"])
+        copy = original.copy()
+        copy.add("3")
+
+        self.assertEqual(original.timesteps(), ["1", "2"])
+        self.assertEqual(copy.timesteps(), ["1", "2", "3"])
+
+    def test_same_key(self):
+        """Different timesteps with the same sort key are both kept
+
+        """
+        sorted_timesteps = SortedTimesteps(["1", "01"])
+        self.assertTrue(sorted_timesteps.add("001"))
+        self.assertFalse(sorted_timesteps.add("01"))
+
+        self.assertEqual(len(sorted_timesteps), 3)
+        for timestep in ["1", "01", "001"]:
+            self.assertIn(timestep, sorted_timesteps)
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for the timestep metadata cache.
+
+"""
+import time
+import tempfile
+import unittest
+
+# Append the parent directory for importing the file.
+import sys
+import os
+import pathlib
+sys.path.append(os.path.join('..', '..', '..'))  # Append the program root dir
+from backend.util.timestep_metadata import (
+    TimestepMetadataCache, directory_version)
+
+
+class Test_TimestepMetadataCache(unittest.TestCase):
+    """
+    Test class for the timestep metadata cache.
+
+    """
+    def setUp(self):
+        self.cache = TimestepMetadataCache(max_entries=3)
+        self.calls = 0
+
+    def create(self):
+        self.calls += 1
+        return {'elemental': ['stress'], 'nodal': ['temperature']}
+
+    def test_created_once_per_version(self):
+        """Metadata is only created again for a new version
+
+        """
+        version = object()
+
+        for i in range(10):
+            fields = self.cache.get_or_create('1', 'fields', version,
+                                              self.create)
+        self.assertEqual(fields['nodal'], ['temperature'])
+        self.assertEqual(self.calls, 1)
+
+        self.cache.get_or_create('1', 'fields', object(), self.create)
+        self.assertEqual(self.calls, 2)
+
+        # equal versions are the same version
+        self.cache.get_or_create('1', 'fields', (1, 2), self.create)
+        self.cache.get_or_create('1', 'fields', (1, 2), self.create)
+        self.assertEqual(self.calls, 3)
+
+        self.assertEqual(self.cache.stats()['hits'], 10)
+
+    def test_kinds_and_timesteps_are_separate(self):
+        """Every timestep and kind has its own entry
+
+        """
+        self.cache.get_or_create('1', 'fields', 0, self.create)
+        self.cache.get_or_create('1', 'elementsets', 0, self.create)
+        self.cache.get_or_create('2', 'fields', 0, self.create)
+        self.assertEqual(self.calls, 3)
+
+    def test_errors_are_not_cached(self):
+        """A failing create stores nothing
+
+        """
+        def fail():
+            raise KeyError('1')
+
+        with self.assertRaises(KeyError):
+            self.cache.get_or_create('1', 'fields', 0, fail)
+
+        self.cache.get_or_create('1', 'fields', 0, self.create)
+        self.assertEqual(self.calls, 1)
+
+    def test_least_recently_used_is_evicted(self):
+        """The cache holds at most max_entries entries
+
+        """
+        for timestep in ['1', '2', '3']:
+            self.cache.get_or_create(timestep, 'fields', 0, self.create)
+
+        # 1 was used, so 2 goes
+        self.cache.get_or_create('1', 'fields', 0, self.create)
+        self.cache.get_or_create('4', 'fields', 0, self.create)
+        self.assertEqual(self.calls, 4)
+
+        self.cache.get_or_create('1', 'fields', 0, self.create)
+        self.cache.get_or_create('2', 'fields', 0, self.create)
+        self.assertEqual(self.calls, 5)
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['entries'], 3)
+        self.assertEqual(stats['evictions'], 2)
+
+
+class Test_directory_version(unittest.TestCase):
+    """
+    Test class for the versions of local timesteps.
+
+    """
+    def test_new_file_changes_version(self):
+        """Adding a file to a directory changes its version
+
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            directory = pathlib.Path(directory)
+            version = directory_version(directory, directory / 'eo')
+
+            self.assertIsNone(version[1])
+            self.assertEqual(
+                directory_version(directory, directory / 'eo'), version)
+
+            # make sure the modification time can change
+            time.sleep(.01)
+            (directory / 'eo').mkdir()
+
+            new_version = directory_version(directory, directory / 'eo')
+            self.assertNotEqual(new_version, version)
+            self.assertIsNotNone(new_version[1])
+
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
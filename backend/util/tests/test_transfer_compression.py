@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Tests for the compression of object contents on the gateway link.
+
+"""
+import os
+import random
+import struct
+import unittest
+
+# Append the parent directory for importing the file.
+import sys
+sys.path.append(os.path.join('..', '..', '..'))  # Append the program root dir
+import backend.util.transfer_compression as tc
+
+
+class Test_transfer_compression(unittest.TestCase):
+    """
+    Test class for compressing and decompressing object contents.
+
+    """
+    def setUp(self):
+        # a float64 random walk with a few trailing bytes
+        random.seed(0)
+        values = [0.0]
+        for i in range(9999):
+            values.append(values[-1] + random.gauss(0, 1))
+
+        self.data = struct.pack("<10000d", *values) + b"end"
+
+    def test_shuffle_roundtrip(self):
+        """Unshuffling restores the shuffled data
+
+        """
+        for itemsize in [2, 4, 8]:
+            with self.subTest(itemsize=itemsize):
+                shuffled = tc.shuffle(self.data, itemsize)
+                self.assertEqual(len(shuffled), len(self.data))
+                self.assertEqual(
+                    bytes(tc.unshuffle(shuffled, itemsize)), self.data)
+
+    def test_shuffle_groups_bytes(self):
+        """The first bytes of every item come first
+
+        """
+        self.assertEqual(tc.shuffle(b"aAbBcC", 2), b"abcABC")
+        self.assertEqual(tc.shuffle(b"aAbBc", 2), b"abABc")
+
+    def test_roundtrip(self):
+        """Compressed contents decompress to the original
+
+        """
+        for shuffle in [0, 8]:
+            with self.subTest(shuffle=shuffle):
+                payload, compression = tc.compress(
+                    self.data, tc.offer(6, shuffle))
+
+                self.assertLess(len(payload), len(self.data))
+                self.assertEqual(
+                    bytes(tc.decompress(payload, compression)), self.data)
+
+    def test_decompress_into_buffer(self):
+        """Contents are decompressed into a given buffer, also piecewise
+
+        """
+        for shuffle in [0, 8]:
+            with self.subTest(shuffle=shuffle):
+                payload, compression = tc.compress(
+                    self.data, tc.offer(6, shuffle))
+                out = bytearray(len(self.data))
+
+                result = tc.decompress(
+                    payload, compression, out=out, chunk_size=1000)
+
+                self.assertIs(result, out)
+                self.assertEqual(bytes(out), self.data)
+
+    def test_shuffle_helps_floats(self):
+        """Float arrays compress better after shuffling
+
+        """
+        plain, _ = tc.compress(self.data, tc.offer(6))
+        shuffled, _ = tc.compress(self.data, tc.offer(6, 8))
+
+        self.assertLess(len(shuffled), len(plain))
+
+    def test_incompressible_data_is_sent_as_is(self):
+        """Contents that do not shrink are not compressed
+
+        """
+        data = os.urandom(10000)
+        payload, compression = tc.compress(data, tc.offer(1))
+
+        self.assertIs(payload, data)
+        self.assertIsNone(compression)
+
+    def test_invalid(self):
+        """Invalid offers and headers raise a ValueError
+
+        """
+        with self.assertRaises(ValueError):
+            tc.offer(0)
+        with self.assertRaises(ValueError):
+            tc.offer(1, -1)
+        with self.assertRaises(ValueError):
+            tc.decompress(b"", {"method": "lzma"})
+
+        payload, compression = tc.compress(self.data, tc.offer(1))
+        compression["length"] += 1
+        with self.assertRaises(ValueError):
+            tc.decompress(payload, compression)
+
+if __name__ == '__main__':
+    """
+    Testing as standalone program.
+
+    """
+    unittest.main(verbosity=2)
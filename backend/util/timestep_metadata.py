@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+A cache for the metadata of the timesteps of a dataset.
+
+Listing the fields and elementsets of a timestep walks the index (external
+datasets) or globs the timestep directory (local datasets). Clients poll these
+lists all the time, so we build them once per timestep and hand out the stored
+lists until the timestep changes.
+
+Every entry carries a version that tells whether it is still up to date:
+
+ * external datasets use the ``TimestepIndex`` of the timestep. The index
+   snapshots are immutable and keep the ``TimestepIndex`` of every timestep
+   that did not get new objects, so a new one means the timestep changed.
+ * local datasets use the modification times of the timestep directories, see
+   ``directory_version``.
+
+"""
+import os
+import threading
+import collections
+
+
+def directory_version(*directories):
+    """
+    Return a version for the contents of some directories.
+
+    Adding or removing a file changes the modification time of its directory.
+
+    Args:
+     directories (os.PathLike): The directories.
+
+    Returns:
+     tuple: The modification times in nanoseconds, None for directories that
+     do not exist.
+
+    """
+    version = []
+
+    for directory in directories:
+        try:
+            version.append(os.stat(directory).st_mtime_ns)
+        except OSError:
+            version.append(None)
+
+    return tuple(version)
+
+
+class TimestepMetadataCache(object):
+    """
+    A thread safe LRU cache for the metadata of the timesteps of one dataset.
+
+    Entries are keyed by ``(timestep, kind)``, where ``kind`` names the
+    metadata, e.g. ``"fields"``. An entry is only returned for the version it
+    was built for, versions are compared by identity first and by equality
+    otherwise.
+
+    The cached values are shared, callers must not change them.
+
+    Args:
+     max_entries (int, defaults to 1024): The maximum number of entries that
+      are held in the cache.
+
+    """
+    def __init__(self, max_entries=1024):
+        self._max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+
+    def get_or_create(self, timestep, kind, version, create):
+        """
+        Return the metadata of a timestep, creating it if necessary.
+
+        Two threads that miss at the same time both create the metadata, the
+        later one is stored. Creating it is cheap compared to waiting for each
+        other.
+
+        Args:
+         timestep (str): The timestep.
+         kind (str): The name of the metadata.
+         version (object): The current version of the timestep.
+         create (callable): Called without arguments on a miss or if the
+          entry is outdated, returns the metadata. Exceptions are passed on and
+          nothing is stored.
+
+        Returns:
+         object: The metadata.
+
+        """
+        key = (timestep, kind)
+
+        with self._lock:
+            try:
+                entry_version, value = self._entries[key]
+            except KeyError:
+                pass
+            else:
+                if entry_version is version or entry_version == version:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+
+            self._stats["misses"] += 1
+
+        value = create()
+
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+        return value
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Return a dictionary with cache statistics.
+
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+
+        return stats
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Compression of object contents on the gateway link.
+
+The client offers compression in the handshake of a file download connection::
+
+    {"task": "file_download", "compression": {"method": "zlib", "level": 1,
+                                               "shuffle": 8}}
+
+The gateway then decides for every object. If it compressed the contents the
+answer header describes how::
+
+    {"file_request": {..., "contents_length": 1234,
+                      "compression": {"method": "zlib", "shuffle": 8,
+                                      "length": 80000}}}
+
+``contents_length`` is the length of the compressed contents, ``length`` the
+length after decompression. Objects that do not shrink are sent as they are,
+without ``compression``. A gateway that does not know about compression
+ignores the offer and never compresses.
+
+The optional byte shuffle groups the first bytes of every item, then the
+second bytes and so on. The exponents and high mantissa bytes of float64
+arrays are similar, so zlib finds much more to compress after shuffling.
+
+"""
+import zlib
+
+
+METHODS = ["zlib"]
+
+
+def offer(level=1, shuffle=0):
+    """
+    Return the compression offer for the handshake.
+
+    Args:
+     level (int, defaults to 1): The zlib compression level, 1 (fast) to 9
+      (small).
+     shuffle (int, defaults to 0): The item size for the byte shuffle, e.g.
+      8 for float64 arrays, 0 to disable it.
+
+    Raises:
+     ValueError: If the level or the item size is invalid.
+
+    """
+    if not 1 <= level <= 9:
+        raise ValueError("compression level is {}, expected 1 to 9".format(
+            level))
+
+    if shuffle < 0:
+        raise ValueError("shuffle item size is {}, expected 0 or more".format(
+            shuffle))
+
+    return {"method": "zlib", "level": level, "shuffle": shuffle}
+
+
+def shuffle(data, itemsize):
+    """
+    Group the bytes of the items in ``data`` by their position in the item.
+
+    Trailing bytes that do not make up a full item stay at the end.
+
+    Returns:
+     bytes: The shuffled data.
+
+    """
+    data = memoryview(data).cast("B")
+    end = len(data) - len(data) % itemsize
+
+    items = bytes(data[:end])
+    return b"".join(
+        [items[i::itemsize] for i in range(itemsize)] + [bytes(data[end:])])
+
+
+def unshuffle(data, itemsize, out=None):
+    """
+    Undo ``shuffle``.
+
+    Args:
+     out (writable buffer or None, defaults to None): Write the original
+      data into this buffer of the same length instead of a new bytearray.
+
+    Returns:
+     bytearray or the type of out: The original data.
+
+    """
+    data = memoryview(data).cast("B")
+    count = len(data) // itemsize
+    end = count * itemsize
+
+    result = bytearray(len(data)) if out is None else out
+
+    with memoryview(result) as result_view:
+        for i in range(itemsize):
+            result_view[i:end:itemsize] = data[i * count:(i + 1) * count]
+
+        result_view[end:] = data[end:]
+
+    return result
+
+
+def compress(data, compression_offer):
+    """
+    Compress object contents as offered by the client.
+
+    Returns:
+     tuple: ``(payload, compression)``, ``compression`` is the dict for the
+     answer header or None if the contents are sent uncompressed.
+
+    """
+    if compression_offer.get("method") not in METHODS:
+        return data, None
+
+    itemsize = compression_offer.get("shuffle", 0)
+
+    to_compress = shuffle(data, itemsize) if itemsize > 1 else data
+    payload = zlib.compress(to_compress, compression_offer.get("level", 1))
+
+    if len(payload) >= len(data):
+        return data, None
+
+    compression = {"method": "zlib", "length": len(data)}
+    if itemsize > 1:
+        compression["shuffle"] = itemsize
+
+    return payload, compression
+
+
+def decompress(payload, compression, out=None, chunk_size=1024*1024):
+    """
+    Restore object contents described by the ``compression`` of an answer
+    header.
+
+    Args:
+     out (writable buffer or None, defaults to None): Write the contents into
+      this buffer of ``compression["length"]`` bytes, e.g. a memory map,
+      instead of a new bytearray.
+
+    Returns:
+     bytearray or the type of out: The contents.
+
+    Raises:
+     ValueError: If the method is unknown or the length does not match.
+
+    """
+    if compression.get("method") not in METHODS:
+        raise ValueError("unknown compression method {}".format(
+            compression.get("method")))
+
+    length = compression["length"]
+    itemsize = compression.get("shuffle", 0)
+
+    if itemsize > 1:
+        data = zlib.decompress(payload)
+
+        if len(data) != length:
+            raise ValueError("decompressed {} bytes, expected {}".format(
+                len(data), length))
+
+        return unshuffle(data, itemsize, out)
+
+    result = bytearray(length) if out is None else out
+
+    # decompress piecewise, so only the result is held in full
+    decompressor = zlib.decompressobj()
+    offset = 0
+
+    def write(chunk):
+        nonlocal offset
+
+        if offset + len(chunk) > length:
+            raise ValueError("decompressed more than {} bytes".format(length))
+
+        result_view[offset:offset + len(chunk)] = chunk
+        offset += len(chunk)
+
+    with memoryview(payload) as payload_view, \
+            memoryview(result) as result_view:
+
+        for start in range(0, len(payload_view), chunk_size):
+            remaining = payload_view[start:start + chunk_size]
+
+            while remaining:
+                write(decompressor.decompress(remaining, chunk_size))
+                remaining = decompressor.unconsumed_tail
+
+        write(decompressor.flush())
+
+    if offset != length:
+        raise ValueError("decompressed {} bytes, expected {}".format(
+            offset, length))
+
+    return result
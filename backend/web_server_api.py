@@ -15,6 +15,25 @@ from util.loggers import BackendLog as bl
 # This imports the scene manager and the data_directory
 import backend.global_settings as gloset
 
+from backend.util.encoded_response_cache import (
+    EncodedResponseCache, entity_tag)
+
+
+def _json_out_handler(*args, **kwargs):
+    """
+    A handler for the cherrypy json_out tool.
+
+    Encodes the return value of the page handler to JSON, except for bodies
+    that are already encoded (bytes), which are passed through untouched.
+
+    """
+    value = cherrypy.serving.request._json_inner_handler(*args, **kwargs)
+
+    if isinstance(value, bytes):
+        return value
+
+    return json.dumps(value).encode('utf-8')
+
 
 class ServerAPI:
     """
@@ -55,6 +74,15 @@ class ServerAPI:
      request.
 
     """
+    def __init__(self):
+        """
+        Initialise the API.
+
+        Creates the cache for encoded mesh geometry and field responses.
+
+        """
+        self._response_cache = EncodedResponseCache()
+
     @cherrypy.expose
     @cherrypy.tools.allow(methods=['GET'])
     @cherrypy.tools.json_out()
@@ -115,7 +143,7 @@ class ServerAPI:
     @cherrypy.expose
     @cherrypy.tools.allow(methods=['GET', 'POST', 'DELETE', 'PATCH'])
     @cherrypy.tools.json_in()
-    @cherrypy.tools.json_out()
+    @cherrypy.tools.json_out(handler=_json_out_handler)
     def scenes(
             self,
             scene_hash=None, dataset_hash=None,
@@ -287,6 +315,12 @@ class ServerAPI:
                     output = self.get_scenes_scenehash_datasethash_tracking(
                         scene_hash, dataset_hash)
 
+                ##################################################
+
+                if dataset_operation == 'playback':
+                    output = self.get_scenes_scenehash_datasethash_playback(
+                        scene_hash, dataset_hash)
+
             # PATCH
             if http_method == 'PATCH':
 
@@ -370,6 +404,22 @@ class ServerAPI:
                             scene_hash, dataset_hash)  # this is just a toggle
                     )
 
+                ##################################################
+
+                if dataset_operation == 'playback':
+
+                    try:
+                        playback = cherrypy.request.json
+                        output = (
+                            self.patch_scenes_scenehash_datasethash_playback(
+                                scene_hash, dataset_hash,
+                                new_playback=playback)
+                        )
+
+                    except (KeyError, TypeError, ValueError) as e:
+                        bl.debug_warning("KeyError/TypeError/ValueError: {}".format(e))
+                        output = None
+
 
         ##################################################
 
@@ -665,6 +715,26 @@ class ServerAPI:
             scene_hash, dataset_hash, set_tracking=new_tracking)
         return dataset_tracking
 
+    def get_scenes_scenehash_datasethash_playback(
+            self, scene_hash, dataset_hash):
+        """
+        Get the playback status of a dataset.
+
+        """
+        dataset_playback = gloset.scene_manager.dataset_playback(
+            scene_hash, dataset_hash, set_playback=None)
+        return dataset_playback
+
+    def patch_scenes_scenehash_datasethash_playback(
+            self, scene_hash, dataset_hash, new_playback):
+        """
+        Start or stop the playback of a dataset.
+
+        """
+        dataset_playback = gloset.scene_manager.dataset_playback(
+            scene_hash, dataset_hash, set_playback=new_playback)
+        return dataset_playback
+
     def get_scenes_scenehash_datasethash_mesh_hash(
             self, scene_hash, dataset_hash):
         """
@@ -682,10 +752,39 @@ class ServerAPI:
         Get the geometry data of a dataset.
 
         """
-        dataset_mesh_geometry = gloset.scene_manager.dataset_mesh_geometry(
+        dataset_mesh_hash = gloset.scene_manager.dataset_mesh_hash(
             scene_hash, dataset_hash)
 
-        return dataset_mesh_geometry
+        # dataset or scene do not exist
+        if dataset_mesh_hash is None:
+            return None
+
+        mesh_hash = dataset_mesh_hash['datasetMeshHash']
+
+        def create():
+            dataset_mesh_geometry = gloset.scene_manager.dataset_mesh_geometry(
+                scene_hash, dataset_hash)
+
+            # do not cache if the mesh changed in the meantime
+            if (
+                    dataset_mesh_geometry is None or
+                    dataset_mesh_geometry['datasetMeshHash'] != mesh_hash
+            ):
+                return None
+
+            return dataset_mesh_geometry
+
+        # the body contains the dataset meta information, so the dataset
+        # hash has to be part of the key
+        content_key = ('geometry', dataset_hash, mesh_hash)
+
+        encoded_body = self._encoded_response(content_key, create)
+
+        if encoded_body is None:
+            return gloset.scene_manager.dataset_mesh_geometry(
+                scene_hash, dataset_hash)
+
+        return encoded_body
 
     def get_scenes_scenehash_datasethash_mesh_field(
             self, scene_hash, dataset_hash):
@@ -693,7 +792,117 @@ class ServerAPI:
         Get the field data of a dataset.
 
         """
-        dataset_mesh_field = gloset.scene_manager.dataset_mesh_field(
+        dataset_mesh_hash = gloset.scene_manager.dataset_mesh_hash(
             scene_hash, dataset_hash)
+        dataset_fields = gloset.scene_manager.dataset_fields(
+            scene_hash, dataset_hash)
+
+        # dataset or scene do not exist
+        if dataset_mesh_hash is None or dataset_fields is None:
+            return None
+
+        field_hash = dataset_mesh_hash['datasetFieldHash']
+        selected_field = dataset_fields['datasetFieldSelected']
+
+        def create():
+            dataset_mesh_field = gloset.scene_manager.dataset_mesh_field(
+                scene_hash, dataset_hash)
+
+            # do not cache if the field changed in the meantime
+            if (
+                    dataset_mesh_field is None or
+                    dataset_mesh_field['datasetFieldHash'] != field_hash or
+                    dataset_mesh_field['datasetFieldSelected'] != selected_field
+            ):
+                return None
+
+            return dataset_mesh_field
+
+        # two fields with identical values share a hash, so the field name is
+        # part of the key as well
+        content_key = (
+            'field', dataset_hash, field_hash,
+            selected_field['type'], selected_field['name'])
+
+        encoded_body = self._encoded_response(content_key, create)
+
+        if encoded_body is None:
+            return gloset.scene_manager.dataset_mesh_field(
+                scene_hash, dataset_hash)
+
+        return encoded_body
+
+    def _encoded_response(self, content_key, create):
+        """
+        Return an encoded (and possibly compressed) body from the response
+        cache.
+
+        The compression is negotiated with the Accept-Encoding header of the
+        request. The response headers are set accordingly and the gzip tool
+        is told to leave the body alone.
+
+        A strong ETag is derived from the content key, so a request with a
+        matching If-None-Match header is answered with 304 Not Modified
+        without touching the body at all.
+
+        Args:
+         content_key (tuple): Uniquely identifies the content of the body.
+         create (callable): Returns the dictionary to be encoded, or None if
+          it should not be cached.
+
+        Returns:
+         bytes or None: The encoded body, or None if nothing was cached.
+
+        """
+        compression = self._accepted_compression()
+
+        response = cherrypy.serving.response
+        cherrypy.lib.set_vary_header(response, 'Accept-Encoding')
+
+        # the browser may keep the body but has to revalidate it every time,
+        # the URL stays the same when the mesh or field changes
+        response.headers['ETag'] = entity_tag(
+            content_key, encoding='json', compression=compression)
+        response.headers['Cache-Control'] = 'no-cache'
+
+        # answers with 304 Not Modified if If-None-Match fits the ETag
+        cherrypy.lib.cptools.validate_etags()
+
+        encoded_body = self._response_cache.get_or_create(
+            content_key, create, encoding='json', compression=compression)
+
+        if encoded_body is None:
+            # the content changed, the ETag does not describe it anymore
+            del response.headers['ETag']
+            return None
+
+        if compression != 'identity':
+            response.headers['Content-Encoding'] = compression
+
+        # the body is already compressed, the gzip tool skips cached bodies
+        cherrypy.serving.request.cached = True
+
+        return encoded_body
+
+    def _accepted_compression(self):
+        """
+        Return the compression we can use for the current request.
+
+        Follows the negotiation of the cherrypy gzip tool.
+
+        Returns:
+         str: Either 'gzip' or 'identity'.
+
+        """
+        acceptable = cherrypy.serving.request.headers.elements(
+            'Accept-Encoding')
+
+        for coding in acceptable:
+            if coding.value == 'identity' and coding.qvalue != 0:
+                return 'identity'
+            if coding.value in ('gzip', 'x-gzip'):
+                if coding.qvalue == 0:
+                    return 'identity'
+                return 'gzip'
 
-        return dataset_mesh_field
+        return 'identity'
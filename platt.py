@@ -20,6 +20,8 @@ from util.loggers import GatewayLog as gl, BackendLog as bl
 import backend.web_server as web_server
 import backend.platt_proxy_client as platt_client
 import backend.proxy_services as ps
+from backend.util.loop_signal import LoopEvent, LoopQueue
+import backend.util.transfer_compression as transfer_compression
 
 
 def parse_commandline():
@@ -72,6 +74,92 @@ def parse_commandline():
         help='Port of the platt gateway',
         default=8009
     )
+    parser.add_argument(
+        '--gw_pool_size', type=int, default=4,
+        help='Number of persistent connections for downloading objects from '
+             'the platt gateway, i.e. how many objects are downloaded in '
+             'parallel'
+    )
+    parser.add_argument(
+        '--gw_transfer', default='binary', choices=['binary', 'base64'],
+        help='How object contents are transferred from the platt gateway'
+    )
+    parser.add_argument(
+        '--gw_protocol', default='stop_and_wait',
+        choices=['stop_and_wait', 'pipelined'],
+        help='Protocol for downloading objects, pipelined needs a gateway '
+             'that supports request IDs and falls back to stop_and_wait '
+             'otherwise'
+    )
+    parser.add_argument(
+        '--index_file',
+        default=str(pathlib.Path(__file__).resolve().parent /
+                    'gateway_index.json.gz'),
+        help='Keep the index of the platt gateway in this file, so datasets '
+             'can be listed right after a restart, empty to disable it'
+    )
+    parser.add_argument(
+        '--gw_timeout', type=float, default=100,
+        help='Seconds to wait for requested objects from the platt gateway'
+    )
+    parser.add_argument(
+        '--gw_compression', default='none', choices=['none', 'zlib'],
+        help='Offer the platt gateway to compress object contents, needs '
+             'binary transfer'
+    )
+    parser.add_argument(
+        '--gw_compression_level', type=int, default=1,
+        help='zlib level for compressed object contents, 1 (fast) to 9 (small)'
+    )
+    parser.add_argument(
+        '--gw_shuffle', type=int, default=0,
+        help='Byte shuffle item size for compressed object contents, 8 for '
+             'float64 arrays, 0 disables it'
+    )
+    parser.add_argument(
+        '--gw_prefetch_limit', type=int, default=None,
+        help='Number of prefetch downloads that may run at the same time, '
+             'by default half of the download slots'
+    )
+    parser.add_argument(
+        '--gw_spill_threshold', type=float, default=64,
+        help='Objects of at least this many MB are downloaded into memory '
+             'mapped temporary files instead of memory, 0 disables it'
+    )
+    parser.add_argument(
+        '--gw_spill_dir', default=None,
+        help='Directory for the temporary files of large downloads, the '
+             'system temporary directory by default'
+    )
+    parser.add_argument(
+        '--gw_batch', action='store_true',
+        help='Request all missing objects of a timestep with one message, '
+             'needs a gateway that supports batch requests'
+    )
+
+    parser.add_argument(
+        '--prefetch_timesteps', type=int, default=1,
+        help='Number of timesteps before and after the selected one that are '
+             'loaded in the background, 0 disables prefetching'
+    )
+    parser.add_argument(
+        '--prefetch_workers', type=int, default=2,
+        help='Number of background threads per dataset for prefetching'
+    )
+    parser.add_argument(
+        '--prefetch_fields', action='store_true',
+        help='Load every field of the selected timestep in the background'
+    )
+    parser.add_argument(
+        '--prefetch_max_fields', type=int, default=32,
+        help='Number of fields every dataset keeps in memory, visited and '
+             'prefetched ones'
+    )
+    parser.add_argument(
+        '--prefetch_max_meshes', type=int, default=4,
+        help='Number of meshes every dataset keeps in memory, visited and '
+             'prefetched ones'
+    )
 
     parser.add_argument('--test', action='store_true',
                         help='Perform a unit test.')
@@ -82,7 +170,8 @@ def parse_commandline():
     return args
 
 
-def start_backend(port, ext_addr, ext_port):
+def start_backend(port, ext_addr, ext_port, prefetch_dict=None,
+                  gateway_dict=None, gateway_timeout=100, index_file=None):
     """
     Start the backend on the provided port, serving simulation data from the
     provided external source.
@@ -96,6 +185,15 @@ def start_backend(port, ext_addr, ext_port):
      port (int): The port for the web server.
      ext_addr(str): The IP address of the external source.
      ext_port (int): The network port of the external source.
+     prefetch_dict (dict or None, defaults to None): Settings for prefetching
+      timesteps and fields, keys are ``timesteps``, ``workers``, ``fields``,
+      ``max_fields`` and ``max_meshes``.
+     gateway_dict (dict or None, defaults to None): Keyword arguments for the
+      gateway client, e.g. ``pool_size``.
+     gateway_timeout (float, defaults to 100): Seconds to wait for requested
+      objects from the gateway.
+     index_file (os.PathLike or None, defaults to None): Keep the index of
+      the gateway in this file, so a restart can list datasets right away.
 
     Returns:
      None: Nothing
@@ -120,33 +218,37 @@ def start_backend(port, ext_addr, ext_port):
     if ext_addr and ext_port:
         data_source = 'external'
 
-        # event that can be queried if the connection to the proxy is active
-        proxy_connection_active_event = threading.Event()
+        # event that can be queried if the connection to the proxy is active,
+        # setting it also wakes everybody waiting for the index
+        proxy_connection_active_event = ps.ConnectionEvent()
         # queue for pushing information about new files over the socket
-        tell_new_file_queue = queue.Queue()
+        tell_new_file_queue = LoopQueue()
         with tell_new_file_queue.mutex:
             tell_new_file_queue.queue.clear()
         # index request event
-        get_index_event = threading.Event()
+        get_index_event = LoopEvent()
+        # requests for the namespace listing and single namespaces
+        index_request_queue = LoopQueue()
         # index data queue (answer to request event)
         receive_index_data_queue = queue.Queue()
         with receive_index_data_queue.mutex:
             receive_index_data_queue.queue.clear()
         # queue for requesting files
-        file_request_queue = queue.Queue()
+        file_request_queue = LoopQueue()
         with file_request_queue.mutex:
             file_request_queue.queue.clear()
         # queue for receiving file contents, name and hash after requesting them
-        file_contents_name_hash_queue = queue.Queue()
+        file_contents_name_hash_queue = LoopQueue()
         with file_contents_name_hash_queue.mutex:
             file_contents_name_hash_queue.queue.clear()
         # shutdown the platt gateway
-        shutdown_platt_gateway_event = threading.Event()
+        shutdown_platt_gateway_event = LoopEvent()
 
         gateway_comm_dict["proxy_connection_active_event"] = proxy_connection_active_event
         gateway_comm_dict["tell_new_file_queue"] = tell_new_file_queue
         gateway_comm_dict["get_index_event"] = get_index_event
         gateway_comm_dict["get_index_data_queue"] = receive_index_data_queue
+        gateway_comm_dict["index_request_queue"] = index_request_queue
         gateway_comm_dict["file_request_queue"] = file_request_queue
         gateway_comm_dict["file_contents_name_hash_queue"] = file_contents_name_hash_queue
         gateway_comm_dict["shutdown_platt_gateway_event"] = shutdown_platt_gateway_event
@@ -164,7 +266,9 @@ def start_backend(port, ext_addr, ext_port):
                 file_request_queue,
                 file_contents_name_hash_queue,
                 shutdown_platt_gateway_event
-            )
+            ),
+            kwargs=dict(
+                gateway_dict or {}, index_request_queue=index_request_queue)
         )
 
         proxy_services = threading.Thread(
@@ -174,7 +278,8 @@ def start_backend(port, ext_addr, ext_port):
                 [
                     gateway_comm_dict
                 ]
-            )
+            ),
+            kwargs={"index_file": index_file}
         )
 
     source_dict = {
@@ -183,8 +288,10 @@ def start_backend(port, ext_addr, ext_port):
         'external': {
             'addr': ext_addr,
             'port': ext_port,
-            "comm_dict": gateway_comm_dict
-        }
+            "comm_dict": gateway_comm_dict,
+            "timeout": gateway_timeout
+        },
+        "prefetch": prefetch_dict or {}
     }
 
     # Change working directory in case we are not there yet
@@ -248,6 +355,33 @@ def start_program():
     ext_addr = ARGS.gw_address
     ext_port = ARGS.gw_port
 
+    prefetch_dict = {
+        "timesteps": ARGS.prefetch_timesteps,
+        "workers": ARGS.prefetch_workers,
+        "fields": ARGS.prefetch_fields,
+        "max_fields": ARGS.prefetch_max_fields,
+        "max_meshes": ARGS.prefetch_max_meshes
+    }
+
+    gateway_dict = {
+        "pool_size": ARGS.gw_pool_size,
+        "binary_transfer": ARGS.gw_transfer == "binary",
+        "protocol": ARGS.gw_protocol,
+        "batch_requests": ARGS.gw_batch
+    }
+
+    if ARGS.gw_compression == "zlib":
+        gateway_dict["compression"] = transfer_compression.offer(
+            ARGS.gw_compression_level, ARGS.gw_shuffle)
+
+    if ARGS.gw_prefetch_limit is not None:
+        gateway_dict["priority_limits"] = {"prefetch": ARGS.gw_prefetch_limit}
+
+    if ARGS.gw_spill_threshold > 0:
+        gateway_dict["spill_threshold"] = int(
+            ARGS.gw_spill_threshold * 1024 * 1024)
+        gateway_dict["spill_dir"] = ARGS.gw_spill_dir
+
     # Just print the version?
     if just_print_version:
         print_version()
@@ -264,7 +398,8 @@ def start_program():
     setup_logging(ARGS.log)
 
     # Start the program
-    start_backend(port, ext_addr, ext_port)
+    start_backend(port, ext_addr, ext_port, prefetch_dict, gateway_dict,
+                  ARGS.gw_timeout, ARGS.index_file or None)
 
     return None
 